@@ -0,0 +1,242 @@
+"""
+Batch capture: triage a whole file (or stdin) of inputs in one process.
+
+Each non-blank line is one input, either plain text or a JSON object with an
+"input" (or "text") field — so `capture_store.py --export` output can be
+replayed as-is.
+Inputs are streamed, never loaded whole, and at most a fixed number are in
+flight at once, so memory stays flat however long the file is. Consecutive
+inputs are handed over in chunks so their intents can be split with one
+model request per chunk.
+
+One JSON result is written per input, in completion order:
+
+    {"line": 12, "input": "buy milk", "status": "ok", "page_ids": ["..."], "ms": 812.4}
+
+status is "ok" (every intent written), "partial", "failed" (none written —
+skipped or dead-lettered), "empty" (nothing to write) or "error". Intents
+that repeat a page created earlier (see page_index.py) count as written
+and are listed again under "duplicate_of". Progress is checkpointed after
+each result, so an interrupted run picks up where it stopped when rerun
+with the same --progress file.
+
+Usage (via main.py, which supplies the triage pipeline):
+    python main.py --batch notes.txt
+    python main.py --batch captures.jsonl --workers 8 --out results.jsonl
+    python main.py --batch notes.txt --llm-batch 1   # one model request per input
+    type notes.txt | python main.py --batch - --progress notes.progress.json
+"""
+import argparse
+import json
+import logging
+import os
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+from config import NOTION_MAX_CONCURRENCY
+from page_index import Duplicate
+
+logger = logging.getLogger(__name__)
+
+
+def parse_line(line: str) -> str | None:
+    """The input text on *line*, or None if it is blank or has no usable text."""
+    text = line.strip()
+    if text.startswith("{"):
+        try:
+            entry = json.loads(text)
+        except ValueError:
+            return text  # a plain note that happens to start with "{"
+        text = (entry.get("input") or entry.get("text")) if isinstance(entry, dict) else None
+        text = text.strip() if isinstance(text, str) else None
+    return text or None
+
+
+def iter_inputs(stream):
+    """Yield (line number, input text) pairs, 1-based, skipping blank lines."""
+    for line_no, line in enumerate(stream, start=1):
+        text = parse_line(line)
+        if text is not None:
+            yield line_no, text
+
+
+class Progress:
+    """
+    Which input lines are finished, stored as a low-water mark plus the few
+    lines finished above it.
+
+    Inputs complete out of order, but never more than the in-flight window
+    apart, so the set stays bounded by the number of workers rather than the
+    length of the file. Saved with a temp-file rename so a crash never
+    leaves it half-written.
+    """
+
+    def __init__(self, path: Path | None = None):
+        self.path = Path(path) if path else None
+        self.done_through = 0
+        self.done = set()
+        if self.path and self.path.exists():
+            try:
+                state = json.loads(self.path.read_text(encoding="utf-8"))
+                self.done_through = int(state["done_through"])
+                self.done = {int(n) for n in state.get("done", [])}
+            except (ValueError, KeyError, TypeError) as e:
+                logger.warning("Ignoring unreadable progress file %s: %s", self.path, e)
+
+    def is_done(self, line_no: int) -> bool:
+        return line_no <= self.done_through or line_no in self.done
+
+    def mark(self, line_nos, pending) -> None:
+        """Record *line_nos* as finished; *pending* are the line numbers still in flight."""
+        self.done.update(line_nos)
+        floor = min(pending, default=None)
+        # Everything below the oldest in-flight line is finished
+        if floor is None:
+            floor = max(self.done) + 1
+        self.done_through = max(self.done_through, floor - 1)
+        self.done = {n for n in self.done if n > self.done_through}
+        self._save()
+
+    def _save(self) -> None:
+        if not self.path:
+            return
+        tmp = self.path.with_name(self.path.name + ".tmp")
+        tmp.write_text(
+            json.dumps({"done_through": self.done_through, "done": sorted(self.done)}),
+            encoding="utf-8",
+        )
+        os.replace(tmp, self.path)
+
+
+def _status(page_ids: list) -> str:
+    written = sum(1 for page_id in page_ids if page_id)
+    if not page_ids:
+        return "empty"
+    if written == len(page_ids):
+        return "ok"
+    return "partial" if written else "failed"
+
+
+def _result(line_no: int, text: str, outcome, ms: float) -> dict:
+    result = {"line": line_no, "input": text}
+    if isinstance(outcome, BaseException):
+        result.update(status="error", error=f"{type(outcome).__name__}: {outcome}")
+    else:
+        result.update(status=_status(outcome), page_ids=outcome)
+        duplicates = [page_id for page_id in outcome if isinstance(page_id, Duplicate)]
+        if duplicates:
+            result["duplicate_of"] = duplicates
+    result["ms"] = ms
+    return result
+
+
+def run_batch(stream, process, out, progress: Progress | None = None,
+              workers: int = NOTION_MAX_CONCURRENCY, chunk_size: int = 1) -> dict:
+    """
+    Triage every input from *stream* and write one JSON result line per input to *out*.
+
+    *process* takes a list of up to *chunk_size* consecutive input texts and
+    returns one outcome per text: its list of page IDs (None where not
+    written), or the exception it raised. Chunks let the caller split
+    several inputs with one model request.
+
+    Returns counts per status, plus "skipped" for lines already marked done.
+    """
+    progress = progress or Progress()
+    workers = max(1, workers)
+    chunk_size = max(1, chunk_size)
+    counts = {"ok": 0, "partial": 0, "failed": 0, "empty": 0, "error": 0, "skipped": 0}
+    lock = threading.Lock()
+    pending = set()
+    in_flight = threading.BoundedSemaphore(workers * 2)
+
+    def handle(chunk):
+        start = time.perf_counter()
+        try:
+            try:
+                outcomes = process([text for _, text in chunk])
+                if len(outcomes) != len(chunk):
+                    raise ValueError(f"expected {len(chunk)} outcomes, got {len(outcomes)}")
+            except Exception as e:
+                logger.exception("Batch lines %d-%d failed", chunk[0][0], chunk[-1][0])
+                outcomes = [e] * len(chunk)
+            ms = round((time.perf_counter() - start) * 1000, 1)
+            with lock:
+                for (line_no, text), outcome in zip(chunk, outcomes):
+                    result = _result(line_no, text, outcome, ms)
+                    out.write(json.dumps(result, ensure_ascii=False) + "\n")
+                    counts[result["status"]] += 1
+                    pending.discard(line_no)
+                out.flush()
+                progress.mark([line_no for line_no, _ in chunk], pending)
+        finally:
+            in_flight.release()
+
+    def submit(chunk):
+        in_flight.acquire()
+        with lock:
+            pending.update(line_no for line_no, _ in chunk)
+        pool.submit(handle, chunk)
+
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="batch") as pool:
+        chunk = []
+        for line_no, text in iter_inputs(stream):
+            if progress.is_done(line_no):
+                counts["skipped"] += 1
+                continue
+            chunk.append((line_no, text))
+            if len(chunk) == chunk_size:
+                submit(chunk)
+                chunk = []
+        if chunk:
+            submit(chunk)
+
+    logger.info(
+        "Batch complete: %d ok, %d partial, %d failed, %d empty, %d error, %d skipped (already done)",
+        counts["ok"], counts["partial"], counts["failed"], counts["empty"], counts["error"], counts["skipped"],
+    )
+    return counts
+
+
+def main(argv, process, chunk_size: int = 1) -> int:
+    """CLI entry point used by ``main.py --batch``. Returns the process exit code."""
+    parser = argparse.ArgumentParser(prog="main.py --batch", description="Triage a file of inputs")
+    parser.add_argument("source", help="Input file (plain lines or JSONL), or - for stdin")
+    parser.add_argument("--out", help="Results JSONL (default: <source>.results.jsonl, stdout for stdin)")
+    parser.add_argument("--progress", help="Progress file for resuming (default: <source>.progress.json)")
+    parser.add_argument("--workers", type=int, default=NOTION_MAX_CONCURRENCY,
+                        help="Chunks of inputs processed concurrently")
+    parser.add_argument("--llm-batch", type=int, default=chunk_size,
+                        help=f"Inputs split per model request (default: {chunk_size})")
+    args = parser.parse_args(argv)
+
+    from_stdin = args.source == "-"
+    if from_stdin:
+        progress_path = args.progress
+        stream = sys.stdin
+    else:
+        source = Path(args.source)
+        progress_path = args.progress or source.with_name(source.name + ".progress.json")
+        stream = source.open(encoding="utf-8")
+    out_path = args.out or (None if from_stdin else f"{args.source}.results.jsonl")
+
+    out = open(out_path, "a", encoding="utf-8") if out_path else sys.stdout
+    if out is sys.stdout:
+        # Keep stdout pure JSONL: move console logging to stderr
+        for handler in logging.root.handlers:
+            if isinstance(handler, logging.StreamHandler) and handler.stream is sys.stdout:
+                handler.setStream(sys.stderr)
+    try:
+        counts = run_batch(
+            stream, process, out, Progress(progress_path), workers=args.workers, chunk_size=args.llm_batch,
+        )
+    finally:
+        if out is not sys.stdout:
+            out.close()
+        if stream is not sys.stdin:
+            stream.close()
+    print(json.dumps(counts), file=sys.stderr)
+    return 1 if counts["error"] or counts["failed"] else 0
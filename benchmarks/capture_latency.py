@@ -0,0 +1,93 @@
+#!/usr/bin/env python3
+"""
+Capture-to-ack latency: one-shot main.py process vs. the triage daemon.
+
+"Before" is what ui.py used to pay on every Enter press: a fresh interpreter
+that imports main.py (google.genai, notion_client, dotenv) and constructs both
+clients before any work starts. main.py now defers the SDKs, so this side
+builds both clients explicitly to reproduce that cold start. "After" is a
+send_capture() round trip to a daemon that is already warm. No LLM or
+Notion calls are made.
+
+Usage:
+    python benchmarks/capture_latency.py
+    python benchmarks/capture_latency.py --runs 20
+"""
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).parent.parent
+sys.path.insert(0, str(ROOT))
+
+from capture_store import CaptureStore
+from daemon import TriageDaemon, send_capture
+
+
+def _summary(label, samples):
+    ms = sorted(s * 1000 for s in samples)
+    print(
+        f"  {label:<24} median {statistics.median(ms):8.2f} ms"
+        f"   min {ms[0]:8.2f} ms   max {ms[-1]:8.2f} ms"
+    )
+
+
+# The pre-daemon start-up: main.py plus both SDK clients, as it used to construct at import
+_COLD_START = "import main, llm, notion; llm._gemini(); notion._client()"
+
+
+def bench_cold_start(runs):
+    # Constructing the Gemini client needs a key, though nothing is sent with it
+    env = {**os.environ, "GEMINI_API_KEY": os.environ.get("GEMINI_API_KEY") or "benchmark"}
+    samples = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        subprocess.run([sys.executable, "-c", _COLD_START], cwd=ROOT, env=env, check=True)
+        samples.append(time.perf_counter() - start)
+    return samples
+
+
+def bench_daemon(runs):
+    handled = []
+    with tempfile.TemporaryDirectory() as tmp:
+        # A scratch store: benchmark captures must never reach the real one,
+        # where the next recovery pass would triage and write them
+        store = CaptureStore(Path(tmp) / "captures.sqlite3")
+        daemon = TriageDaemon(
+            address=("127.0.0.1", 0),
+            handler=lambda capture, interactive_feedback: handled.append(capture["id"]),
+            store=store,
+        )
+        thread = threading.Thread(target=daemon.serve_forever, daemon=True)
+        thread.start()
+        daemon.ready.wait()
+
+        samples = []
+        for i in range(runs):
+            start = time.perf_counter()
+            if not send_capture(f"benchmark capture {i}", address=daemon.address):
+                raise RuntimeError("daemon did not ack capture")
+            samples.append(time.perf_counter() - start)
+        daemon.stop()
+        thread.join()
+        store.close()
+    return samples
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--runs", type=int, default=10)
+    args = parser.parse_args()
+
+    print(f"Capture-to-ack latency ({args.runs} runs each):")
+    cold = bench_cold_start(args.runs)
+    _summary("before: spawn main.py", cold)
+    warm = bench_daemon(args.runs)
+    _summary("after: daemon handoff", warm)
+    print(f"\nSpeed-up: {statistics.median(cold) / statistics.median(warm):.0f}x")
@@ -0,0 +1,75 @@
+#!/usr/bin/env python3
+"""
+Read latency against the local Notion mirror (mirror.py) as it grows.
+
+Fills a scratch mirror with --pages synthetic pages per size step (synced
+through a stand-in for notion.iter_pages, so the real write path is
+measured too) and times, per read, the median and p99 of:
+
+  get       one page by ID
+  find      pages of a type with a given (normalized) title
+
+Usage:
+    python benchmarks/mirror_reads.py
+    python benchmarks/mirror_reads.py --pages 10000 100000 1000000 --reads 20000
+"""
+import argparse
+import logging
+import random
+import statistics
+import sys
+import tempfile
+import time
+from pathlib import Path
+from unittest.mock import patch
+
+ROOT = Path(__file__).parent.parent
+sys.path.insert(0, str(ROOT))
+
+from mirror import Mirror
+
+
+def make_pages(n):
+    for i in range(n):
+        yield {
+            "id": f"page-{i}",
+            "url": f"https://notion.so/page-{i}",
+            "created_time": "2026-01-01T00:00:00.000Z",
+            "last_edited_time": f"2026-01-01T00:00:00.{i:09d}Z",
+            "properties": {"Name": {"title": [{"plain_text": f"Task number {i}"}]}},
+        }
+
+
+def percentiles(samples):
+    samples = sorted(samples)
+    return statistics.median(samples), samples[int(len(samples) * 0.99)]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--pages", type=int, nargs="+", default=[1_000, 10_000, 100_000])
+    parser.add_argument("--reads", type=int, default=10_000)
+    args = parser.parse_args()
+    logging.disable(logging.INFO)
+
+    rng = random.Random(0)
+    print(f"{'pages':>10} {'sync':>9}   {'get p50':>9} {'get p99':>9}   {'find p50':>9} {'find p99':>9}  (ms)")
+    for n in args.pages:
+        with tempfile.TemporaryDirectory() as tmp:
+            mirror = Mirror(Path(tmp) / "mirror.sqlite3")
+            start = time.perf_counter()
+            with patch("notion.iter_pages", side_effect=lambda db_id, **kw: make_pages(n)):
+                mirror.sync({"Task": "db-task"})
+            synced = time.perf_counter() - start
+
+            results = []
+            for read in (lambda i: mirror.get(f"page-{i}"), lambda i: mirror.find("Task", f"task number {i}")):
+                samples = []
+                for _ in range(args.reads):
+                    i = rng.randrange(n)
+                    t = time.perf_counter()
+                    assert read(i)
+                    samples.append((time.perf_counter() - t) * 1000)
+                results.extend(percentiles(samples))
+            mirror.close()
+        print(f"{n:>10,} {synced:>8.1f}s   {results[0]:>9.3f} {results[1]:>9.3f}   {results[2]:>9.3f} {results[3]:>9.3f}")
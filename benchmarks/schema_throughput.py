@@ -0,0 +1,156 @@
+#!/usr/bin/env python3
+"""
+Validation and Notion-payload throughput: compiled schema vs. walking
+INTENT_SCHEMA per intent.
+
+Generates --intents synthetic model intents (all three types, about one in
+ten rejected for a bad enum, date or type) and times, best of --runs:
+
+  validate   schema.validate_intents() vs. the per-intent walk that
+             main._validate_intent() used to do (uncompiled re.match)
+  build      the compiled property builders vs. the per-field if/elif
+             chain notion.build_properties() used to run
+
+Usage:
+    python benchmarks/schema_throughput.py
+    python benchmarks/schema_throughput.py --intents 1000000 --runs 3
+"""
+import argparse
+import gc
+import logging
+import random
+import re
+import sys
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).parent.parent
+sys.path.insert(0, str(ROOT))
+
+from schema import COMPILED_SCHEMA, INTENT_SCHEMA, validate_intents
+
+
+# ---------- Reference: the interpreted implementation ----------
+
+def walk_validate(intent):
+    schema = INTENT_SCHEMA.get(intent.get("type"))
+    if schema is None:
+        return None
+    title = (intent.get("title") or "").strip()
+    if not title:
+        return None
+    structured_fields = {}
+    for field_name, rules in schema["valid_fields"].items():
+        value = intent.get(field_name)
+        if value is None:
+            structured_fields[field_name] = None
+            continue
+        if "allowed" in rules and value not in rules["allowed"]:
+            return None
+        if "pattern" in rules and not re.match(rules["pattern"], str(value)):
+            return None
+        structured_fields[field_name] = value
+    return {"type": intent["type"], "title": title, "structured_fields": structured_fields}
+
+
+def walk_build(item_type, item, raw_input):
+    schema = INTENT_SCHEMA[item_type]
+    fields = item.get("structured_fields", {})
+    props = {schema["title_field"]: {"title": [{"text": {"content": item["title"]}}]}}
+    for prop_name, spec in schema["properties"].items():
+        prop_type = spec["type"]
+        if "default" in spec:
+            value = spec["default"]
+        elif "field" in spec:
+            value = fields.get(spec["field"])
+        elif spec.get("source") == "raw_input":
+            value = raw_input
+        else:
+            continue
+        if value is None:
+            continue
+        if prop_type == "status":
+            props[prop_name] = {"status": {"name": value}}
+        elif prop_type == "select":
+            props[prop_name] = {"select": {"name": value}} if value else None
+        elif prop_type == "multi_select":
+            values = [value] if isinstance(value, str) else value
+            props[prop_name] = {"multi_select": [{"name": v} for v in values]} if value else None
+        elif prop_type == "date":
+            props[prop_name] = {"date": {"start": value}} if value else None
+        elif prop_type == "rich_text":
+            props[prop_name] = {"rich_text": [{"text": {"content": value}}]}
+    return props
+
+
+# ---------- Workload ----------
+
+def make_intents(n, seed=0):
+    rng = random.Random(seed)
+    intents = []
+    for i in range(n):
+        kind = rng.random()
+        if kind < 0.5:
+            intent = {
+                "type": "Task", "title": f"Task {i}",
+                "priority": rng.choice(["High", "Medium", "Low", None]),
+                "due_date": rng.choice(["2026-03-01", None]),
+            }
+        elif kind < 0.75:
+            intent = {
+                "type": "Project", "title": f"Project {i}",
+                "success_criteria": "Shipped", "review_frequency": rng.choice(["Weekly", "Monthly", None]),
+            }
+        else:
+            intent = {
+                "type": "Idea", "title": f"Idea {i}",
+                "category": "Product", "potential_impact": rng.choice(["High", "Low", None]),
+            }
+        if rng.random() < 0.1:  # the kinds of mistakes validation exists to catch
+            field, value = rng.choice([("priority", "Urgent"), ("due_date", "next friday"), ("type", "Reminder")])
+            intent = {"type": "Task", "title": f"Task {i}", "priority": None, "due_date": None, field: value}
+        intents.append(intent)
+    return intents
+
+
+def best_of(runs, fn):
+    times = []
+    for _ in range(runs):
+        gc.collect()
+        gc.disable()  # as timeit does: collector pauses would swamp the difference
+        try:
+            start = time.perf_counter()
+            fn()
+            times.append(time.perf_counter() - start)
+        finally:
+            gc.enable()
+    return min(times)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--intents", type=int, default=100_000)
+    parser.add_argument("--runs", type=int, default=5)
+    args = parser.parse_args()
+    logging.disable(logging.WARNING)  # rejections are logged; that isn't what's being measured
+
+    intents = make_intents(args.intents)
+    items = validate_intents(intents)
+    assert items == [item for item in map(walk_validate, intents) if item is not None]
+    assert all(
+        COMPILED_SCHEMA[item["type"]].build_properties(item, "raw") == walk_build(item["type"], item, "raw")
+        for item in items[:1000]
+    )
+
+    rows = [
+        ("validate", args.intents,
+         lambda: [item for item in map(walk_validate, intents) if item is not None],
+         lambda: validate_intents(intents)),
+        ("build", len(items),
+         lambda: [walk_build(item["type"], item, "raw") for item in items],
+         lambda: [COMPILED_SCHEMA[item["type"]].build_properties(item, "raw") for item in items]),
+    ]
+    print(f"{args.intents:,} intents ({len(items):,} valid), best of {args.runs}:")
+    for label, n, walk, compiled in rows:
+        slow, fast = best_of(args.runs, walk), best_of(args.runs, compiled)
+        print(f"  {label:<9} walk {n / slow:>11,.0f}/s   compiled {n / fast:>11,.0f}/s   {slow / fast:.1f}x")
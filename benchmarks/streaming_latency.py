@@ -0,0 +1,106 @@
+#!/usr/bin/env python3
+"""
+Time-to-first-Notion-page and total time: buffered triage() vs. triage_stream().
+
+The model and Notion are simulated so the numbers only reflect the pipeline
+shape: the fake model takes --ttft ms before its first token and then
+--per-intent ms to generate each intent; each fake Notion write takes
+--write ms. The buffered path waits for the whole response before its
+first write; the streaming path starts each write as its intent arrives.
+
+For real-world numbers, run captures with TRIAGE_STREAM=1 and compare the
+triage.first_write and triage.stream.first_write rows of `python metrics.py`.
+
+Usage:
+    python benchmarks/streaming_latency.py
+    python benchmarks/streaming_latency.py --intents 6 --per-intent 500 --runs 3
+"""
+import argparse
+import json
+import statistics
+import sys
+import threading
+import time
+from pathlib import Path
+from types import SimpleNamespace
+from unittest.mock import MagicMock, patch
+
+ROOT = Path(__file__).parent.parent
+sys.path.insert(0, str(ROOT))
+
+import main
+
+
+def _fake_client(intents, ttft, per_intent):
+    body = json.dumps({"intents": intents})
+    # Cut the response just after each intent's closing brace
+    cuts = [body.index(json.dumps(intent)) + len(json.dumps(intent)) for intent in intents]
+
+    def generate_content(**kwargs):
+        time.sleep(ttft + per_intent * len(intents))
+        return SimpleNamespace(text=body, usage_metadata=None)
+
+    def generate_content_stream(**kwargs):
+        time.sleep(ttft)
+        prev = 0
+        for cut in cuts:
+            time.sleep(per_intent)
+            yield SimpleNamespace(text=body[prev:cut], usage_metadata=None)
+            prev = cut
+        yield SimpleNamespace(text=body[prev:], usage_metadata=None)
+
+    client = MagicMock()
+    client.models.generate_content.side_effect = generate_content
+    client.models.generate_content_stream.side_effect = generate_content_stream
+    return client
+
+
+def run_once(stream, intents, ttft, per_intent, write):
+    first_write = []
+    lock = threading.Lock()
+
+    def fake_write(item, raw_input):
+        time.sleep(write)
+        with lock:
+            first_write.append(time.perf_counter())
+        return "page"
+
+    with patch("llm.client", _fake_client(intents, ttft, per_intent)), \
+            patch("llm.RESPONSE_CACHE_ENABLED", False), \
+            patch("llm.PRECLASSIFIER_ENABLED", False), \
+            patch("llm.is_feedback_enabled", return_value=False), \
+            patch("main.is_feedback_enabled", return_value=False), \
+            patch("main.write_to_notion", side_effect=fake_write):
+        start = time.perf_counter()
+        main.triage("benchmark input", interactive_feedback=False, use_cache=False, stream=stream)
+        total = time.perf_counter() - start
+    return min(first_write) - start, total
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--intents", type=int, default=4)
+    parser.add_argument("--ttft", type=float, default=400, help="ms before the model's first token")
+    parser.add_argument("--per-intent", type=float, default=350, help="ms the model spends per intent")
+    parser.add_argument("--write", type=float, default=300, help="ms per Notion write")
+    parser.add_argument("--runs", type=int, default=3)
+    args = parser.parse_args()
+
+    intents = [
+        {"type": "Task", "title": f"Benchmark task {i}", "priority": None, "due_date": None}
+        for i in range(args.intents)
+    ]
+    params = (intents, args.ttft / 1000, args.per_intent / 1000, args.write / 1000)
+
+    print(f"{args.intents} intents, ttft {args.ttft:.0f} ms, {args.per_intent:.0f} ms/intent, "
+          f"{args.write:.0f} ms/write, {args.runs} runs (median):")
+    results = {}
+    for label, stream in (("buffered triage()", False), ("triage_stream()", True)):
+        samples = [run_once(stream, *params) for _ in range(args.runs)]
+        first = statistics.median(s[0] for s in samples) * 1000
+        total = statistics.median(s[1] for s in samples) * 1000
+        results[stream] = (first, total)
+        print(f"  {label:<20} first write {first:8.0f} ms   total {total:8.0f} ms")
+
+    (bf, bt), (sf, st) = results[False], results[True]
+    print(f"\nTime to first page: {bf / sf:.1f}x faster; total: {bt - st:+.0f} ms saved")
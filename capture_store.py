@@ -0,0 +1,445 @@
+#!/usr/bin/env python3
+"""
+Write-ahead store of every capture and the Notion items it produced.
+
+A capture is committed here before any model or Notion work starts, and
+moves through
+
+    received -> split -> validated -> written | dead_lettered   (or failed)
+
+as triage progresses. Each validated intent becomes an item that ends up
+written, dead_lettered or skipped (no DB configured); a capture settles
+once none of its items are still pending. A capture being worked on is
+owned by one process, so if that process dies the recovery pass
+(recover(), then main.resume_captures()) can carry it forward from the
+last recorded state instead of losing it.
+
+This replaces raw_inputs.jsonl (every capture is here) and
+dead_letter.jsonl (dead-lettered items are rows with that state).
+
+Usage:
+    python capture_store.py                      # captures per state
+    python capture_store.py --state dead_lettered
+    python capture_store.py --export > inputs.jsonl   # replay with main.py --batch
+"""
+import argparse
+import json
+import logging
+import os
+import sqlite3
+import sys
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from pathlib import Path
+
+logger = logging.getLogger(__name__)
+
+STORE_PATH = Path(__file__).parent / "captures.sqlite3"
+
+# Capture states, in order. Items use VALIDATED, WRITTEN, DEAD_LETTERED and SKIPPED.
+RECEIVED, SPLIT, VALIDATED, WRITTEN, DEAD_LETTERED, FAILED = (
+    "received", "split", "validated", "written", "dead_lettered", "failed",
+)
+SKIPPED = "skipped"
+STATES = (RECEIVED, SPLIT, VALIDATED, WRITTEN, DEAD_LETTERED, FAILED)
+TERMINAL = (WRITTEN, DEAD_LETTERED, FAILED)
+
+_ITEM_FIELDS = ("type", "title", "structured_fields")
+
+
+def _process_alive(pid: int) -> bool:
+    if pid == os.getpid():
+        return True
+    if os.name == "nt":
+        import ctypes
+
+        kernel32 = ctypes.WinDLL("kernel32", use_last_error=True)
+        handle = kernel32.OpenProcess(0x1000, False, pid)  # PROCESS_QUERY_LIMITED_INFORMATION
+        if not handle:
+            return ctypes.get_last_error() == 5  # access denied: exists, but not ours
+        try:
+            code = ctypes.c_ulong()
+            return bool(kernel32.GetExitCodeProcess(handle, ctypes.byref(code))) and code.value == 259  # STILL_ACTIVE
+        finally:
+            kernel32.CloseHandle(handle)
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+class CaptureStore:
+    """
+    SQLite (WAL) store behind every capture entry point.
+
+    receive() commits the raw text before returning, so an acknowledged
+    capture survives a crash. Workers claim() the oldest unowned capture
+    that isn't finished with a single UPDATE, which is atomic across
+    threads and processes. fail() releases a capture for a retry with
+    exponential backoff, until *max_attempts* leaves it "failed".
+    """
+
+    def __init__(self, path: Path = STORE_PATH, max_attempts: int = 3, retry_delay: float = 30):
+        self.path = Path(path)
+        self.max_attempts = max_attempts
+        self.retry_delay = retry_delay
+        self._lock = threading.Lock()
+        self._ready = threading.Condition(self._lock)
+        self._conn = None
+
+    def _connect(self):
+        if self._conn is None:
+            conn = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=FULL")  # an acked capture must survive power loss
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS captures ("
+                " seq INTEGER PRIMARY KEY AUTOINCREMENT,"
+                " id TEXT NOT NULL UNIQUE,"
+                " text TEXT NOT NULL,"
+                " source TEXT,"
+                " state TEXT NOT NULL,"
+                " owner INTEGER,"
+                " attempts INTEGER NOT NULL DEFAULT 0,"
+                " received_at REAL NOT NULL,"
+                " available_at REAL NOT NULL,"
+                " updated_at REAL NOT NULL,"
+                " finished_at REAL,"
+                " intents TEXT,"
+                " error TEXT)"
+            )
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS items ("
+                " id TEXT PRIMARY KEY,"
+                " capture_id TEXT NOT NULL REFERENCES captures(id),"
+                " position INTEGER NOT NULL,"
+                " item TEXT NOT NULL,"
+                " state TEXT NOT NULL,"
+                " page_id TEXT,"
+                " error TEXT,"
+                " updated_at REAL NOT NULL)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS captures_state ON captures(state, available_at)")
+            conn.execute("CREATE INDEX IF NOT EXISTS items_capture ON items(capture_id, state)")
+            conn.execute("CREATE INDEX IF NOT EXISTS items_state ON items(state)")
+            self._conn = conn
+        return self._conn
+
+    @contextmanager
+    def _transaction(self):
+        with self._lock:
+            conn = self._connect()
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                yield conn
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+            conn.execute("COMMIT")
+
+    # ---------- Captures ----------
+
+    def receive(self, text: str, source: str | None = None, claim: bool = False) -> str:
+        """
+        Record a new capture and return its ID. With *claim* this process
+        owns it straight away, so no worker elsewhere picks it up.
+        """
+        capture_id = uuid.uuid4().hex
+        now = time.time()
+        with self._ready:
+            self._connect().execute(
+                "INSERT INTO captures (id, text, source, state, owner, attempts, received_at, available_at, updated_at)"
+                " VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (capture_id, text, source, RECEIVED, os.getpid() if claim else None, int(claim), now, now, now),
+            )
+            if not claim:
+                self._ready.notify()
+        return capture_id
+
+    def claim(self, capture_id: str | None = None) -> dict | None:
+        """
+        Take ownership of the oldest unowned, unfinished capture that is due
+        (or of *capture_id* only), or return None if there is none.
+        """
+        now = time.time()
+        where = "state NOT IN (?, ?, ?) AND owner IS NULL AND available_at <= ?"
+        params = [*TERMINAL, now]
+        if capture_id is not None:
+            where += " AND id = ?"
+            params.append(capture_id)
+        with self._lock:
+            row = self._connect().execute(
+                "UPDATE captures SET owner = ?, attempts = attempts + 1, updated_at = ?"
+                f" WHERE seq = (SELECT seq FROM captures WHERE {where} ORDER BY seq LIMIT 1)"
+                " RETURNING id",
+                (os.getpid(), now, *params),
+            ).fetchone()
+        return self.get(row[0]) if row else None
+
+    def wait(self, timeout: float) -> None:
+        """Block until receive() queues a capture in this process, or *timeout* seconds pass."""
+        with self._ready:
+            self._ready.wait(timeout)
+
+    def wake_all(self) -> None:
+        """Release every wait(), e.g. so workers notice a shutdown."""
+        with self._ready:
+            self._ready.notify_all()
+
+    def recover(self) -> list[str]:
+        """
+        Release unfinished captures whose owning process has died, so they
+        can be claimed again. Returns their IDs.
+        """
+        with self._lock:
+            owned = self._connect().execute(
+                "SELECT id, owner FROM captures WHERE owner IS NOT NULL AND state NOT IN (?, ?, ?)", TERMINAL,
+            ).fetchall()
+        orphans = [capture_id for capture_id, owner in owned if not _process_alive(owner)]
+        if orphans:
+            with self._transaction() as conn:
+                conn.executemany(
+                    "UPDATE captures SET owner = NULL, available_at = ? WHERE id = ?",
+                    [(time.time(), capture_id) for capture_id in orphans],
+                )
+            logger.warning("Recovered %d capture(s) left unfinished by a stopped process", len(orphans))
+        with self._ready:
+            self._ready.notify_all()
+        return orphans
+
+    def split(self, capture_id: str, intents: list) -> None:
+        """Record the model's intents for a capture."""
+        self._set_state(capture_id, SPLIT, intents=json.dumps(intents))
+
+    def add_items(self, capture_id: str, items: list[dict]) -> list[dict]:
+        """
+        Record validated items that are about to be written, without
+        settling the capture (used while intents are still streaming in).
+        Returns the items with their store "id" added.
+        """
+        with self._transaction() as conn:
+            return self._insert_items(conn, capture_id, items)
+
+    def validated(self, capture_id: str, items: list[dict] = (), intents: list | None = None) -> list[dict]:
+        """
+        Record the last validated items of a capture; from here it settles
+        as soon as none of its items are pending. Returns the items with
+        their store "id" added.
+        """
+        with self._transaction() as conn:
+            added = self._insert_items(conn, capture_id, items)
+            fields = {"intents": json.dumps(intents)} if intents is not None else {}
+            self._update(conn, capture_id, state=VALIDATED, **fields)
+            self._settle(conn, capture_id)
+        return added
+
+    def fail(self, capture_id: str, error: str) -> bool:
+        """Release a capture after a failed attempt. Returns True if it will be retried."""
+        now = time.time()
+        with self._transaction() as conn:
+            (attempts,) = conn.execute("SELECT attempts FROM captures WHERE id = ?", (capture_id,)).fetchone()
+            retry = attempts < self.max_attempts
+            if retry:
+                self._update(conn, capture_id, owner=None, error=error,
+                             available_at=now + self.retry_delay * 2 ** max(0, attempts - 1))
+            else:
+                self._update(conn, capture_id, owner=None, error=error, state=FAILED, finished_at=now)
+        return retry
+
+    # ---------- Items ----------
+
+    def pending_items(self, capture_id: str) -> list[dict]:
+        """Items of a capture still waiting to be written, in order."""
+        with self._lock:
+            rows = self._connect().execute(
+                "SELECT id, item FROM items WHERE capture_id = ? AND state = ? ORDER BY position",
+                (capture_id, VALIDATED),
+            ).fetchall()
+        return [{**json.loads(item), "id": item_id} for item_id, item in rows]
+
+    def item_written(self, item: dict, page_id: str) -> None:
+        self._finish_item(item, WRITTEN, page_id=page_id)
+
+    def item_skipped(self, item: dict) -> None:
+        self._finish_item(item, SKIPPED)
+
+    def dead_letter(self, item: dict, raw_input: str, error: str | None = None) -> None:
+        """
+        Mark *item* dead-lettered. An item that was never recorded (written
+        outside a capture, e.g. by --batch) gets a capture of its own, so
+        --flush can still replay it.
+        """
+        if "id" not in item:
+            with self._transaction() as conn:
+                capture_id = self._insert_capture(conn, raw_input, source="dead_letter", state=VALIDATED)
+                item = self._insert_items(conn, capture_id, [item])[0]
+        self._finish_item(item, DEAD_LETTERED, error=error)
+        logger.warning('Dead-lettered %s "%s"', item["type"], item["title"])
+
+    def import_dead_letters(self, entries: list[tuple[dict, str, str | None]]) -> None:
+        """Record (item, raw_input, failed_at) entries from an old dead_letter.jsonl in one transaction."""
+        with self._transaction() as conn:
+            for item, raw_input, failed_at in entries:
+                capture_id = self._insert_capture(conn, raw_input, source="dead_letter.jsonl", state=DEAD_LETTERED)
+                item_id = self._insert_items(conn, capture_id, [item])[0]["id"]
+                conn.execute("UPDATE items SET state = ?, error = ? WHERE id = ?",
+                             (DEAD_LETTERED, f"imported (failed at {failed_at})", item_id))
+
+    def requeue_dead_letters(self) -> list[str]:
+        """
+        Claim every dead-lettered capture for this process and put its
+        dead-lettered items back to pending. Returns the capture IDs.
+        """
+        now = time.time()
+        with self._transaction() as conn:
+            ids = [row[0] for row in conn.execute(
+                "UPDATE captures SET state = ?, owner = ?, updated_at = ?, finished_at = NULL"
+                " WHERE state = ? AND owner IS NULL RETURNING id",
+                (VALIDATED, os.getpid(), now, DEAD_LETTERED),
+            ).fetchall()]
+            conn.executemany(
+                "UPDATE items SET state = ?, updated_at = ? WHERE capture_id = ? AND state = ?",
+                [(VALIDATED, now, capture_id, DEAD_LETTERED) for capture_id in ids],
+            )
+        return ids
+
+    # ---------- Reads ----------
+
+    def get(self, capture_id: str) -> dict | None:
+        with self._lock:
+            conn = self._connect()
+            cursor = conn.execute(
+                "SELECT id, text, source, state, attempts, received_at, updated_at, finished_at, intents, error"
+                " FROM captures WHERE id = ?",
+                (capture_id,),
+            )
+            row = cursor.fetchone()
+            if row is None:
+                return None
+            capture = dict(zip((c[0] for c in cursor.description), row))
+            items = conn.execute(
+                "SELECT id, item, state, page_id, error FROM items WHERE capture_id = ? ORDER BY position",
+                (capture_id,),
+            ).fetchall()
+        capture["intents"] = json.loads(capture["intents"]) if capture["intents"] else None
+        capture["items"] = [
+            {**json.loads(item), "id": item_id, "state": state, "page_id": page_id, "error": error}
+            for item_id, item, state, page_id, error in items
+        ]
+        capture["page_ids"] = [item["page_id"] for item in capture["items"]]
+        return capture
+
+    def counts(self) -> dict:
+        """Number of captures in each state."""
+        with self._lock:
+            rows = self._connect().execute("SELECT state, COUNT(*) FROM captures GROUP BY state").fetchall()
+        return {state: 0 for state in STATES} | dict(rows)
+
+    def iter_captures(self, state: str | None = None):
+        """(id, received_at, text, state, error) rows, oldest first."""
+        query = "SELECT id, received_at, text, state, error FROM captures"
+        params = ()
+        if state:
+            query += " WHERE state = ?"
+            params = (state,)
+        with self._lock:
+            rows = self._connect().execute(query + " ORDER BY seq", params).fetchall()
+        return iter(rows)
+
+    def close(self) -> None:
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+    # ---------- Internals (caller holds the lock) ----------
+
+    def _insert_capture(self, conn, text, source, state):
+        capture_id = uuid.uuid4().hex
+        now = time.time()
+        conn.execute(
+            "INSERT INTO captures (id, text, source, state, received_at, available_at, updated_at)"
+            " VALUES (?, ?, ?, ?, ?, ?, ?)",
+            (capture_id, text, source, state, now, now, now),
+        )
+        return capture_id
+
+    def _insert_items(self, conn, capture_id, items):
+        (position,) = conn.execute("SELECT COUNT(*) FROM items WHERE capture_id = ?", (capture_id,)).fetchone()
+        added = []
+        for offset, item in enumerate(items):
+            item_id = uuid.uuid4().hex
+            fields = {k: item[k] for k in _ITEM_FIELDS if k in item}
+            conn.execute(
+                "INSERT INTO items (id, capture_id, position, item, state, updated_at) VALUES (?, ?, ?, ?, ?, ?)",
+                (item_id, capture_id, position + offset, json.dumps(fields), VALIDATED, time.time()),
+            )
+            added.append({**fields, "id": item_id})
+        return added
+
+    def _update(self, conn, capture_id, **fields):
+        fields["updated_at"] = time.time()
+        assignments = ", ".join(f"{name} = ?" for name in fields)
+        conn.execute(f"UPDATE captures SET {assignments} WHERE id = ?", (*fields.values(), capture_id))
+
+    def _set_state(self, capture_id, state, **fields):
+        with self._transaction() as conn:
+            self._update(conn, capture_id, state=state, **fields)
+
+    def _finish_item(self, item, state, page_id=None, error=None):
+        if "id" not in item:
+            return
+        with self._transaction() as conn:
+            row = conn.execute(
+                "UPDATE items SET state = ?, page_id = ?, error = ?, updated_at = ? WHERE id = ? RETURNING capture_id",
+                (state, page_id, error, time.time(), item["id"]),
+            ).fetchone()
+            if row:
+                self._settle(conn, row[0])
+
+    def _settle(self, conn, capture_id):
+        """Finish a validated capture once none of its items are pending."""
+        (state,) = conn.execute("SELECT state FROM captures WHERE id = ?", (capture_id,)).fetchone()
+        if state != VALIDATED:
+            return
+        pending, dead = conn.execute(
+            "SELECT COALESCE(SUM(state = ?), 0), COALESCE(SUM(state = ?), 0) FROM items WHERE capture_id = ?",
+            (VALIDATED, DEAD_LETTERED, capture_id),
+        ).fetchone()
+        if not pending:
+            self._update(conn, capture_id, state=DEAD_LETTERED if dead else WRITTEN,
+                         owner=None, finished_at=time.time())
+
+
+store = CaptureStore()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Inspect the capture store")
+    parser.add_argument("--path", type=Path, default=STORE_PATH)
+    group = parser.add_mutually_exclusive_group()
+    group.add_argument("--state", choices=STATES, help="List captures in this state")
+    group.add_argument("--export", action="store_true", help="Print every capture as JSONL for main.py --batch")
+    args = parser.parse_args()
+
+    if not args.path.exists():
+        print(f"No capture store at {args.path}", file=sys.stderr)
+        sys.exit(1)
+    s = CaptureStore(args.path)
+    if args.export:
+        for _, received_at, text, _, _ in s.iter_captures():
+            ts = datetime.fromtimestamp(received_at, timezone.utc).isoformat()
+            print(json.dumps({"ts": ts, "input": text}, ensure_ascii=False))
+    elif args.state:
+        for capture_id, received_at, text, _, error in s.iter_captures(args.state):
+            ts = datetime.fromtimestamp(received_at).strftime("%Y-%m-%d %H:%M")
+            print(f"{capture_id}  {ts}  {text[:60]!r}" + (f"  ({error})" if error else ""))
+    else:
+        for state, count in s.counts().items():
+            print(f"{state:<14} {count}")
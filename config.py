@@ -11,3 +11,34 @@ NOTION_REMINDERS_DB = os.getenv("REMINDERS_DB_ID")
 TEST_DB = os.getenv("TEST_DB_ID")
 
 LLM_API_KEY = os.getenv("LLM_API_KEY")
+GEMINI_API_KEY = os.getenv("GEMINI_API_KEY")
+
+# How long a successful Notion schema check stays valid (seconds)
+SCHEMA_CACHE_TTL = int(os.getenv("SCHEMA_CACHE_TTL", str(24 * 60 * 60)))
+
+# Max Notion writes in flight per capture — Notion allows ~3 requests/second
+NOTION_MAX_CONCURRENCY = int(os.getenv("NOTION_MAX_CONCURRENCY", "3"))
+
+# Stream intents from Gemini and start each Notion write as soon as its intent
+# arrives (only when no review window will open)
+STREAM_WRITES = os.getenv("TRIAGE_STREAM", "0") == "1"
+
+# Skip writing a page whose type and title were already created this many
+# seconds ago (see page_index.py); 0 turns duplicate suppression off
+DEDUP_WINDOW = int(os.getenv("TRIAGE_DEDUP_WINDOW", str(24 * 60 * 60)))
+
+# Proactive Notion rate limit, shared by every triage process on this machine
+NOTION_RATE_LIMIT = float(os.getenv("NOTION_RATE_LIMIT", "3"))   # requests/second
+NOTION_RATE_BURST = float(os.getenv("NOTION_RATE_BURST", "3"))
+NOTION_RATE_SHARED = os.getenv("NOTION_RATE_SHARED", "1") == "1"
+
+# Local triage daemon (daemon.py) — ui.py and the CLI hand captures to it
+DAEMON_HOST = "127.0.0.1"
+DAEMON_PORT = int(os.getenv("TRIAGE_DAEMON_PORT", "47615"))
+DAEMON_AUTHKEY = os.getenv("TRIAGE_DAEMON_KEY", "triage-local").encode()
+
+# Local HTTP capture service (server.py)
+SERVER_HOST = os.getenv("TRIAGE_SERVER_HOST", "127.0.0.1")
+SERVER_PORT = int(os.getenv("TRIAGE_SERVER_PORT", "47616"))
+SERVER_WORKERS = int(os.getenv("TRIAGE_SERVER_WORKERS", "2"))
+SERVER_TOKEN = os.getenv("TRIAGE_SERVER_TOKEN")  # required as a Bearer token when set
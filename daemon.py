@@ -0,0 +1,245 @@
+#!/usr/bin/env python3
+"""
+Long-running triage daemon.
+
+Keeps the Gemini and Notion clients, splitter prompt and schema warm so a
+capture only costs a localhost round trip. ui.py and `daemon.py --send` are
+thin clients: they hand off the raw text and return as soon as it is queued.
+
+Usage:
+    python daemon.py                         # run the daemon in the foreground
+    python daemon.py --send "buy milk"       # hand one capture to the daemon
+    python daemon.py --ping                  # check whether a daemon is up
+    python daemon.py --stop                  # ask a running daemon to exit
+
+This module must stay cheap to import — the heavy pipeline is only imported
+when the server starts.
+"""
+import argparse
+import hmac
+import json
+import logging
+import queue
+import socket
+import sys
+import threading
+import time
+
+import metrics
+from config import DAEMON_AUTHKEY, DAEMON_HOST, DAEMON_PORT
+
+logger = logging.getLogger(__name__)
+
+DAEMON_ADDRESS = (DAEMON_HOST, DAEMON_PORT)
+
+_STOP = object()
+_RESUME = object()
+
+
+class TriageDaemon:
+    """
+    Accepts captures on a local socket and triages them one at a time.
+
+    Each capture is recorded in the capture store before it is acked, and
+    on start-up the daemon runs the recovery pass for captures a previous
+    process left unfinished.
+
+    The accept loop runs on a background thread and hands each connection
+    to a short-lived thread of its own, which only enqueues; captures
+    are processed by whichever thread calls serve_forever() — normally the
+    main thread, because the feedback review window is a Tk window.
+    """
+
+    def __init__(self, address=DAEMON_ADDRESS, authkey=DAEMON_AUTHKEY, handler=None, store=None):
+        self.address = address
+        self._authkey = authkey
+        self._handler = handler
+        self._store = store
+        self._resume = None
+        self._queue = queue.Queue()
+        self._sock = None
+        self.ready = threading.Event()
+
+    def _warm_up(self):
+        # Importing main constructs the Gemini and Notion clients once for the
+        # lifetime of the daemon instead of once per capture.
+        from main import resume_captures, triage_capture
+        from notion import validate_notion_schemas
+        from prompt import assembler
+
+        validate_notion_schemas()
+        assembler.get()
+        self._resume = resume_captures
+        return triage_capture
+
+    def serve_forever(self):
+        if self._handler is None:
+            self._handler = self._warm_up()
+        if self._store is None:
+            from capture_store import store
+
+            self._store = store
+
+        self._sock = socket.create_server(self.address)
+        self.address = self._sock.getsockname()[:2]  # resolves port 0
+        threading.Thread(target=self._accept_loop, name="daemon-accept", daemon=True).start()
+        logger.info("Triage daemon listening on %s:%s", *self.address)
+        self.ready.set()
+
+        if self._resume is not None:
+            self._queue.put(_RESUME)  # recovery pass, once the socket is accepting captures
+
+        try:
+            while True:
+                job = self._queue.get()
+                if job is _STOP:
+                    break
+                if job is _RESUME:
+                    try:
+                        self._resume()
+                    except Exception:
+                        logger.exception("Daemon recovery pass failed")
+                    continue
+                capture_id, interactive, queued_at = job
+                capture = self._store.get(capture_id)
+                try:
+                    with metrics.span("capture", entry="daemon"):
+                        metrics.record("daemon.queue_wait", (time.perf_counter() - queued_at) * 1000)
+                        self._handler(capture, interactive_feedback=interactive)
+                except Exception as e:
+                    logger.exception('Daemon failed to triage: "%s"', capture["text"][:80])
+                    self._store.fail(capture_id, f"{type(e).__name__}: {e}")
+        finally:
+            try:
+                self._sock.shutdown(socket.SHUT_RDWR)  # wakes accept() on Linux
+            except OSError:
+                pass
+            self._sock.close()
+            logger.info("Triage daemon stopped")
+
+    def stop(self):
+        self._queue.put(_STOP)
+
+    def _accept_loop(self):
+        while True:
+            try:
+                conn, _ = self._sock.accept()
+            except OSError:
+                return  # socket closed
+            # One short-lived thread per connection, so a slow client can't hold up the rest
+            threading.Thread(target=self._serve_connection, args=(conn,), name="daemon-conn", daemon=True).start()
+
+    def _serve_connection(self, conn):
+        with conn:
+            try:
+                conn.settimeout(_TIMEOUT)
+                reply = self._handle(_recv_message(conn))
+                _send_message(conn, reply)
+            except (OSError, ValueError) as e:
+                logger.warning("Daemon connection dropped: %s", e)
+            except Exception:
+                logger.exception("Daemon connection failed")
+
+    def _handle(self, msg):
+        if not isinstance(msg, dict):
+            return {"ok": False, "error": "expected a JSON object"}
+        if not hmac.compare_digest(str(msg.get("key", "")).encode(), self._authkey):
+            return {"ok": False, "error": "bad key"}
+        op = msg.get("op")
+        if op == "capture":
+            text = (msg.get("text") or "").strip()
+            if not text:
+                return {"ok": False, "error": "empty input"}
+            try:
+                # Committed before the ack, so a daemon crash can't lose the capture
+                capture_id = self._store.receive(text, source="daemon", claim=True)
+            except Exception as e:
+                logger.error("Daemon could not record capture: %s", e)
+                return {"ok": False, "error": "capture store unavailable"}
+            self._queue.put((capture_id, bool(msg.get("interactive", True)), time.perf_counter()))
+            return {"ok": True, "queued": self._queue.qsize()}
+        if op == "ping":
+            return {"ok": True, "queued": self._queue.qsize()}
+        if op == "stop":
+            self.stop()
+            return {"ok": True}
+        return {"ok": False, "error": f"unknown op: {op}"}
+
+
+# ---------- Wire format: one JSON object per line, each way ----------
+
+_TIMEOUT = 5  # seconds
+
+
+def _send_message(conn, msg):
+    conn.sendall(json.dumps(msg).encode("utf-8") + b"\n")
+
+
+def _recv_message(conn):
+    with conn.makefile("rb") as f:
+        line = f.readline()
+    if not line:
+        raise ValueError("connection closed before a message arrived")
+    return json.loads(line)
+
+
+# ---------- Thin client ----------
+
+def _request(msg, address=DAEMON_ADDRESS, authkey=DAEMON_AUTHKEY):
+    """Send one message to the daemon. Returns the reply, or None if nobody is listening."""
+    try:
+        conn = socket.create_connection(address, timeout=_TIMEOUT)
+    except OSError:
+        return None
+    with conn:
+        try:
+            conn.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+            _send_message(conn, {**msg, "key": authkey.decode()})
+            return _recv_message(conn)
+        except (OSError, ValueError) as e:
+            logger.warning("Daemon request failed: %s", e)
+            return None
+
+
+def send_capture(text, interactive=True, address=DAEMON_ADDRESS, authkey=DAEMON_AUTHKEY) -> bool:
+    """Hand *text* to a running daemon. Returns False if no daemon accepted it."""
+    reply = _request(
+        {"op": "capture", "text": text, "interactive": interactive},
+        address=address, authkey=authkey,
+    )
+    return bool(reply and reply.get("ok"))
+
+
+def is_running(address=DAEMON_ADDRESS, authkey=DAEMON_AUTHKEY) -> bool:
+    return _request({"op": "ping"}, address=address, authkey=authkey) is not None
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    group = parser.add_mutually_exclusive_group()
+    group.add_argument("--send", metavar="TEXT", help="Hand one capture to the running daemon")
+    group.add_argument("--ping", action="store_true", help="Exit 0 if a daemon is listening")
+    group.add_argument("--stop", action="store_true", help="Ask the running daemon to exit")
+    parser.add_argument("--no-interactive", action="store_true", help="Bypass the feedback popup for --send")
+    args = parser.parse_args()
+
+    if args.send is not None:
+        if not send_capture(args.send, interactive=not args.no_interactive):
+            print("No triage daemon is running.", file=sys.stderr)
+            sys.exit(1)
+    elif args.ping:
+        sys.exit(0 if is_running() else 1)
+    elif args.stop:
+        reply = _request({"op": "stop"})
+        if not (reply and reply.get("ok")):
+            print((reply or {}).get("error") or "No triage daemon is running.", file=sys.stderr)
+            sys.exit(1)
+        print("Triage daemon stopped.")
+    elif is_running():
+        print("A triage daemon is already running.", file=sys.stderr)
+    else:
+        from main import setup_logging
+
+        setup_logging()
+        metrics.enable()
+        TriageDaemon().serve_forever()
@@ -6,20 +6,40 @@ Usage:
     python evaluation/eval.py
     python evaluation/eval.py --real-only   # skip synthetic cases
     python evaluation/eval.py --tag task    # filter by tag
+    python evaluation/eval.py --no-cache    # always call the live model
+    python evaluation/eval.py --preclassifier   # let the local fast path answer
+                                                # (off by default: it trains on cases.json)
+    python evaluation/eval.py --workers 8 --rate 4 --out results.json
+    python evaluation/eval.py --fresh       # ignore stored results, re-run every case
+    python evaluation/eval.py --runs        # list stored runs
+    python evaluation/eval.py --diff previous latest   # compare two runs (IDs or --out files)
+
+Unchanged case/prompt/few-shot/model combinations are served from
+evaluation/eval_store.sqlite3 instead of calling the model.
 
 Must be run from the project root (so splitter_prompt.txt is found).
 """
 import argparse
+import hashlib
 import json
 import os
 import sys
+import time
+import uuid
 from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
 from pathlib import Path
 
 sys.path.insert(0, str(Path(__file__).parent.parent))
 os.chdir(Path(__file__).parent.parent)
 
-from llm import split_intents
+import llm
+from feedback import is_feedback_enabled
+from llm import MODEL, last_usage, split_intents
+from prompt import assembler
+from ratelimit import TokenBucket
+from run_store import RunStore, case_hash, diff_runs, print_diff
 
 CASES_PATH = Path(__file__).parent / "cases.json"
 
@@ -73,7 +93,71 @@ def score_case(case, actual):
     return not failures, failures
 
 
-def run(real_only=False, tag_filter=None):
+# ---------- Concurrent runner ----------
+
+_TRANSIENT_CODES = {408, 429, 500, 502, 503, 504}
+
+
+def _is_transient(exc):
+    import httpx
+
+    code = getattr(exc, "code", None) or getattr(exc, "status", None)
+    # httpx.TransportError covers timeouts (llm.REQUEST_TIMEOUT) and dropped connections
+    return code in _TRANSIENT_CODES or isinstance(exc, (TimeoutError, ConnectionError, httpx.TransportError))
+
+
+def run_case(case, limiter=None, retries=2, use_cache=True, use_preclassifier=False):
+    """
+    Evaluate one case, retrying transient errors. Never raises — errors fail
+    the case. Per-attempt timeouts are llm.REQUEST_TIMEOUT, enforced by the
+    HTTP client, so a timed-out attempt is over before the retry starts.
+    """
+    start = time.perf_counter()
+    attempts, actual, usage, error = 0, [], None, None
+
+    while True:
+        attempts += 1
+        if limiter:
+            limiter.acquire()
+        try:
+            actual = split_intents(case["input"], use_cache=use_cache, use_preclassifier=use_preclassifier)
+            usage = last_usage()
+            error = None
+            break
+        except Exception as e:
+            error = f"{type(e).__name__}: {e}"
+            if attempts > retries or not _is_transient(e):
+                break
+            time.sleep(min(2 ** attempts, 30))
+
+    ok, failures = score_case(case, actual) if error is None else (False, [f"error: {error}"])
+    return {
+        "id": case["id"],
+        "input": case["input"],
+        "source": case.get("source", "synthetic"),
+        "tags": case.get("tags", []),
+        "passed": ok,
+        "failures": failures,
+        "actual": actual,
+        "latency_ms": round((time.perf_counter() - start) * 1000, 1),
+        "attempts": attempts,
+        "usage": usage,
+        "error": error,
+    }
+
+
+def _print_result(r):
+    label = "PASS" if r["passed"] else "FAIL"
+    print(f"{label}  [{r['id']}]  {r['input'][:70]!r}  ({r['latency_ms']:.0f} ms)")
+    for f in r["failures"]:
+        print(f"       → {f}")
+    if not r["passed"]:
+        for a in r["actual"]:
+            print(f"       got: {a.get('type')} {a.get('title')!r}")
+
+
+def run(real_only=False, tag_filter=None, use_cache=True, use_preclassifier=False,
+        workers=4, rate=None, timeout=60.0, retries=2, out_path=None, store=None, fresh=False):
     data = json.loads(CASES_PATH.read_text(encoding="utf-8"))
     cases = data["cases"]
 
@@ -86,38 +170,66 @@ def run(real_only=False, tag_filter=None):
         print("No cases matched filters.")
         return
 
-    passed_total = 0
-    source_stats = defaultdict(lambda: [0, 0])
-    tag_stats = defaultdict(lambda: [0, 0])
+    try:
+        if hasattr(sys.stdout, "reconfigure"):
+            sys.stdout.reconfigure(encoding="utf-8")
+    except Exception:
+        pass
 
-    for case in cases:
-        actual = split_intents(case["input"])
-        ok, failures = score_case(case, actual)
+    limiter = TokenBucket(rate, capacity=max(1.0, rate)) if rate else None
+    llm.REQUEST_TIMEOUT = timeout
+    started = datetime.now(timezone.utc)
+    wall_start = time.perf_counter()
 
-        label = "PASS" if ok else "FAIL"
-        print(f"{label}  [{case['id']}]  {case['input'][:70]!r}")
-        for f in failures:
-            print(f"       → {f}")
-        if not ok:
-            for a in actual:
-                print(f"       got: {a.get('type')} {a.get('title')!r}")
+    include_few_shot = is_feedback_enabled()
+    prompt = assembler.get(include_few_shot=include_few_shot)
+    mode = "preclassifier" if use_preclassifier else "llm"
+    # Few-shot examples are retrieved per input, so each case is keyed on its own block
+    few_shot_digests = {
+        case["id"]: assembler.get(include_few_shot=include_few_shot, query=case["input"]).few_shot_digest
+        for case in cases
+    }
 
-        if ok:
-            passed_total += 1
+    def store_key(case):
+        return (case["id"], case_hash(case), prompt.base_digest, few_shot_digests[case["id"]], MODEL, mode)
 
-        src = case.get("source", "synthetic")
-        source_stats[src][1] += 1
-        if ok:
-            source_stats[src][0] += 1
+    # Results are printed in case order as soon as each prefix is complete
+    results, from_store = [], 0
+    with ThreadPoolExecutor(max_workers=max(1, workers), thread_name_prefix="eval") as pool:
+        futures = []
+        for case in cases:
+            stored = store.get_case(store_key(case)) if store and not fresh else None
+            if stored is not None:
+                futures.append({**stored, "from_store": True})
+            else:
+                futures.append(pool.submit(run_case, case, limiter, retries, use_cache, use_preclassifier))
+        for case, fut in zip(cases, futures):
+            if isinstance(fut, dict):
+                r = fut
+                from_store += 1
+            else:
+                r = fut.result()
+                if store and r["error"] is None:
+                    store.put_case(store_key(case), r)
+            _print_result(r)
+            results.append(r)
 
-        for tag in case.get("tags", []):
+    duration = time.perf_counter() - wall_start
+    passed_total = sum(r["passed"] for r in results)
+    source_stats = defaultdict(lambda: [0, 0])
+    tag_stats = defaultdict(lambda: [0, 0])
+    for r in results:
+        source_stats[r["source"]][1] += 1
+        source_stats[r["source"]][0] += r["passed"]
+        for tag in r["tags"]:
             tag_stats[tag][1] += 1
-            if ok:
-                tag_stats[tag][0] += 1
+            tag_stats[tag][0] += r["passed"]
 
     total = len(cases)
     pct = 100 * passed_total / total if total else 0
-    print(f"\nResults: {passed_total}/{total} passed ({pct:.1f}%)")
+    print(f"\nResults: {passed_total}/{total} passed ({pct:.1f}%) in {duration:.1f}s")
+    if from_store:
+        print(f"         {from_store}/{total} served from the eval store")
 
     print("\nBy source:")
     for src in sorted(source_stats):
@@ -125,12 +237,6 @@ def run(real_only=False, tag_filter=None):
         pct_s = 100 * p / n if n else 0
         print(f"  {src:<12} {p}/{n} ({pct_s:.0f}%)")
 
-    try:
-        if hasattr(sys.stdout, "reconfigure"):
-            sys.stdout.reconfigure(encoding="utf-8")
-    except Exception:
-        pass
-
     print("\nBy tag:")
     for tag in sorted(tag_stats):
         p, n = tag_stats[tag]
@@ -141,10 +247,82 @@ def run(real_only=False, tag_filter=None):
             bar = "#" * p + "-" * (n - p)
             print(f"  {tag:<16} {p:>2}/{n:<2}  {bar}")
 
+    summary = {
+        "run_id": f"{started:%Y%m%d-%H%M%S}-{uuid.uuid4().hex[:6]}",
+        "started_at": started.isoformat(),
+        "model": MODEL,
+        "mode": mode,
+        "prompt_hash": prompt.base_digest,
+        "few_shot_hash": hashlib.sha256("".join(few_shot_digests.values()).encode("utf-8")).hexdigest(),
+        "from_store": from_store,
+        "workers": workers,
+        "rate": rate,
+        "duration_s": round(duration, 2),
+        "passed": passed_total,
+        "total": total,
+        "source_stats": {k: {"passed": p, "total": n} for k, (p, n) in sorted(source_stats.items())},
+        "tag_stats": {k: {"passed": p, "total": n} for k, (p, n) in sorted(tag_stats.items())},
+        "cases": results,
+    }
+    if store:
+        store.save_run(summary)
+        print(f"\nSaved run {summary['run_id']}")
+    if out_path:
+        Path(out_path).write_text(json.dumps(summary, indent=2, ensure_ascii=False), encoding="utf-8")
+        print(f"Wrote {out_path}")
+    return summary
+
+
+def diff(store, ref_a, ref_b):
+    a, b = store.load_run(ref_a), store.load_run(ref_b)
+    d = diff_runs(a, b)
+    print_diff(d, {r["id"]: r for r in a["cases"]}, {r["id"]: r for r in b["cases"]})
+    return d
+
+
+def list_runs(store):
+    for r in store.list_runs():
+        print(
+            f"{r['run_id']}  {r['passed']:>3}/{r['total']:<3}  {r['model']}  {r.get('mode', 'llm'):<13}"
+            f"  {r['duration_s']:>6.1f}s  few-shot {r['few_shot_hash'][:8]}"
+        )
+
 
 if __name__ == "__main__":
     parser = argparse.ArgumentParser()
     parser.add_argument("--real-only", action="store_true", help="Only run real (non-synthetic) cases")
     parser.add_argument("--tag", help="Only run cases with this tag")
+    parser.add_argument("--no-cache", action="store_true", help="Bypass the split_intents response cache")
+    parser.add_argument("--preclassifier", action="store_true", help="Let the local pre-classifier short-circuit cases")
+    parser.add_argument("--workers", type=int, default=4, help="Cases evaluated concurrently")
+    parser.add_argument("--rate", type=float, default=4.0, help="Max model requests per second (0 = unlimited)")
+    parser.add_argument("--timeout", type=float, default=60.0, help="Per-attempt timeout in seconds")
+    parser.add_argument("--retries", type=int, default=2, help="Retries on transient errors (429/5xx/timeouts)")
+    parser.add_argument("--out", help="Write per-case results (incl. latency) to this JSON file")
+    parser.add_argument("--fresh", action="store_true", help="Ignore stored case results and re-run every case")
+    parser.add_argument("--diff", nargs=2, metavar=("RUN_A", "RUN_B"),
+                        help="Compare two runs: run IDs, 'latest'/'previous', or --out JSON files")
+    parser.add_argument("--runs", action="store_true", help="List stored runs")
     args = parser.parse_args()
-    run(real_only=args.real_only, tag_filter=args.tag)
+
+    store = RunStore()
+    if args.diff:
+        diff(store, *args.diff)
+        sys.exit(0)
+    if args.runs:
+        list_runs(store)
+        sys.exit(0)
+
+    run(
+        real_only=args.real_only,
+        tag_filter=args.tag,
+        use_cache=not args.no_cache,
+        use_preclassifier=args.preclassifier,
+        workers=args.workers,
+        rate=args.rate or None,
+        timeout=args.timeout,
+        retries=args.retries,
+        out_path=args.out,
+        store=store,
+        fresh=args.fresh,
+    )
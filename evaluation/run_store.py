@@ -0,0 +1,191 @@
+"""
+Persistent store for eval runs.
+
+Every case result is saved keyed by (case ID, case content hash, base prompt
+hash, few-shot hash, model, mode). A later run with the same key is served
+from the store instead of calling the model. Each run's full result list is
+saved too, so any two runs can be diffed.
+"""
+import hashlib
+import json
+import sqlite3
+from datetime import datetime, timezone
+from pathlib import Path
+
+STORE_PATH = Path(__file__).parent / "eval_store.sqlite3"
+
+
+def case_hash(case: dict) -> str:
+    """Hash of everything that affects a case's outcome, so editing a case re-runs it."""
+    blob = json.dumps({"input": case["input"], "expected": case["expected"]}, sort_keys=True)
+    return hashlib.sha256(blob.encode("utf-8")).hexdigest()[:16]
+
+
+class RunStore:
+    def __init__(self, path: Path = STORE_PATH):
+        self.path = Path(path)
+        self._conn = sqlite3.connect(self.path, check_same_thread=False)
+        self._conn.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS case_results (
+                case_id TEXT NOT NULL,
+                case_hash TEXT NOT NULL,
+                prompt_hash TEXT NOT NULL,
+                few_shot_hash TEXT NOT NULL,
+                model TEXT NOT NULL,
+                mode TEXT NOT NULL,
+                result TEXT NOT NULL,
+                created_at TEXT NOT NULL,
+                PRIMARY KEY (case_id, case_hash, prompt_hash, few_shot_hash, model, mode)
+            );
+            CREATE TABLE IF NOT EXISTS runs (
+                run_id TEXT PRIMARY KEY,
+                started_at TEXT NOT NULL,
+                summary TEXT NOT NULL
+            );
+            """
+        )
+
+    def get_case(self, key: tuple) -> dict | None:
+        row = self._conn.execute(
+            "SELECT result FROM case_results WHERE case_id = ? AND case_hash = ? AND prompt_hash = ?"
+            " AND few_shot_hash = ? AND model = ? AND mode = ?",
+            key,
+        ).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def put_case(self, key: tuple, result: dict) -> None:
+        with self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO case_results VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (*key, json.dumps(result, ensure_ascii=False), datetime.now(timezone.utc).isoformat()),
+            )
+
+    def save_run(self, summary: dict) -> None:
+        with self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO runs VALUES (?, ?, ?)",
+                (summary["run_id"], summary["started_at"], json.dumps(summary, ensure_ascii=False)),
+            )
+
+    def load_run(self, ref: str) -> dict:
+        """Load a run by ID, "latest", "previous", or from a JSON file written with --out."""
+        if ref in ("latest", "previous"):
+            offset = 0 if ref == "latest" else 1
+            row = self._conn.execute(
+                "SELECT summary FROM runs ORDER BY started_at DESC LIMIT 1 OFFSET ?", (offset,)
+            ).fetchone()
+        else:
+            row = self._conn.execute("SELECT summary FROM runs WHERE run_id = ?", (ref,)).fetchone()
+        if row:
+            return json.loads(row[0])
+        if Path(ref).is_file():
+            return json.loads(Path(ref).read_text(encoding="utf-8"))
+        raise KeyError(f"no eval run {ref!r} in {self.path} and no such file")
+
+    def list_runs(self, limit: int = 20) -> list[dict]:
+        rows = self._conn.execute(
+            "SELECT summary FROM runs ORDER BY started_at DESC LIMIT ?", (limit,)
+        ).fetchall()
+        return [json.loads(r[0]) for r in rows]
+
+
+# ---------- Diffing ----------
+
+def _rate(stats: dict) -> float:
+    return stats["passed"] / stats["total"] if stats["total"] else 0.0
+
+
+def _mean(values):
+    values = [v for v in values if v is not None]
+    return sum(values) / len(values) if values else None
+
+
+def _tokens(result: dict) -> int | None:
+    usage = result.get("usage") or {}
+    return usage.get("total_tokens")
+
+
+def diff_runs(a: dict, b: dict) -> dict:
+    """Compare run *b* against baseline *a*."""
+    a_cases = {r["id"]: r for r in a["cases"]}
+    b_cases = {r["id"]: r for r in b["cases"]}
+    common = [cid for cid in b_cases if cid in a_cases]
+
+    newly_failing = [cid for cid in common if a_cases[cid]["passed"] and not b_cases[cid]["passed"]]
+    newly_passing = [cid for cid in common if not a_cases[cid]["passed"] and b_cases[cid]["passed"]]
+
+    tags = sorted(set(a.get("tag_stats", {})) | set(b.get("tag_stats", {})))
+    empty = {"passed": 0, "total": 0}
+    tag_deltas = {}
+    for tag in tags:
+        sa, sb = a["tag_stats"].get(tag, empty), b["tag_stats"].get(tag, empty)
+        tag_deltas[tag] = {"a": sa, "b": sb, "delta": _rate(sb) - _rate(sa)}
+
+    def totals(run, ids):
+        return {
+            "mean_latency_ms": _mean(run[cid]["latency_ms"] for cid in ids),
+            "total_tokens": sum(_tokens(run[cid]) or 0 for cid in ids),
+        }
+
+    return {
+        "a": a["run_id"] if "run_id" in a else a.get("started_at"),
+        "b": b["run_id"] if "run_id" in b else b.get("started_at"),
+        "pass_rate": {"a": a["passed"] / a["total"], "b": b["passed"] / b["total"]},
+        "newly_failing": newly_failing,
+        "newly_passing": newly_passing,
+        "only_in_a": sorted(set(a_cases) - set(b_cases)),
+        "only_in_b": sorted(set(b_cases) - set(a_cases)),
+        "tag_deltas": tag_deltas,
+        "a_totals": totals(a_cases, common),
+        "b_totals": totals(b_cases, common),
+        "case_deltas": {
+            cid: {
+                "latency_ms": b_cases[cid]["latency_ms"] - a_cases[cid]["latency_ms"],
+                "tokens": (_tokens(b_cases[cid]) or 0) - (_tokens(a_cases[cid]) or 0),
+            }
+            for cid in common
+        },
+    }
+
+
+def print_diff(d: dict, cases_a: dict, cases_b: dict) -> None:
+    pa, pb = d["pass_rate"]["a"], d["pass_rate"]["b"]
+    print(f"Diff {d['a']}  →  {d['b']}")
+    print(f"  pass rate: {pa:.1%} → {pb:.1%} ({pb - pa:+.1%})")
+
+    print(f"\nNewly failing ({len(d['newly_failing'])}):")
+    for cid in d["newly_failing"]:
+        print(f"  [{cid}]  {cases_b[cid]['input'][:70]!r}")
+        for f in cases_b[cid]["failures"]:
+            print(f"       → {f}")
+    print(f"\nNewly passing ({len(d['newly_passing'])}):")
+    for cid in d["newly_passing"]:
+        print(f"  [{cid}]  {cases_b[cid]['input'][:70]!r}")
+    if d["only_in_a"] or d["only_in_b"]:
+        print(f"\nOnly in A: {d['only_in_a'] or '-'}")
+        print(f"Only in B: {d['only_in_b'] or '-'}")
+
+    print("\nBy tag:")
+    for tag, t in d["tag_deltas"].items():
+        if t["a"]["total"] or t["b"]["total"]:
+            print(
+                f"  {tag:<16} {t['a']['passed']:>2}/{t['a']['total']:<2} → "
+                f"{t['b']['passed']:>2}/{t['b']['total']:<2}  {t['delta']:+.0%}"
+            )
+
+    ta, tb = d["a_totals"], d["b_totals"]
+    if ta["mean_latency_ms"] is not None and tb["mean_latency_ms"] is not None:
+        print(
+            f"\nMean latency: {ta['mean_latency_ms']:.0f} ms → {tb['mean_latency_ms']:.0f} ms"
+            f" ({tb['mean_latency_ms'] - ta['mean_latency_ms']:+.0f} ms)"
+        )
+    print(f"Total tokens: {ta['total_tokens']} → {tb['total_tokens']} ({tb['total_tokens'] - ta['total_tokens']:+d})")
+
+    slower = sorted(d["case_deltas"].items(), key=lambda kv: kv[1]["latency_ms"], reverse=True)[:5]
+    if slower and slower[0][1]["latency_ms"] >= 1:
+        print("\nLargest latency increases:")
+        for cid, delta in slower:
+            if delta["latency_ms"] < 1:
+                break
+            print(f"  [{cid}]  {delta['latency_ms']:+.0f} ms, {delta['tokens']:+d} tokens")
@@ -1,5 +1,9 @@
 import json
 import logging
+import os
+import re
+import sqlite3
+import threading
 from datetime import datetime, timezone
 from pathlib import Path
 
@@ -15,26 +19,88 @@ DEFAULT_CONFIG = {
 }
 
 
-def load_config() -> dict:
-    if not CONFIG_PATH.exists():
-        save_config(DEFAULT_CONFIG)
-        return DEFAULT_CONFIG.copy()
-    try:
-        data = json.loads(CONFIG_PATH.read_text(encoding="utf-8"))
-        # Merge with default keys if missing
+# ---------- Config ----------
+
+class FeedbackConfig:
+    """
+    feedback_config.json, parsed once and kept in memory.
+
+    get() costs one stat(): the file is re-read only when its inode, mtime
+    or size changes, so a toggle from ui.py or the CLI reaches running
+    processes on their next call. update() re-reads the file, applies its
+    changes and renames a temp file over it, all under an OS file lock, so
+    concurrent toggles from several processes never lose each other's
+    changes and readers never see a half-written file.
+    """
+
+    def __init__(self, path: Path):
+        self.path = Path(path)
+        self._lock = threading.Lock()
+        self._key = None
+        self._data = DEFAULT_CONFIG.copy()
+
+    def _stat_key(self):
+        try:
+            st = os.stat(self.path)
+        except FileNotFoundError:
+            return None
+        return (st.st_ino, st.st_mtime_ns, st.st_size)
+
+    def _read(self) -> dict:
         merged = DEFAULT_CONFIG.copy()
-        merged.update(data)
+        try:
+            # Merge with default keys if missing
+            merged.update(json.loads(self.path.read_text(encoding="utf-8")))
+        except Exception as e:
+            logger.error("Error reading feedback config: %s", e)
         return merged
-    except Exception as e:
-        logger.error("Error reading feedback config: %s", e)
-        return DEFAULT_CONFIG.copy()
+
+    def get(self) -> dict:
+        key = self._stat_key()
+        if key is None:
+            return self.update({})  # first run: write the defaults
+        with self._lock:
+            if key != self._key:
+                self._data, self._key = self._read(), key
+            return self._data.copy()
+
+    def update(self, changes: dict) -> dict:
+        """Write *changes* over the config on disk and return the result."""
+        from ratelimit import file_lock  # deferred: ratelimit pulls in asyncio, which ui.py doesn't need
+
+        with self._lock:
+            try:
+                with file_lock(self.path.with_name(self.path.name + ".lock")):
+                    data = self._read() if self.path.exists() else DEFAULT_CONFIG.copy()
+                    data.update(changes)
+                    tmp = self.path.with_name(self.path.name + ".tmp")
+                    tmp.write_text(json.dumps(data, indent=2), encoding="utf-8")
+                    os.replace(tmp, self.path)
+                    self._data, self._key = data, self._stat_key()
+            except Exception as e:
+                logger.error("Error saving feedback config: %s", e)
+            return self._data.copy()
+
+
+_configs: dict[Path, FeedbackConfig] = {}
+_configs_lock = threading.Lock()
+
+
+def feedback_config() -> FeedbackConfig:
+    """The config object for the current CONFIG_PATH."""
+    with _configs_lock:
+        config = _configs.get(CONFIG_PATH)
+        if config is None:
+            config = _configs[CONFIG_PATH] = FeedbackConfig(CONFIG_PATH)
+        return config
+
+
+def load_config() -> dict:
+    return feedback_config().get()
 
 
 def save_config(config: dict) -> None:
-    try:
-        CONFIG_PATH.write_text(json.dumps(config, indent=2), encoding="utf-8")
-    except Exception as e:
-        logger.error("Error saving feedback config: %s", e)
+    feedback_config().update(config)
 
 
 def is_feedback_enabled() -> bool:
@@ -42,9 +108,7 @@ def is_feedback_enabled() -> bool:
 
 
 def set_feedback_enabled(enabled: bool) -> None:
-    cfg = load_config()
-    cfg["feedback_enabled"] = bool(enabled)
-    save_config(cfg)
+    feedback_config().update({"feedback_enabled": bool(enabled)})
 
 
 def log_feedback(
@@ -67,6 +131,11 @@ def log_feedback(
         logger.info("Saved user feedback entry for input: '%s'", raw_input[:50])
     except Exception as e:
         logger.error("Failed to write feedback log: %s", e)
+        return entry
+    try:
+        feedback_index().sync()
+    except sqlite3.Error as e:
+        logger.warning("Failed to index feedback entry: %s", e)
     return entry
 
 
@@ -85,17 +154,170 @@ def get_feedback_entries() -> list[dict]:
     return entries
 
 
-def get_few_shot_prompt(limit: int = 5) -> str:
+# ---------- Similarity index ----------
+
+_MAX_QUERY_TERMS = 32
+
+
+def _terms(text: str) -> list[str]:
+    """Distinct lowercase word tokens, in order of first appearance."""
+    return list(dict.fromkeys(re.findall(r"\w+", text.casefold())))[:_MAX_QUERY_TERMS]
+
+
+def _searchable(entry: dict) -> str:
+    titles = [i.get("title", "") for i in entry.get("corrected_intents") or [] if isinstance(i, dict)]
+    return " ".join([entry.get("raw_input", ""), *titles, entry.get("notes", "")])
+
+
+class FeedbackIndex:
     """
-    Format the most recent feedback corrections into a few-shot exemplars section
-    for insertion into the LLM system prompt.
+    SQLite full-text index of the corrections in feedback.jsonl.
+
+    feedback.jsonl stays the source of truth. The index records how many
+    bytes of it have been ingested and reads only the new tail when the
+    file grows, so log_feedback() costs one INSERT rather than a re-parse
+    of every entry, and entries appended by another process are picked up
+    on the next query. A log that shrank or was replaced is re-ingested.
+    similar() ranks corrections by BM25 over their input, corrected titles
+    and notes; without FTS5 in the local SQLite build it falls back to the
+    most recent corrections.
     """
-    entries = get_feedback_entries()
-    if not entries:
-        return ""
 
-    # Select recent entries with corrected_intents
-    relevant = [e for e in entries if e.get("corrected_intents") is not None][-limit:]
+    def __init__(self, log_path: Path, path: Path | None = None):
+        self.log_path = Path(log_path)
+        self.path = Path(path) if path else self.log_path.with_name(self.log_path.stem + "_index.sqlite3")
+        self._lock = threading.Lock()
+        self._conn = None
+        self._fts = False
+        self._synced = False  # stat key of the log as of the last sync
+
+    def _connect(self):
+        if self._conn is None:
+            conn = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value INTEGER)")
+            conn.execute("CREATE TABLE IF NOT EXISTS corrections (id INTEGER PRIMARY KEY, entry TEXT NOT NULL)")
+            try:
+                conn.execute("CREATE VIRTUAL TABLE IF NOT EXISTS corrections_fts USING fts5(body, content='')")
+                self._fts = True
+            except sqlite3.OperationalError as e:
+                logger.warning("SQLite has no FTS5, few-shot examples fall back to the most recent: %s", e)
+            self._conn = conn
+        return self._conn
+
+    def sync(self) -> None:
+        """Ingest whatever feedback.jsonl gained since the last call."""
+        with self._lock:
+            self._sync(self._connect())
+
+    def _sync(self, conn) -> None:
+        try:
+            st = os.stat(self.log_path)
+        except FileNotFoundError:
+            st = None
+        key = (st.st_ino, st.st_size, st.st_mtime_ns) if st else None
+        if key == self._synced:
+            return
+
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            meta = dict(conn.execute("SELECT key, value FROM meta"))
+            offset = meta.get("offset", 0)
+            if st is None or st.st_ino != meta.get("inode") or st.st_size < offset:
+                conn.execute("DELETE FROM corrections")
+                if self._fts:
+                    conn.execute("INSERT INTO corrections_fts(corrections_fts) VALUES ('delete-all')")
+                offset = 0
+            if st is not None and st.st_size > offset:
+                with self.log_path.open("rb") as f:
+                    f.seek(offset)
+                    data = f.read(st.st_size - offset)
+                end = data.rfind(b"\n") + 1  # a half-written last line waits for the next sync
+                self._ingest(conn, data[:end].splitlines())
+                offset += end
+            conn.executemany(
+                "INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)",
+                [("offset", offset), ("inode", st.st_ino if st else None)],
+            )
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        self._synced = key
+
+    def _ingest(self, conn, lines) -> None:
+        for line in lines:
+            try:
+                entry = json.loads(line)
+            except ValueError:
+                continue
+            if not isinstance(entry, dict) or entry.get("corrected_intents") is None:
+                continue
+            rowid = conn.execute(
+                "INSERT INTO corrections (entry) VALUES (?)", (json.dumps(entry),)
+            ).lastrowid
+            if self._fts:
+                conn.execute("INSERT INTO corrections_fts (rowid, body) VALUES (?, ?)", (rowid, _searchable(entry)))
+
+    def similar(self, query: str, limit: int) -> list[dict]:
+        """Up to *limit* corrections sharing words with *query*, most similar first."""
+        terms = _terms(query)
+        with self._lock:
+            conn = self._connect()
+            self._sync(conn)
+            if not self._fts or not terms:
+                return []
+            rows = conn.execute(
+                "SELECT c.entry FROM corrections_fts JOIN corrections c ON c.id = corrections_fts.rowid"
+                " WHERE corrections_fts MATCH ? ORDER BY rank LIMIT ?",
+                (" OR ".join(f'"{t}"' for t in terms), limit),
+            ).fetchall()
+        return [json.loads(entry) for entry, in rows]
+
+    def recent(self, limit: int) -> list[dict]:
+        """The last *limit* corrections, oldest first."""
+        with self._lock:
+            conn = self._connect()
+            self._sync(conn)
+            rows = conn.execute("SELECT entry FROM corrections ORDER BY id DESC LIMIT ?", (limit,)).fetchall()
+        return [json.loads(entry) for entry, in reversed(rows)]
+
+    def close(self) -> None:
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+                self._synced = False
+
+
+_indexes: dict[Path, FeedbackIndex] = {}
+_indexes_lock = threading.Lock()
+
+
+def feedback_index() -> FeedbackIndex:
+    """The index over the current FEEDBACK_LOG_PATH."""
+    with _indexes_lock:
+        index = _indexes.get(FEEDBACK_LOG_PATH)
+        if index is None:
+            index = _indexes[FEEDBACK_LOG_PATH] = FeedbackIndex(FEEDBACK_LOG_PATH)
+        return index
+
+
+def get_few_shot_prompt(limit: int = 5, query: str | None = None) -> str:
+    """
+    Format feedback corrections into a few-shot exemplars section for
+    insertion into the LLM system prompt: the ones most similar to *query*
+    when given, else (or when none match) the most recent.
+    """
+    try:
+        index = feedback_index()
+        relevant = index.similar(query, limit) if query else []
+        if not relevant:
+            relevant = index.recent(limit)
+    except sqlite3.Error as e:
+        logger.warning("Feedback index unavailable, reading %s: %s", FEEDBACK_LOG_PATH.name, e)
+        relevant = [entry for entry in get_feedback_entries() if entry.get("corrected_intents") is not None][-limit:]
     if not relevant:
         return ""
 
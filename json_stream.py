@@ -0,0 +1,102 @@
+import json
+import logging
+
+logger = logging.getLogger(__name__)
+
+_INVALID = object()
+
+
+class ArrayItemStream:
+    """
+    Incremental parser for a JSON object streamed in arbitrary chunks.
+
+    feed() returns the object (or array) elements of the top-level array
+    under *key* that became complete in that chunk, so with key="intents"
+    each intent is available as soon as its closing brace arrives rather
+    than when the whole response has. Only the text of the element
+    currently being read is buffered.
+
+        stream = ArrayItemStream("intents")
+        for chunk in response_chunks:
+            for intent in stream.feed(chunk):
+                ...
+    """
+
+    def __init__(self, key: str = "intents"):
+        self.key = key
+        self.done = False       # the target array has closed
+        self.count = 0          # elements yielded so far
+        self._buf = ""
+        self._depth = 0
+        self._in_string = False
+        self._escape = False
+        self._string_start = None
+        self._last_string = None  # most recent string at depth 1, i.e. the current key
+        self._array_depth = None  # depth just inside the target array
+        self._element_start = None
+
+    def feed(self, chunk: str) -> list:
+        items = []
+        start = len(self._buf)
+        self._buf += chunk
+        buf = self._buf
+        for i in range(start, len(buf)):
+            c = buf[i]
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif c == "\\":
+                    self._escape = True
+                elif c == '"':
+                    self._in_string = False
+                    if self._depth == 1 and self._string_start is not None:
+                        self._last_string = buf[self._string_start:i]
+                continue
+            if self.done:
+                continue
+
+            if c == '"':
+                self._in_string = True
+                self._string_start = i + 1 if self._depth == 1 else None
+            elif c in "{[":
+                if (
+                    self._array_depth is not None
+                    and self._depth == self._array_depth
+                    and self._element_start is None
+                ):
+                    self._element_start = i
+                self._depth += 1
+                if c == "[" and self._depth == 2 and self._array_depth is None and self._last_string == self.key:
+                    self._array_depth = 2
+            elif c in "}]":
+                self._depth -= 1
+                if self._array_depth is not None and self._depth == self._array_depth and self._element_start is not None:
+                    items.append(self._decode(buf[self._element_start:i + 1]))
+                    self._element_start = None
+                elif self._array_depth is not None and self._depth == self._array_depth - 1:
+                    self.done = True
+
+        # Drop everything before the element being read (and before any open
+        # key string, so the key can still be recognised)
+        keep = min(
+            (p for p in (self._element_start, self._string_start if self._in_string else None) if p is not None),
+            default=len(buf),
+        )
+        if keep:
+            self._buf = buf[keep:]
+            if self._element_start is not None:
+                self._element_start -= keep
+            if self._string_start is not None:
+                self._string_start -= keep
+        items = [item for item in items if item is not _INVALID]
+        self.count += len(items)
+        return items
+
+    @staticmethod
+    def _decode(text: str):
+        try:
+            return json.loads(text)
+        except json.JSONDecodeError as e:
+            logger.warning("Skipping undecodable streamed element: %s", e)
+            return _INVALID
+
@@ -1,20 +1,49 @@
+import asyncio
 import logging
 import re
-import requests
+import itertools
 import json
 import os
+import threading
+import time
 from datetime import date
-from dotenv import load_dotenv
-from google import genai
 
-from feedback import get_few_shot_prompt, is_feedback_enabled
+import metrics
+import response_cache as rc
+from config import GEMINI_API_KEY
+from feedback import is_feedback_enabled
+from json_stream import ArrayItemStream
+from preclassifier import PreClassifier
+from prompt import AssembledPrompt, assembler
+from schema import batch_response_schema, intents_response_schema
 
-load_dotenv()
+MODEL = "gemini-2.5-flash"
+GENERATION_CONFIG = {"temperature": 0.2, "max_output_tokens": 8192}
+# Constrained JSON output, so responses never need fence-stripping
+INTENTS_FORMAT = {"response_mime_type": "application/json", "response_schema": intents_response_schema()}
+BATCH_FORMAT = {"response_mime_type": "application/json", "response_schema": batch_response_schema()}
 
-GEMINI_API_KEY = os.getenv("GEMINI_API_KEY")
-logger = logging.getLogger(__name__)
+# Opt-in: upload the static system prompt once as a Gemini cached content object
+CONTEXT_CACHE_ENABLED = os.getenv("GEMINI_CONTEXT_CACHE", "0") == "1"
+CONTEXT_CACHE_TTL = int(os.getenv("GEMINI_CONTEXT_CACHE_TTL", "3600"))  # seconds
+
+# Network timeout for each Gemini request, in seconds; 0 keeps the SDK's (none).
+# Enforced by the HTTP client, so a timed-out call is actually abandoned
+REQUEST_TIMEOUT = float(os.getenv("GEMINI_TIMEOUT", "0"))
+
+# On-disk cache of split results; TRIAGE_RESPONSE_CACHE=0 bypasses it everywhere
+RESPONSE_CACHE_ENABLED = os.getenv("TRIAGE_RESPONSE_CACHE", "1") == "1"
+RESPONSE_CACHE_MAX_ENTRIES = int(os.getenv("TRIAGE_RESPONSE_CACHE_MAX", "5000"))
 
-PROMPT_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "splitter_prompt.txt")
+# How many inputs split_intents_batch() packs into one model request
+LLM_BATCH_SIZE = int(os.getenv("TRIAGE_LLM_BATCH_SIZE", "8"))
+
+# Local fast path for trivial inputs (see preclassifier.py)
+PRECLASSIFIER_ENABLED = os.getenv("TRIAGE_PRECLASSIFIER", "0") == "1"
+PRECLASSIFIER_THRESHOLD = float(os.getenv("TRIAGE_PRECLASSIFIER_THRESHOLD", "0.8"))
+PRECLASSIFIER_VERIFY_RATE = float(os.getenv("TRIAGE_PRECLASSIFIER_VERIFY", "0.05"))
+
+logger = logging.getLogger(__name__)
 
 
 def _extract_json(text: str) -> str:
@@ -25,48 +54,476 @@ def _extract_json(text: str) -> str:
         return match.group(1)
     return text
 
-client = genai.Client()
+client = None  # genai.Client, created on first use by _gemini()
+_client_lock = threading.Lock()
 
 
-def split_intents(user_input: str) -> list:
-    with open(PROMPT_PATH, "r", encoding="utf-8") as f:
-        system_prompt = f.read()
+def _gemini():
+    """The shared genai.Client. google.genai is only imported once a request is made."""
+    global client
+    if client is None:
+        with _client_lock:
+            if client is None:
+                from google import genai
+
+                client = genai.Client(api_key=GEMINI_API_KEY)
+    return client
+
+
+class ContextCache:
+    """
+    Keeps the splitter system prompt uploaded as a Gemini cached content object.
+
+    Only the base prompt is cached — the few-shot block is picked per input
+    and sent inline ahead of the message. A new cache is created when the
+    base prompt's digest changes or the current one is close to expiring;
+    the superseded cache is deleted. If
+    creation fails (caching unsupported, prompt below the model's minimum
+    size, quota) the cache is disabled for one TTL and callers fall back to
+    sending the prompt inline.
+    """
+
+    _REFRESH_MARGIN = 60  # seconds before expiry to roll over to a new cache
+
+    def __init__(self, ttl: int = CONTEXT_CACHE_TTL):
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._name = None
+        self._digest = None
+        self._expires_at = 0.0
+        self._disabled_until = 0.0
+
+    def get(self, genai_client, prompt: AssembledPrompt) -> str | None:
+        """Return the cached content name for *prompt*'s base, creating it if needed."""
+        now = time.time()
+        with self._lock:
+            if now < self._disabled_until:
+                return None
+            if (
+                self._name
+                and self._digest == prompt.base_digest
+                and now < self._expires_at - self._REFRESH_MARGIN
+            ):
+                return self._name
+
+            try:
+                cache = genai_client.caches.create(
+                    model=MODEL,
+                    config={
+                        "system_instruction": prompt.base,
+                        "display_name": f"triage-splitter-{prompt.base_digest[:12]}",
+                        "ttl": f"{self.ttl}s",
+                    },
+                )
+            except Exception as e:
+                logger.warning("Context caching unavailable, sending prompt inline: %s", e)
+                self._disabled_until = now + self.ttl
+                return None
+
+            stale, self._name = self._name, cache.name
+            self._digest = prompt.base_digest
+            self._expires_at = now + self.ttl
+            logger.info("Created Gemini context cache %s", self._name)
+
+        if stale:
+            try:
+                genai_client.caches.delete(name=stale)
+            except Exception as e:
+                logger.debug("Could not delete superseded context cache %s: %s", stale, e)
+        return cache.name
+
+    def invalidate(self) -> None:
+        with self._lock:
+            self._name = None
+
+
+_usage = threading.local()
+
+
+def _usage_from(response) -> dict:
+    meta = getattr(response, "usage_metadata", None)
+    fields = {
+        "prompt_tokens": "prompt_token_count",
+        "output_tokens": "candidates_token_count",
+        "cached_tokens": "cached_content_token_count",
+        "total_tokens": "total_token_count",
+    }
+    usage = {}
+    for key, attr in fields.items():
+        value = getattr(meta, attr, None)
+        usage[key] = value if isinstance(value, int) else None
+    return usage
+
+
+def last_usage() -> dict | None:
+    """Token counts for this thread's last split_intents() call; None if it made no model call."""
+    return getattr(_usage, "value", None)
+
+
+context_cache = ContextCache()
+response_cache = rc.ResponseCache(max_entries=RESPONSE_CACHE_MAX_ENTRIES)
+pre_classifier = PreClassifier(threshold=PRECLASSIFIER_THRESHOLD, verify_rate=PRECLASSIFIER_VERIFY_RATE)
+
+
+def _request(contents: list, config: dict, stream: bool):
+    if not stream:
+        return _gemini().models.generate_content(model=MODEL, contents=contents, config=config)
+    chunks = _gemini().models.generate_content_stream(model=MODEL, contents=contents, config=config)
+    # The request is only sent once iteration starts; pull the first chunk
+    # here so request errors surface to the caller's except clause
+    first = next(chunks, None)
+    return itertools.chain([first] if first is not None else [], chunks)
+
+
+def _request_config(config: dict) -> dict:
+    config = {**GENERATION_CONFIG, **config}
+    if REQUEST_TIMEOUT > 0:
+        config["http_options"] = {"timeout": int(REQUEST_TIMEOUT * 1000)}  # milliseconds
+    return config
+
+
+def _contents(message: str, prompt: AssembledPrompt, cached: bool = False) -> list:
+    """
+    Request contents: the whole prompt and the message inline, or — when the
+    base prompt is in the context cache — just the few-shot block and message.
+    """
+    prefix = prompt.few_shot if cached else prompt.text
+    parts = [{"text": prefix}, {"text": message}] if prefix else [{"text": message}]
+    return [{"role": "user", "parts": parts}]
+
+
+def _generate(prompt: AssembledPrompt, message: str, stream: bool = False, **config):
+    """
+    Call the model, via the context cache when enabled, else with the prompt
+    inline. With *stream* set, returns an iterator of response chunks.
+    """
+    from google.genai import errors as genai_errors
+
+    config = _request_config(config)
+    if CONTEXT_CACHE_ENABLED:
+        cache_name = context_cache.get(_gemini(), prompt)
+        if cache_name:
+            try:
+                cached_config = {**config, "cached_content": cache_name}
+                return _request(_contents(message, prompt, cached=True), cached_config, stream)
+            except genai_errors.ClientError as e:
+                # Expired or deleted server-side — rebuild on the next call
+                logger.warning("Context cache %s rejected (%s), sending prompt inline", cache_name, e)
+                context_cache.invalidate()
+
+    return _request(_contents(message, prompt), config, stream)
+
+
+async def _generate_async(prompt: AssembledPrompt, message: str, **config):
+    """_generate() on the async client. Context cache creation runs on a worker thread."""
+    from google.genai import errors as genai_errors
+
+    client = _gemini()
+    config = _request_config(config)
+    if CONTEXT_CACHE_ENABLED:
+        cache_name = await asyncio.to_thread(context_cache.get, client, prompt)
+        if cache_name:
+            try:
+                return await client.aio.models.generate_content(
+                    model=MODEL, contents=_contents(message, prompt, cached=True),
+                    config={**config, "cached_content": cache_name},
+                )
+            except genai_errors.ClientError as e:
+                logger.warning("Context cache %s rejected (%s), sending prompt inline", cache_name, e)
+                context_cache.invalidate()
+
+    return await client.aio.models.generate_content(model=MODEL, contents=_contents(message, prompt), config=config)
+
+
+def _preclassify(user_input: str, use_preclassifier: bool):
+    if use_preclassifier and PRECLASSIFIER_ENABLED:
+        return pre_classifier.classify(user_input)
+    return None
+
+
+def split_intents(user_input: str, use_cache: bool = True, use_preclassifier: bool = True) -> list:
+    _usage.value = None
+    with metrics.span("llm.split_intents") as span:
+        pre = _preclassify(user_input, use_preclassifier)
+        if pre is not None and not pre.verify:
+            span.set(source="preclassifier")
+            return pre.intents
+
+        intents = _split_with_llm(user_input, use_cache)
+        if pre is not None:
+            pre_classifier.record_llm_result(pre, intents)
+        return intents
 
-    if is_feedback_enabled():
-        few_shot = get_few_shot_prompt()
-        if few_shot:
-            system_prompt = system_prompt + "\n" + few_shot
+
+async def split_intents_async(user_input: str, use_cache: bool = True, use_preclassifier: bool = True) -> list:
+    """
+    split_intents() for use inside an event loop: the model call goes
+    through the async Gemini client. The pre-classifier and response cache
+    are shared with the sync path. last_usage() is not updated, since
+    concurrent calls would share the thread.
+    """
+    with metrics.span("llm.split_intents") as span:
+        pre = _preclassify(user_input, use_preclassifier)
+        if pre is not None and not pre.verify:
+            span.set(source="preclassifier")
+            return pre.intents
+
+        prompt, message, cache_key, cached = _prepare_split(user_input, use_cache)
+        if cached is not None:
+            intents = cached
+        else:
+            with metrics.span("llm.generate", model=MODEL, context_cache=CONTEXT_CACHE_ENABLED) as gen_span:
+                response = await _generate_async(prompt, message, **INTENTS_FORMAT)
+                gen_span.set(**{k: v for k, v in _usage_from(response).items() if v is not None})
+            intents = _parse_intents(response.text or "", cache_key)
+        if pre is not None:
+            pre_classifier.record_llm_result(pre, intents)
+        return intents
+
+
+def _cache_key(user_input: str, today: str, prompt: AssembledPrompt, use_cache: bool) -> str | None:
+    if use_cache and RESPONSE_CACHE_ENABLED:
+        return rc.make_key(user_input, today, MODEL, prompt.digest)
+    return None
+
+
+def _prepare_split(user_input: str, use_cache: bool):
+    """Prompt, message and cache key for one split, plus the cached intents if there are any."""
+    prompt = assembler.get(include_few_shot=is_feedback_enabled(), query=user_input)
 
     today = date.today().isoformat()
+    cache_key = _cache_key(user_input, today, prompt, use_cache)
+    if cache_key:
+        cached = response_cache.get(cache_key)
+        if cached is not None:
+            logger.info("Parsed %d intent(s) from response cache", len(cached))
+            metrics.current().set(source="response_cache")
+            return prompt, None, cache_key, cached
+
+    metrics.current().set(source="llm")
     message = f"TODAY: {today}\n\nUSER INPUT:\n{user_input}"
+    return prompt, message, cache_key, None
 
-    response = client.models.generate_content(
-        model="gemini-2.5-flash",
-        contents=[
-            {
-                "role": "user",
-                "parts": [
-                    {"text": system_prompt},
-                    {"text": message},
-                ],
-            }
-        ],
-        config={"temperature": 0.2, "max_output_tokens": 8192},
-    )
 
-    raw_text = response.text
+def _parse_intents(raw_text: str, cache_key: str | None) -> list:
     logger.debug("Raw splitter response: %s", raw_text)
     try:
-        parsed = json.loads(_extract_json(raw_text))
-    except json.JSONDecodeError as e:
-        logger.error("Failed to parse LLM response as JSON: %s", e)
+        intents = json.loads(raw_text).get("intents", [])
+    except (json.JSONDecodeError, AttributeError) as e:
+        # Typically a response cut off at max_output_tokens: keep the intents
+        # that did arrive complete, but don't cache a partial answer
+        salvaged = ArrayItemStream("intents").feed(raw_text)
+        logger.error("Failed to parse LLM response as JSON (%s); salvaged %d intent(s)", e, len(salvaged))
         logger.error("Raw response was: %s", raw_text)
-        return []
-    intents = parsed.get("intents", [])
+        return salvaged
     logger.info("Parsed %d intent(s) from LLM", len(intents))
+    if cache_key:
+        response_cache.put(cache_key, intents)
     return intents
 
 
+def _split_with_llm(user_input: str, use_cache: bool) -> list:
+    prompt, message, cache_key, cached = _prepare_split(user_input, use_cache)
+    if cached is not None:
+        return cached
+
+    with metrics.span("llm.generate", model=MODEL, context_cache=CONTEXT_CACHE_ENABLED) as span:
+        response = _generate(prompt, message, **INTENTS_FORMAT)
+        _usage.value = _usage_from(response)
+        span.set(**{k: v for k, v in _usage.value.items() if v is not None})
+    return _parse_intents(response.text or "", cache_key)
+
+
+def stream_intents(user_input: str, use_cache: bool = True, use_preclassifier: bool = True):
+    """
+    Generator form of split_intents(): yields each intent as soon as the
+    model has finished streaming it, instead of after the whole response.
+
+    Cache hits and pre-classifier answers are yielded immediately. Timings
+    are recorded once the stream ends rather than held open as spans, since
+    the caller runs its own code (and spans) between yields.
+    """
+    _usage.value = None
+    start = time.perf_counter()
+    pre = _preclassify(user_input, use_preclassifier)
+    if pre is not None and not pre.verify:
+        metrics.record("llm.stream_intents", (time.perf_counter() - start) * 1000, source="preclassifier")
+        yield from pre.intents
+        return
+
+    prompt = assembler.get(include_few_shot=is_feedback_enabled(), query=user_input)
+    today = date.today().isoformat()
+    cache_key = _cache_key(user_input, today, prompt, use_cache)
+    cached = response_cache.get(cache_key) if cache_key else None
+    if cached is not None:
+        logger.info("Parsed %d intent(s) from response cache", len(cached))
+        metrics.record("llm.stream_intents", (time.perf_counter() - start) * 1000, source="response_cache")
+        yield from cached
+        return
+
+    message = f"TODAY: {today}\n\nUSER INPUT:\n{user_input}"
+    parser = ArrayItemStream("intents")
+    intents, last, first_intent_ms = [], None, None
+    for chunk in _generate(prompt, message, stream=True, **INTENTS_FORMAT):
+        last = chunk
+        for intent in parser.feed(chunk.text or ""):
+            if first_intent_ms is None:
+                first_intent_ms = (time.perf_counter() - start) * 1000
+            intents.append(intent)
+            yield intent
+
+    _usage.value = _usage_from(last)
+    metrics.record(
+        "llm.stream_intents", (time.perf_counter() - start) * 1000, source="llm",
+        first_intent_ms=first_intent_ms, intents=len(intents),
+        **{k: v for k, v in _usage.value.items() if v is not None},
+    )
+    if parser.done:
+        logger.info("Streamed %d intent(s) from LLM", len(intents))
+        if cache_key:
+            response_cache.put(cache_key, intents)
+    else:
+        logger.error("LLM stream ended before the intents list closed; kept %d intent(s)", len(intents))
+    if pre is not None:
+        pre_classifier.record_llm_result(pre, intents)
+
+
+# ---------- Batched splitting ----------
+
+_BATCH_INSTRUCTIONS = """\
+USER INPUTS below is a JSON array of separate, unrelated inputs. Split and
+classify EACH one independently, exactly as you would a single USER INPUT.
+Never merge intents across inputs.
+
+Return ONLY this JSON object, with one entry per input, where "index" is the
+input's 0-based position in the array and "intents" is what you would have
+returned for that input alone:
+{"results": [{"index": 0, "intents": [...]}, {"index": 1, "intents": [...]}]}"""
+
+
+def _parse_packed(raw_text: str, count: int) -> dict[int, list]:
+    """
+    Map input index -> intents from a packed response. Entries that are
+    malformed, out of range or duplicated are dropped, so the caller can
+    re-split those inputs on their own.
+    """
+    try:
+        results = json.loads(raw_text).get("results")
+    except (json.JSONDecodeError, AttributeError) as e:
+        # Keep whichever entries arrived complete before the response broke off
+        results = ArrayItemStream("results").feed(raw_text)
+        logger.error("Failed to parse batched LLM response (%s); salvaged %d entries", e, len(results))
+    if not isinstance(results, list):
+        logger.error("Batched LLM response has no results list")
+        return {}
+
+    parsed, duplicates = {}, set()
+    for entry in results:
+        if not isinstance(entry, dict):
+            continue
+        index, intents = entry.get("index"), entry.get("intents")
+        if (
+            not isinstance(index, int) or isinstance(index, bool)
+            or not 0 <= index < count
+            or not isinstance(intents, list)
+            or not all(isinstance(intent, dict) for intent in intents)
+        ):
+            continue
+        if index in parsed:
+            duplicates.add(index)
+        parsed[index] = intents
+    for index in duplicates:
+        del parsed[index]
+    return parsed
+
+
+def _split_packed(prompt: AssembledPrompt, today: str, inputs: list[str]) -> dict[int, list]:
+    """Split several inputs with one model request. Returns only the inputs it accounted for."""
+    from google.genai import errors as genai_errors
+
+    message = (
+        f"TODAY: {today}\n\n{_BATCH_INSTRUCTIONS}\n\n"
+        f"USER INPUTS:\n{json.dumps(inputs, ensure_ascii=False)}"
+    )
+    with metrics.span("llm.generate", model=MODEL, context_cache=CONTEXT_CACHE_ENABLED, inputs=len(inputs)) as span:
+        try:
+            response = _generate(prompt, message, **BATCH_FORMAT)
+        except genai_errors.APIError as e:
+            # Rejected (e.g. too large) or failed server-side: rather than failing
+            # the whole chunk, every input falls back to its own call
+            logger.warning("Batched LLM request failed, splitting inputs one by one: %s", e)
+            span.set(error=type(e).__name__)
+            return {}
+        _usage.value = _usage_from(response)
+        span.set(**{k: v for k, v in _usage.value.items() if v is not None})
+    parsed = _parse_packed(response.text or "", len(inputs))
+    missing = len(inputs) - len(parsed)
+    if missing:
+        logger.warning("Batched LLM response missed %d of %d input(s)", missing, len(inputs))
+    return parsed
+
+
+def split_intents_batch(inputs: list[str], use_cache: bool = True, use_preclassifier: bool = True,
+                        batch_size: int = LLM_BATCH_SIZE) -> list[list]:
+    """
+    Split several inputs, packing the ones that need the model into as few
+    requests as possible (up to *batch_size* inputs each).
+
+    Returns one intents list per input, in input order — the same thing
+    split_intents() would return for each. The pre-classifier and response
+    cache are consulted per input first; any input a packed response fails
+    to account for is re-split on its own. A packed request carries the
+    feedback examples most similar to its inputs taken together, so its
+    results are not written to the response cache, which is keyed on each
+    input's own prompt.
+    """
+    results = [None] * len(inputs)
+    with metrics.span("llm.split_batch", inputs=len(inputs)) as span:
+        include_few_shot = is_feedback_enabled()
+        prompts = [assembler.get(include_few_shot=include_few_shot, query=text) for text in inputs]
+        today = date.today().isoformat()
+
+        todo, verify = [], {}
+        for i, (text, prompt) in enumerate(zip(inputs, prompts)):
+            pre = _preclassify(text, use_preclassifier)
+            if pre is not None and not pre.verify:
+                results[i] = pre.intents
+                span.add("preclassifier")
+                continue
+            if pre is not None:
+                verify[i] = pre
+            cache_key = _cache_key(text, today, prompt, use_cache)
+            cached = response_cache.get(cache_key) if cache_key else None
+            if cached is not None:
+                results[i] = cached
+                span.add("response_cache")
+                continue
+            todo.append(i)
+
+        batch_size = max(1, batch_size)
+        for start in range(0, len(todo), batch_size):
+            chunk = todo[start:start + batch_size]
+            packed = {}
+            if len(chunk) > 1:
+                texts = [inputs[i] for i in chunk]
+                prompt = assembler.get(include_few_shot=include_few_shot, query="\n".join(texts))
+                packed = _split_packed(prompt, today, texts)
+                span.add("requests")
+            for pos, i in enumerate(chunk):
+                if pos in packed:
+                    results[i] = packed[pos]
+                    continue
+                if len(chunk) > 1:
+                    span.add("fallbacks")
+                span.add("requests")
+                results[i] = _split_with_llm(inputs[i], use_cache)
+
+        for i, pre in verify.items():
+            pre_classifier.record_llm_result(pre, results[i])
+    logger.info("Split %d input(s) in batch", len(inputs))
+    return results
+
+
 def route_input(user_input):
     with open("router_prompt.txt", "r") as f:
         system_prompt = f.read()
@@ -87,8 +544,8 @@ def route_input(user_input):
         }
     }
 
-    response = client.models.generate_content(
-        model="gemini-2.5-flash",
+    response = _gemini().models.generate_content(
+        model=MODEL,
         contents=payload["contents"],
     )
 
@@ -1,295 +1,396 @@
-import datetime
+import time
+
+_MAIN_STARTED = time.time()  # before the imports below, so their cost shows up in metrics
+
+import asyncio
 import json
 import logging
-import re
 import sys
-import unittest
+import threading
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
-from unittest.mock import patch
 
+import capture_store
+import metrics
+from config import NOTION_MAX_CONCURRENCY, STREAM_WRITES
 from feedback import is_feedback_enabled, set_feedback_enabled
-from llm import split_intents
-from notion import DEAD_LETTER_PATH, validate_notion_schemas, write_to_notion
-from schema import INTENT_SCHEMA
+from llm import LLM_BATCH_SIZE, split_intents, split_intents_async, split_intents_batch, stream_intents
+from notion import async_session, limiter, validate_notion_schemas, write_to_notion, write_to_notion_async
+from page_index import Duplicate, normalize_title
+from schema import validate_intent as _validate_intent, validate_intents
+
+_IMPORTS_DONE = time.time()
 
-RAW_INPUT_LOG = Path(__file__).parent / "raw_inputs.jsonl"
+# Superseded by the capture store; --flush imports anything left in it
+LEGACY_DEAD_LETTER_PATH = Path(__file__).parent / "dead_letter.jsonl"
 
-_THIS_MODULE = __name__
 logger = logging.getLogger(__name__)
 
 
-def _validate_intent(intent: dict) -> dict | None:
-    intent_type = intent.get("type")
-    schema = INTENT_SCHEMA.get(intent_type)
-    if schema is None:
-        logger.warning('REJECTED Unknown intent type: "%s"', intent_type)
-        return None
+def _first_write_timer(name: str, start: float):
+    """Return a callback that records, once, how long after *start* the first page was written."""
+    lock = threading.Lock()
+    seen = []
 
-    title = (intent.get("title") or "").strip()
-    if not title:
-        logger.warning("REJECTED %s has empty title", intent_type)
-        return None
+    def on_written():
+        with lock:
+            if seen:
+                return
+            seen.append(True)
+        metrics.record(name, (time.perf_counter() - start) * 1000)
+    return on_written
 
-    structured_fields = {}
-    for field_name, rules in schema["valid_fields"].items():
-        value = intent.get(field_name)
 
-        if value is None:
-            structured_fields[field_name] = None
-            continue
+def _log_written(item: dict, page_id) -> None:
+    if isinstance(page_id, Duplicate):
+        logger.info('DUPLICATE %s not created, duplicate of %s: "%s"', item["type"], page_id, item["title"])
+    elif page_id:
+        logger.info('OK %s created: "%s"', item["type"], item["title"])
+
 
-        if "allowed" in rules and value not in rules["allowed"]:
-            logger.warning('REJECTED %s has invalid %s: "%s"', intent_type, field_name, value)
-            return None
+def _writer(raw_input: str, on_written=None):
+    """write_to_notion for one item of *raw_input*, runnable on a pool thread."""
+    def write(item):
+        page_id = write_to_notion(item, raw_input)
+        if page_id and on_written:
+            on_written()
+        return page_id
+    return metrics.bind(write)
 
-        if "pattern" in rules and not re.match(rules["pattern"], str(value)):
-            logger.warning('REJECTED %s has malformed %s: "%s"', intent_type, field_name, value)
-            return None
 
-        structured_fields[field_name] = value
+def _write_all(items: list[dict], raw_input: str, on_written=None) -> list:
+    """
+    Write validated items to Notion concurrently, at most NOTION_MAX_CONCURRENCY
+    at a time. A failed write only dead-letters its own item. Returns page IDs
+    (None where nothing was written) in the same order as *items*.
+    """
+    write = _writer(raw_input, on_written)
+    if len(items) <= 1:
+        return [write(item) for item in items]
 
-    return {
-        "type": intent_type,
-        "title": title,
-        "structured_fields": structured_fields,
-    }
+    workers = max(1, min(NOTION_MAX_CONCURRENCY, len(items)))
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="notion-write") as pool:
+        return list(pool.map(write, items))
 
 
-def triage(user_input: str, interactive_feedback: bool = True) -> None:
+def triage(user_input: str, interactive_feedback: bool = True, use_cache: bool = True,
+           intents: list | None = None, stream: bool = STREAM_WRITES, capture_id: str | None = None) -> list:
     """
     Phase 2 router: decompose raw input into typed intents, validate each,
-    and write to the appropriate Notion database.
-    """
-    intents = split_intents(user_input)
+    and write to the appropriate Notion database. Pass *intents* to skip
+    splitting when they are already known.
+
+    With *stream* set and no review window to show, hands off to
+    triage_stream() so writes start while the model is still responding.
+    With *capture_id*, each step is recorded in the capture store.
 
-    logger.info('INPUT: "%s"', user_input[:120])
+    Returns the Notion page ID for each valid intent, in input order
+    (None where the write was skipped or dead-lettered).
+    """
+    reviewing = is_feedback_enabled() and interactive_feedback
+    if stream and intents is None and not reviewing:
+        return triage_stream(user_input, use_cache=use_cache, capture_id=capture_id)
+
+    start = time.perf_counter()
+    with metrics.span("triage") as span:
+        if intents is None:
+            intents = split_intents(user_input, use_cache=use_cache)
+            if capture_id:
+                capture_store.store.split(capture_id, intents)
+
+        logger.info('INPUT: "%s"', user_input[:120])
+
+        if reviewing:
+            with metrics.span("feedback.review"):
+                try:
+                    from feedback_ui import review_intents_interactive
+                    intents = review_intents_interactive(user_input, intents)
+                except Exception as e:
+                    logger.error("Failed to run feedback interactive window: %s", e)
+
+        span.set(intents=len(intents))
+        items = validate_intents(intents)
+        if capture_id:
+            items = capture_store.store.validated(capture_id, items)
+        if not intents:
+            logger.warning('REJECTED No classifiable intents in: "%s"', user_input[:80])
+            return []
+
+        page_ids = _write_all(items, user_input, _first_write_timer("triage.first_write", start))
+        for item, page_id in zip(items, page_ids):
+            _log_written(item, page_id)
+        span.set(written=sum(1 for page_id in page_ids if page_id))
+        return page_ids
+
+
+def triage_stream(user_input: str, use_cache: bool = True, capture_id: str | None = None) -> list:
+    """
+    Streaming triage for unattended captures: each intent is validated and
+    its Notion write started as soon as the model finishes streaming it, so
+    the first page lands after the first intent instead of after the whole
+    response. There is no review window.
 
-    if is_feedback_enabled() and interactive_feedback:
+    Returns page IDs in the order the intents arrived (None where the write
+    was skipped or dead-lettered).
+    """
+    start = time.perf_counter()
+    with metrics.span("triage.stream") as span:
+        logger.info('INPUT: "%s"', user_input[:120])
+        write = _writer(user_input, _first_write_timer("triage.stream.first_write", start))
+        intents, submitted = [], []
+        with ThreadPoolExecutor(max_workers=max(1, NOTION_MAX_CONCURRENCY), thread_name_prefix="notion-write") as pool:
+            # Writes already started still finish if the stream breaks off
+            for intent in stream_intents(user_input, use_cache=use_cache):
+                intents.append(intent)
+                item = _validate_intent(intent)
+                if item is not None:
+                    if capture_id:
+                        item = capture_store.store.add_items(capture_id, [item])[0]
+                    submitted.append((item, pool.submit(write, item)))
+            if capture_id:
+                capture_store.store.validated(capture_id, intents=intents)
+
+        page_ids = []
+        for item, future in submitted:
+            page_id = future.result()
+            _log_written(item, page_id)
+            page_ids.append(page_id)
+        if not intents:
+            logger.warning('REJECTED No classifiable intents in: "%s"', user_input[:80])
+        span.set(intents=len(intents), written=sum(1 for page_id in page_ids if page_id))
+        return page_ids
+
+
+async def triage_async(user_input: str, use_cache: bool = True, intents: list | None = None) -> list:
+    """
+    triage() for callers inside an event loop, such as an async server
+    handling several captures at once. Splitting and Notion writes go
+    through the async Gemini and Notion clients, with at most
+    NOTION_MAX_CONCURRENCY writes in flight per capture; validation and
+    page properties are the same as triage(). There is no review window.
+
+    Returns page IDs in input order (None where the write was skipped or
+    dead-lettered).
+    """
+    start = time.perf_counter()
+    with metrics.span("triage.async") as span:
+        if intents is None:
+            intents = await split_intents_async(user_input, use_cache=use_cache)
+
+        logger.info('INPUT: "%s"', user_input[:120])
+        span.set(intents=len(intents))
+        if not intents:
+            logger.warning('REJECTED No classifiable intents in: "%s"', user_input[:80])
+            return []
+
+        items = validate_intents(intents)
+        on_written = _first_write_timer("triage.async.first_write", start)
+        in_flight = asyncio.Semaphore(max(1, NOTION_MAX_CONCURRENCY))
+
+        async def write(item):
+            async with in_flight:
+                page_id = await write_to_notion_async(item, user_input)
+            if page_id:
+                on_written()
+            return page_id
+
+        async with async_session():  # closes the loop's Notion client once no capture is using it
+            page_ids = list(await asyncio.gather(*map(write, items)))
+        for item, page_id in zip(items, page_ids):
+            _log_written(item, page_id)
+        span.set(written=sum(1 for page_id in page_ids if page_id))
+        return page_ids
+
+
+def triage_many(user_inputs: list[str], use_cache: bool = True) -> list:
+    """
+    Non-interactive triage of several inputs, splitting them with as few
+    model requests as possible. Returns each input's page IDs, or the
+    exception its triage raised.
+    """
+    outcomes = []
+    for user_input, intents in zip(user_inputs, split_intents_batch(user_inputs, use_cache=use_cache)):
         try:
-            from feedback_ui import review_intents_interactive
-            intents = review_intents_interactive(user_input, intents)
+            outcomes.append(triage(user_input, interactive_feedback=False, use_cache=use_cache, intents=intents))
         except Exception as e:
-            logger.error("Failed to run feedback interactive window: %s", e)
+            logger.exception('Failed to triage: "%s"', user_input[:80])
+            outcomes.append(e)
+    return outcomes
 
-    if not intents:
-        logger.warning('REJECTED No classifiable intents in: "%s"', user_input[:80])
-        return
 
-    for intent in intents:
-        item = _validate_intent(intent)
-        if item is None:
-            continue
+def triage_capture(capture: dict, interactive_feedback: bool = False, use_cache: bool = True,
+                   stream: bool = STREAM_WRITES) -> list:
+    """
+    Triage a capture from the capture store, carrying it forward from the
+    state it was left in: split it if it was only received, validate its
+    recorded intents if it was split, split it again if its stream broke
+    off, and write whichever items are still pending once validated.
+    Returns the page IDs written by this call.
+    """
+    capture_id, text, state = capture["id"], capture["text"], capture["state"]
+    if state == capture_store.RECEIVED and not capture["items"]:
+        return triage(text, interactive_feedback=interactive_feedback, use_cache=use_cache,
+                      stream=stream, capture_id=capture_id)
+    if state == capture_store.SPLIT:
+        return triage(text, interactive_feedback=interactive_feedback, use_cache=use_cache,
+                      intents=capture["intents"], capture_id=capture_id)
+    with metrics.span("triage.resume", state=state):
+        if state == capture_store.RECEIVED:
+            _resplit_streamed(capture, use_cache)
+        return _write_all(capture_store.store.pending_items(capture_id), text)
+
+
+def _resplit_streamed(capture: dict, use_cache: bool) -> None:
+    """
+    Finish the split of a capture whose stream broke off: the intents that
+    never arrived are only known by splitting again. Items recorded before
+    the break are kept as they are (some may already be written); only the
+    rest of the new split is added, and a write that still repeats an
+    earlier page is caught by the page index.
+    """
+    intents = split_intents(capture["text"], use_cache=use_cache)
+    recorded = Counter(_item_key(item) for item in capture["items"])
+    missing = []
+    for item in validate_intents(intents):
+        if recorded[_item_key(item)] > 0:
+            recorded[_item_key(item)] -= 1
+        else:
+            missing.append(item)
+    capture_store.store.validated(capture["id"], missing, intents=intents)
 
-        write_to_notion(item, user_input)
-        logger.info('OK %s created: "%s"', item["type"], item["title"])
 
+def _item_key(item: dict) -> tuple:
+    return item["type"], normalize_title(item["title"])
 
-def _log_raw_input(text: str) -> None:
-    entry = {
-        "ts": datetime.datetime.now(datetime.timezone.utc).isoformat(),
-        "input": text,
-    }
-    with RAW_INPUT_LOG.open("a", encoding="utf-8") as f:
-        f.write(json.dumps(entry) + "\n")
 
+def resume_captures(orphans_only: bool = False) -> int:
+    """
+    Recovery pass: carry forward every unfinished capture that no running
+    process owns, such as one whose process died mid-triage, without
+    review windows. With *orphans_only*, only captures left behind by a
+    process that has died are resumed, so captures another process has
+    queued (e.g. the server's, awaiting its workers) are left to it.
+    Returns how many captures were resumed.
+    """
+    store = capture_store.store
+    orphans = store.recover()
+    if orphans_only:
+        claims = (store.claim(capture_id) for capture_id in orphans)
+    else:
+        claims = iter(store.claim, None)
+    resumed = 0
+    for capture in claims:
+        if capture is None:
+            continue  # already claimed elsewhere, or not yet due
+        resumed += 1
+        logger.info('Resuming %s capture: "%s"', capture["state"], capture["text"][:80])
+        try:
+            triage_capture(capture)
+        except Exception as e:
+            logger.exception('Failed to resume capture: "%s"', capture["text"][:80])
+            store.fail(capture["id"], f"{type(e).__name__}: {e}")
+    return resumed
 
-def flush_dead_letter() -> None:
-    if not DEAD_LETTER_PATH.exists():
-        logger.info("Dead-letter queue is empty.")
-        return
 
-    lines = DEAD_LETTER_PATH.read_text(encoding="utf-8").splitlines()
-    entries = [json.loads(line) for line in lines if line.strip()]
-    if not entries:
+def _import_legacy_dead_letter() -> None:
+    """Move whatever is left in dead_letter.jsonl (or a crashed flush of it) into the capture store."""
+    segment = LEGACY_DEAD_LETTER_PATH.with_name(LEGACY_DEAD_LETTER_PATH.stem + ".flushing.jsonl")
+    acks = LEGACY_DEAD_LETTER_PATH.with_name(LEGACY_DEAD_LETTER_PATH.stem + ".acks")
+    paths = [path for path in (segment, LEGACY_DEAD_LETTER_PATH) if path.exists()]
+    if not paths:
+        return
+    acked = set()
+    if acks.exists():
+        acked = {int(line) for line in acks.read_text(encoding="utf-8").split() if line.isdigit()}
+
+    entries = []
+    for path in paths:
+        offset = 0
+        with path.open("rb") as f:
+            for raw in f:
+                if raw.strip() and not (path == segment and offset in acked):
+                    try:
+                        entry = json.loads(raw)
+                        entries.append((entry["item"], entry["raw_input"], entry.get("failed_at")))
+                    except (ValueError, KeyError, TypeError) as e:
+                        logger.error("Dropping malformed dead-letter entry (%s): %s", e, raw.decode("utf-8", "replace").strip())
+                offset += len(raw)
+
+    capture_store.store.import_dead_letters(entries)
+    for path in (*paths, acks):
+        path.unlink(missing_ok=True)
+    logger.info("Imported %d dead-letter entries into the capture store", len(entries))
+
+
+def flush_dead_letter(workers: int = NOTION_MAX_CONCURRENCY) -> None:
+    """
+    Replay every dead-lettered write in the capture store, up to *workers*
+    captures at a time. Items that fail again are dead-lettered again. If
+    the flush crashes, the captures it had claimed are picked up by the
+    next recovery pass.
+    """
+    _import_legacy_dead_letter()
+    capture_ids = capture_store.store.requeue_dead_letters()
+    if not capture_ids:
         logger.info("Dead-letter queue is empty.")
         return
 
-    logger.info("Flushing %d dead-letter item(s)...", len(entries))
-    # Clear the file before replaying — failures will re-append themselves
-    DEAD_LETTER_PATH.write_text("", encoding="utf-8")
-
-    ok = failed = 0
-    for entry in entries:
+    def replay(capture_id):
+        capture = capture_store.store.get(capture_id)
         try:
-            write_to_notion(entry["item"], entry["raw_input"])
-            ok += 1
-        except Exception:
-            failed += 1  # write_to_notion already re-appended to DLQ
-
-    logger.info("DLQ flush complete: %d OK, %d re-queued", ok, failed)
-
-
-# ---------------------------------------------------------------------------
-# Tests
-# ---------------------------------------------------------------------------
-
-class TestValidateTask(unittest.TestCase):
+            page_ids = triage_capture(capture)
+        except Exception as e:
+            logger.error('Dead-letter replay failed, left for the recovery pass: "%s": %s', capture["text"][:80], e)
+            return 0, 0
+        ok = sum(1 for page_id in page_ids if page_id)
+        return ok, len(page_ids) - ok
 
-    def test_valid_full(self):
-        result = _validate_intent({"type": "Task", "title": "Write report", "priority": "High", "due_date": "2026-02-15"})
-        self.assertIsNotNone(result)
-        self.assertEqual(result["type"], "Task")
-        self.assertEqual(result["title"], "Write report")
-        self.assertEqual(result["structured_fields"]["priority"], "High")
-        self.assertEqual(result["structured_fields"]["due_date"], "2026-02-15")
+    with ThreadPoolExecutor(max_workers=max(1, workers), thread_name_prefix="dlq-flush") as pool:
+        results = list(pool.map(metrics.bind(replay), capture_ids))
 
-    def test_valid_null_optional_fields(self):
-        result = _validate_intent({"type": "Task", "title": "Buy groceries", "priority": None, "due_date": None})
-        self.assertIsNotNone(result)
-        self.assertIsNone(result["structured_fields"]["priority"])
-        self.assertIsNone(result["structured_fields"]["due_date"])
-
-    def test_title_whitespace_only_rejected(self):
-        self.assertIsNone(_validate_intent({"type": "Task", "title": "   ", "priority": None, "due_date": None}))
-
-    def test_invalid_priority_rejected(self):
-        self.assertIsNone(_validate_intent({"type": "Task", "title": "Do something", "priority": "Urgent", "due_date": None}))
-
-    def test_malformed_date_rejected(self):
-        self.assertIsNone(_validate_intent({"type": "Task", "title": "Do something", "priority": None, "due_date": "next Friday"}))
-
-    def test_all_valid_priorities_accepted(self):
-        for p in ("High", "Medium", "Low"):
-            with self.subTest(priority=p):
-                self.assertIsNotNone(_validate_intent({"type": "Task", "title": "Do something", "priority": p, "due_date": None}))
-
-
-class TestValidateProject(unittest.TestCase):
-
-    def test_valid_full(self):
-        result = _validate_intent({"type": "Project", "title": "Launch website", "success_criteria": "1000 signups", "review_frequency": "Weekly"})
-        self.assertIsNotNone(result)
-        self.assertEqual(result["type"], "Project")
-        self.assertEqual(result["structured_fields"]["review_frequency"], "Weekly")
-        self.assertEqual(result["structured_fields"]["success_criteria"], "1000 signups")
-
-    def test_valid_null_optional_fields(self):
-        result = _validate_intent({"type": "Project", "title": "Redesign dashboard", "success_criteria": None, "review_frequency": None})
-        self.assertIsNotNone(result)
-
-    def test_empty_title_rejected(self):
-        self.assertIsNone(_validate_intent({"type": "Project", "title": "", "success_criteria": None, "review_frequency": None}))
-
-    def test_invalid_review_frequency_rejected(self):
-        self.assertIsNone(_validate_intent({"type": "Project", "title": "Some project", "review_frequency": "Daily"}))
-
-    def test_valid_review_frequencies_accepted(self):
-        for freq in ("Weekly", "Monthly"):
-            with self.subTest(freq=freq):
-                self.assertIsNotNone(_validate_intent({"type": "Project", "title": "Some project", "review_frequency": freq}))
-
-
-class TestValidateIdea(unittest.TestCase):
-
-    def test_valid_full(self):
-        result = _validate_intent({"type": "Idea", "title": "AI writing assistant", "category": "Product", "potential_impact": "High"})
-        self.assertIsNotNone(result)
-        self.assertEqual(result["type"], "Idea")
-        self.assertEqual(result["structured_fields"]["category"], "Product")
-        self.assertEqual(result["structured_fields"]["potential_impact"], "High")
-
-    def test_valid_null_optional_fields(self):
-        result = _validate_intent({"type": "Idea", "title": "Use dark mode", "category": None, "potential_impact": None})
-        self.assertIsNotNone(result)
-
-    def test_empty_title_rejected(self):
-        self.assertIsNone(_validate_intent({"type": "Idea", "title": "", "category": None, "potential_impact": None}))
-
-    def test_invalid_potential_impact_rejected(self):
-        self.assertIsNone(_validate_intent({"type": "Idea", "title": "Cool idea", "potential_impact": "Huge"}))
-
-
-class TestTriage(unittest.TestCase):
-
-    def setUp(self):
-        self.fb_patch = patch(f"{_THIS_MODULE}.is_feedback_enabled", return_value=False)
-        self.fb_patch.start()
-
-    def tearDown(self):
-        self.fb_patch.stop()
-
-    def test_no_intents_nothing_written(self):
-        with patch(f"{_THIS_MODULE}.split_intents", return_value=[]):
-            with patch(f"{_THIS_MODULE}.write_to_notion") as mock_write:
-                triage("hmm")
-                mock_write.assert_not_called()
-
-    def test_single_valid_task_written(self):
-        intents = [{"type": "Task", "title": "Submit report", "priority": "High", "due_date": "2026-02-14"}]
-        with patch(f"{_THIS_MODULE}.split_intents", return_value=intents):
-            with patch(f"{_THIS_MODULE}.write_to_notion") as mock_write:
-                triage("Submit report by tomorrow, high priority")
-                mock_write.assert_called_once()
-                item = mock_write.call_args[0][0]
-                self.assertEqual(item["type"], "Task")
-                self.assertEqual(item["title"], "Submit report")
-                self.assertEqual(item["structured_fields"]["priority"], "High")
-
-    def test_mixed_intents_all_written(self):
-        intents = [
-            {"type": "Task",    "title": "Send email",       "priority": None, "due_date": None},
-            {"type": "Project", "title": "Build portfolio",  "success_criteria": None, "review_frequency": None},
-            {"type": "Idea",    "title": "Try serverless",   "category": None, "potential_impact": None},
-        ]
-        with patch(f"{_THIS_MODULE}.split_intents", return_value=intents):
-            with patch(f"{_THIS_MODULE}.write_to_notion") as mock_write:
-                triage("Send email, build portfolio, try serverless")
-                self.assertEqual(mock_write.call_count, 3)
-                types_written = [c[0][0]["type"] for c in mock_write.call_args_list]
-                self.assertEqual(types_written, ["Task", "Project", "Idea"])
-
-    def test_unknown_intent_type_skipped(self):
-        intents = [{"type": "Reminder", "title": "Call dentist"}]
-        with patch(f"{_THIS_MODULE}.split_intents", return_value=intents):
-            with patch(f"{_THIS_MODULE}.write_to_notion") as mock_write:
-                triage("Call dentist next week")
-                mock_write.assert_not_called()
-
-    def test_invalid_task_not_written(self):
-        intents = [{"type": "Task", "title": "", "priority": None, "due_date": None}]
-        with patch(f"{_THIS_MODULE}.split_intents", return_value=intents):
-            with patch(f"{_THIS_MODULE}.write_to_notion") as mock_write:
-                triage("something vague")
-                mock_write.assert_not_called()
-
-    def test_invalid_intent_does_not_block_valid_intent(self):
-        intents = [
-            {"type": "Task", "title": "",            "priority": None, "due_date": None},  # invalid
-            {"type": "Task", "title": "Fix login bug", "priority": None, "due_date": None},  # valid
-        ]
-        with patch(f"{_THIS_MODULE}.split_intents", return_value=intents):
-            with patch(f"{_THIS_MODULE}.write_to_notion") as mock_write:
-                triage("some input")
-                mock_write.assert_called_once()
-                self.assertEqual(mock_write.call_args[0][0]["title"], "Fix login bug")
-
-    def test_raw_input_forwarded_to_writer(self):
-        raw = "Finish the report by Friday, high priority"
-        intents = [{"type": "Task", "title": "Finish report", "priority": "High", "due_date": "2026-02-13"}]
-        with patch(f"{_THIS_MODULE}.split_intents", return_value=intents):
-            with patch(f"{_THIS_MODULE}.write_to_notion") as mock_write:
-                triage(raw)
-                self.assertEqual(mock_write.call_args[0][1], raw)
+    logger.info("DLQ flush complete: %d OK, %d re-queued", sum(r[0] for r in results), sum(r[1] for r in results))
+    logger.info("Notion rate limiter: %s", limiter.stats())
 
 
-if __name__ == "__main__":
+def setup_logging() -> None:
     fmt = logging.Formatter(
         "%(asctime)s %(name)-12s %(levelname)-8s %(message)s",
         datefmt="%Y-%m-%d %H:%M:%S",
     )
-    fh = logging.FileHandler("triage.log", encoding="utf-8")
+    fh = logging.FileHandler(Path(__file__).parent / "triage.log", encoding="utf-8")
     fh.setFormatter(fmt)
-    sh = logging.StreamHandler(sys.stdout)
-    sh.setFormatter(fmt)
     logging.root.setLevel(logging.INFO)
     logging.root.addHandler(fh)
-    logging.root.addHandler(sh)
+    if sys.stdout is not None:  # pythonw has no console
+        sh = logging.StreamHandler(sys.stdout)
+        sh.setFormatter(fmt)
+        logging.root.addHandler(sh)
+
 
-    logger.info("main.py started, argv: %s", sys.argv)
-    validate_notion_schemas()
+def _record_startup() -> None:
+    """Split process start-up into interpreter boot and module imports."""
+    process_started = metrics.process_start_time()
+    if process_started is not None:
+        metrics.record("startup.interpreter", max(0.0, _MAIN_STARTED - process_started) * 1000)
+    metrics.record("startup.imports", (_IMPORTS_DONE - _MAIN_STARTED) * 1000)
+
+
+if __name__ == "__main__":
+    setup_logging()
+    metrics.enable()
+
+    exit_code = None
     try:
-        args = sys.argv[1:]
-        if args:
+        with metrics.span("capture"):
+            _record_startup()
+            logger.info("main.py started, argv: %s", sys.argv)
+            args = sys.argv[1:]
+            revalidate = "--revalidate" in args
+            if revalidate:
+                args.remove("--revalidate")
+            validate_notion_schemas(revalidate=revalidate)
+
             if "--feedback-on" in args:
                 set_feedback_enabled(True)
                 logger.info("Feedback mode enabled via CLI flag")
@@ -304,15 +405,43 @@ if __name__ == "__main__":
                 interactive = False
                 args.remove("--no-interactive")
 
+            use_cache = True
+            if "--no-cache" in args:
+                use_cache = False
+                args.remove("--no-cache")
+
+            stream = STREAM_WRITES
+            if "--stream" in args:
+                stream = True
+                args.remove("--stream")
+
             if args:
                 cmd = args[0]
                 if cmd == "--flush":
                     flush_dead_letter()
+                elif cmd == "--batch":
+                    import batch
+
+                    # Unattended: no review window, and no pause at the end
+                    exit_code = batch.main(
+                        args[1:],
+                        process=lambda texts: triage_many(texts, use_cache=use_cache),
+                        chunk_size=LLM_BATCH_SIZE,
+                    )
                 else:
-                    _log_raw_input(cmd)
-                    triage(cmd, interactive_feedback=interactive)
+                    # Recorded before any model call, so a crash can't lose it
+                    capture_id = capture_store.store.receive(cmd, source="cli", claim=True)
+                    try:
+                        triage_capture(capture_store.store.get(capture_id), interactive_feedback=interactive,
+                                       use_cache=use_cache, stream=stream)
+                    except Exception as e:
+                        capture_store.store.fail(capture_id, f"{type(e).__name__}: {e}")
+                        raise
+                    resume_captures(orphans_only=True)
     except Exception as e:
         logger.exception("Unhandled error: %s", e)
+        exit_code = 1
     finally:
-        input("\nPress Enter to close...")
-
+        if exit_code is None:
+            input("\nPress Enter to close...")
+    sys.exit(exit_code or 0)
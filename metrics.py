@@ -0,0 +1,311 @@
+"""
+Span-based latency and token-usage instrumentation.
+
+Wrap a pipeline stage in ``with span("name"):`` (or decorate it with
+``@timed("name")``). Spans nest: each one records its parent and the trace
+(one capture) it belongs to. Counters such as token counts, retries and
+rate-limit waits are attached to the innermost open span with
+``add("key", amount)``.
+
+Nothing is written until enable() is called (main.py and the daemon do),
+so library use and tests stay side-effect free. Finished spans are
+appended to metrics.jsonl, one JSON object per line:
+
+    {"ts": ..., "trace": ..., "span": ..., "parent": ..., "name": "notion.write",
+     "ms": 412.3, "type": "Task", "attempts": 1, "ratelimit_wait_ms": 0.0}
+
+Summarise the log with p50/p95/p99 per stage:
+
+    python metrics.py                 # everything
+    python metrics.py --since 24h     # last day only
+    python metrics.py --name notion.  # stages starting with "notion."
+"""
+import argparse
+import contextvars
+import functools
+import json
+import logging
+import math
+import os
+import sys
+import threading
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+
+logger = logging.getLogger(__name__)
+
+METRICS_PATH = Path(__file__).parent / "metrics.jsonl"
+
+
+class Span:
+    __slots__ = ("name", "trace_id", "span_id", "parent_id", "attrs", "started")
+
+    def __init__(self, name: str, parent: "Span | None" = None, **attrs):
+        self.name = name
+        self.trace_id = parent.trace_id if parent else os.urandom(8).hex()
+        self.span_id = os.urandom(4).hex()
+        self.parent_id = parent.span_id if parent else None
+        self.attrs = attrs
+        self.started = time.perf_counter()
+
+    def set(self, **attrs) -> None:
+        self.attrs.update(attrs)
+
+    def add(self, key: str, amount: float = 1) -> None:
+        self.attrs[key] = self.attrs.get(key, 0) + amount
+
+
+class _NullSpan:
+    """Stand-in returned by current() outside any span, so callers never need to check."""
+
+    def set(self, **attrs) -> None:
+        pass
+
+    def add(self, key: str, amount: float = 1) -> None:
+        pass
+
+
+_NULL_SPAN = _NullSpan()
+_current = contextvars.ContextVar("triage_span", default=None)
+
+
+class MetricsLog:
+    """Append-only JSONL sink, safe to share between threads."""
+
+    def __init__(self, path: Path = METRICS_PATH):
+        self.path = Path(path)
+        self._lock = threading.Lock()
+        self._file = None
+
+    def write(self, record: dict) -> None:
+        line = json.dumps(record, ensure_ascii=False, default=str) + "\n"
+        with self._lock:
+            try:
+                if self._file is None:
+                    self._file = self.path.open("a", encoding="utf-8")
+                self._file.write(line)
+                self._file.flush()
+            except OSError as e:
+                logger.warning("Could not write metrics to %s: %s", self.path, e)
+
+    def close(self) -> None:
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+
+
+_sink: MetricsLog | None = None
+
+
+def enable(path: Path = METRICS_PATH) -> None:
+    """Start writing finished spans to *path*."""
+    global _sink
+    if _sink is None or _sink.path != Path(path):
+        _sink = MetricsLog(path)
+
+
+def disable() -> None:
+    global _sink
+    if _sink is not None:
+        _sink.close()
+    _sink = None
+
+
+def log_path() -> Path | None:
+    """Where finished spans are being written, or None when disabled."""
+    return _sink.path if _sink is not None else None
+
+
+def _emit(span: Span, duration_ms: float) -> None:
+    if _sink is None:
+        return
+    _sink.write({
+        "ts": datetime.now(timezone.utc).isoformat(),
+        "trace": span.trace_id,
+        "span": span.span_id,
+        "parent": span.parent_id,
+        "name": span.name,
+        "ms": round(duration_ms, 3),
+        **span.attrs,
+    })
+
+
+@contextmanager
+def span(name: str, **attrs):
+    """Time the enclosed block as a child of the current span (or as a new trace)."""
+    s = Span(name, _current.get(), **attrs)
+    token = _current.set(s)
+    try:
+        yield s
+    except BaseException as e:
+        s.attrs["error"] = type(e).__name__
+        raise
+    finally:
+        _current.reset(token)
+        _emit(s, (time.perf_counter() - s.started) * 1000)
+
+
+def timed(name: str):
+    """Decorator form of span()."""
+    def decorator(fn):
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            with span(name):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def current():
+    """The innermost open span, or a no-op stand-in."""
+    return _current.get() or _NULL_SPAN
+
+
+def add(key: str, amount: float = 1) -> None:
+    """Add *amount* to counter *key* on the innermost open span."""
+    current().add(key, amount)
+
+
+def record(name: str, duration_ms: float, **attrs) -> None:
+    """Record a stage that was timed elsewhere (e.g. process start-up) under the current span."""
+    s = Span(name, _current.get(), **attrs)
+    _emit(s, duration_ms)
+
+
+def bind(fn):
+    """
+    Wrap *fn* so it runs under the current span when called from another thread.
+
+    Worker threads start with an empty context, so spans opened there would
+    otherwise begin new traces.
+    """
+    parent = _current.get()
+
+    @functools.wraps(fn)
+    def wrapper(*args, **kwargs):
+        token = _current.set(parent)
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            _current.reset(token)
+    return wrapper
+
+
+def process_start_time() -> float | None:
+    """Wall-clock time this process was created, or None if the OS won't say."""
+    try:
+        if os.name == "nt":
+            import ctypes
+            from ctypes import wintypes
+
+            creation, exit_, kernel, user = (wintypes.FILETIME() for _ in range(4))
+            handle = ctypes.windll.kernel32.GetCurrentProcess()
+            if not ctypes.windll.kernel32.GetProcessTimes(
+                handle, ctypes.byref(creation), ctypes.byref(exit_), ctypes.byref(kernel), ctypes.byref(user)
+            ):
+                return None
+            ticks = (creation.dwHighDateTime << 32) | creation.dwLowDateTime
+            return ticks / 1e7 - 11644473600  # FILETIME epoch is 1601-01-01
+        with open("/proc/self/stat", encoding="ascii") as f:
+            start_ticks = int(f.read().rsplit(")", 1)[1].split()[19])
+        with open("/proc/uptime", encoding="ascii") as f:
+            uptime = float(f.read().split()[0])
+        return time.time() - uptime + start_ticks / os.sysconf("SC_CLK_TCK")
+    except (OSError, ValueError, IndexError, AttributeError):
+        return None
+
+
+# ---------- Summary CLI ----------
+
+def _percentile(sorted_values: list, pct: float) -> float:
+    """Nearest-rank percentile."""
+    rank = max(1, math.ceil(pct / 100 * len(sorted_values)))
+    return sorted_values[rank - 1]
+
+
+def parse_since(text: str) -> datetime:
+    """The UTC time *text* (30m, 24h, 7d) ago. Raises argparse.ArgumentTypeError otherwise."""
+    units = {"m": "minutes", "h": "hours", "d": "days"}
+    if text[-1:] not in units or not text[:-1].isdigit():
+        raise argparse.ArgumentTypeError("use e.g. 30m, 24h or 7d")
+    return datetime.now(timezone.utc) - timedelta(**{units[text[-1]]: int(text[:-1])})
+
+
+def summarize(path: Path = METRICS_PATH, since: datetime | None = None, prefix: str = "") -> dict:
+    """Per-stage count, p50/p95/p99/max duration and summed counters from a metrics log."""
+    durations = defaultdict(list)
+    counters = defaultdict(lambda: defaultdict(float))
+    errors = defaultdict(int)
+    with Path(path).open(encoding="utf-8") as f:
+        for line in f:
+            try:
+                rec = json.loads(line)
+            except ValueError:
+                continue
+            name = rec.get("name", "")
+            if not name.startswith(prefix):
+                continue
+            if since and datetime.fromisoformat(rec["ts"]) < since:
+                continue
+            durations[name].append(rec["ms"])
+            if "error" in rec:
+                errors[name] += 1
+            for key, value in rec.items():
+                if key not in ("ms", "ts") and isinstance(value, (int, float)) and not isinstance(value, bool):
+                    counters[name][key] += value
+
+    stats = {}
+    for name, values in durations.items():
+        values.sort()
+        stats[name] = {
+            "count": len(values),
+            "p50": _percentile(values, 50),
+            "p95": _percentile(values, 95),
+            "p99": _percentile(values, 99),
+            "max": values[-1],
+            "errors": errors[name],
+            "totals": dict(counters[name]),
+        }
+    return stats
+
+
+def print_summary(stats: dict) -> None:
+    if not stats:
+        print("No spans recorded.")
+        return
+    width = max(len(name) for name in stats)
+    print(f"{'stage':<{width}}  {'n':>6}  {'p50 ms':>9}  {'p95 ms':>9}  {'p99 ms':>9}  {'max ms':>9}  err")
+    for name in sorted(stats):
+        s = stats[name]
+        print(
+            f"{name:<{width}}  {s['count']:>6}  {s['p50']:>9.1f}  {s['p95']:>9.1f}"
+            f"  {s['p99']:>9.1f}  {s['max']:>9.1f}  {s['errors']:>3}"
+        )
+    totals = [(name, s["count"], s["totals"]) for name, s in sorted(stats.items()) if s["totals"]]
+    if totals:
+        print("\nCounters (total / mean per span):")
+        for name, count, t in totals:
+            parts = ", ".join(f"{k} {v:g} / {v / count:.1f}" for k, v in sorted(t.items()))
+            print(f"  {name:<{width}}  {parts}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Summarise triage latency metrics")
+    parser.add_argument("--path", type=Path, default=METRICS_PATH, help="Metrics log to read")
+    parser.add_argument("--since", type=parse_since, help="Only spans newer than this (30m, 24h, 7d)")
+    parser.add_argument("--name", default="", help="Only stages whose name starts with this")
+    parser.add_argument("--json", action="store_true", help="Print the summary as JSON")
+    args = parser.parse_args()
+
+    if not args.path.exists():
+        print(f"No metrics log at {args.path}", file=sys.stderr)
+        sys.exit(1)
+    result = summarize(args.path, since=args.since, prefix=args.name)
+    if args.json:
+        print(json.dumps(result, indent=2))
+    else:
+        print_summary(result)
@@ -0,0 +1,278 @@
+#!/usr/bin/env python3
+"""
+Local SQLite mirror of the Notion databases in notion.DB_MAP.
+
+Lookups against what is already in Notion (dedup, analytics, re-triage)
+read mirror.sqlite3 instead of paging through the Notion API. sync()
+keeps it current incrementally: each database is queried only for pages
+edited since its last sync (a last_edited_time filter, oldest first), and
+results are streamed into the mirror one API page at a time, so memory
+stays constant however large the database is. The watermark advances in
+the same transaction as each batch of pages, so an interrupted sync
+resumes where it stopped.
+
+The incremental query can't see pages that were deleted (trashed) in
+Notion; a full sync (--full) re-reads every page and drops those no
+longer there.
+
+Usage:
+    python mirror.py                       # sync every configured database once
+    python mirror.py --full                # re-read everything, dropping deleted pages
+    python mirror.py --every 300           # keep syncing every five minutes
+    python mirror.py --type Task           # sync one database
+    python mirror.py --stats               # pages mirrored per type, without syncing
+"""
+import argparse
+import json
+import logging
+import sqlite3
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+
+from page_index import normalize_title
+
+logger = logging.getLogger(__name__)
+
+MIRROR_PATH = Path(__file__).parent / "mirror.sqlite3"
+_BATCH = 100  # pages per transaction; one Notion result page
+
+
+class Mirror:
+    """SQLite (WAL) copy of the mirrored databases' pages, keyed by page ID."""
+
+    def __init__(self, path: Path = MIRROR_PATH, clock=time.time):
+        self.path = Path(path)
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._conn = None
+
+    def _connect(self):
+        if self._conn is None:
+            conn = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.executescript(
+                "CREATE TABLE IF NOT EXISTS pages ("
+                " id TEXT PRIMARY KEY,"
+                " type TEXT NOT NULL,"
+                " db_id TEXT NOT NULL,"
+                " title TEXT NOT NULL,"
+                " title_key TEXT NOT NULL,"
+                " url TEXT,"
+                " properties TEXT NOT NULL,"   # the page's Notion properties, as JSON
+                " created_time TEXT NOT NULL,"
+                " last_edited_time TEXT NOT NULL,"
+                " synced_at REAL NOT NULL);"
+                "CREATE INDEX IF NOT EXISTS pages_title ON pages(type, title_key);"
+                "CREATE INDEX IF NOT EXISTS pages_edited ON pages(type, last_edited_time);"
+                "CREATE TABLE IF NOT EXISTS sync_state ("
+                " type TEXT PRIMARY KEY,"
+                " db_id TEXT NOT NULL,"
+                " watermark TEXT,"             # last_edited_time of the newest page mirrored
+                " synced_at REAL);"
+            )
+            self._conn = conn
+        return self._conn
+
+    @contextmanager
+    def _transaction(self):
+        with self._lock:
+            conn = self._connect()
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                yield conn
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+            conn.execute("COMMIT")
+
+    # ---------- Sync ----------
+
+    def sync(self, db_map=None, full=False) -> dict[str, int]:
+        """
+        Pull pages edited since the last sync from each database in
+        *db_map* (default notion.DB_MAP). Returns pages mirrored per type.
+        """
+        import notion
+
+        if db_map is None:
+            db_map = notion.DB_MAP
+        counts = {}
+        for intent_type, db_id in db_map.items():
+            if not db_id:
+                continue
+            counts[intent_type] = self._sync_database(notion, intent_type, db_id, full)
+        return counts
+
+    def _sync_database(self, notion, intent_type, db_id, full):
+        from schema import INTENT_SCHEMA
+
+        title_field = INTENT_SCHEMA[intent_type]["title_field"]
+        with self._transaction() as conn:
+            row = conn.execute("SELECT db_id, watermark FROM sync_state WHERE type = ?", (intent_type,)).fetchone()
+            if row is None or row[0] != db_id:
+                # First sync, or the type now points at another database
+                conn.execute("DELETE FROM pages WHERE type = ?", (intent_type,))
+                conn.execute(
+                    "INSERT OR REPLACE INTO sync_state (type, db_id, watermark) VALUES (?, ?, NULL)",
+                    (intent_type, db_id),
+                )
+                watermark = None
+            else:
+                watermark = row[1]
+
+        started = self._clock()
+        query = None
+        if watermark and not full:
+            # Notion rounds last_edited_time to the minute, so re-read the boundary minute
+            query = {"timestamp": "last_edited_time", "last_edited_time": {"on_or_after": watermark}}
+        pages = notion.iter_pages(
+            db_id, filter=query, sorts=[{"timestamp": "last_edited_time", "direction": "ascending"}],
+        )
+
+        count = 0
+        batch = []
+        for page in pages:
+            batch.append(page)
+            if len(batch) >= _BATCH:
+                watermark = self._store(intent_type, db_id, title_field, batch, watermark, started)
+                count += len(batch)
+                batch = []
+        watermark = self._store(intent_type, db_id, title_field, batch, watermark, started)
+        count += len(batch)
+
+        with self._transaction() as conn:
+            if full:
+                # Anything not seen in a full pass is gone from Notion
+                conn.execute("DELETE FROM pages WHERE type = ? AND synced_at < ?", (intent_type, started))
+            conn.execute("UPDATE sync_state SET synced_at = ? WHERE type = ?", (self._clock(), intent_type))
+        logger.info("Mirrored %d %s page(s)%s", count, intent_type, " (full)" if full else "")
+        return count
+
+    def _store(self, intent_type, db_id, title_field, pages, watermark, synced_at):
+        import notion
+
+        with self._transaction() as conn:
+            for page in pages:
+                edited = page["last_edited_time"]
+                if watermark is None or edited > watermark:  # ISO 8601 UTC sorts as text
+                    watermark = edited
+                if page.get("in_trash") or page.get("archived"):
+                    conn.execute("DELETE FROM pages WHERE id = ?", (page["id"],))
+                    continue
+                title = notion.page_title(page, title_field)
+                conn.execute(
+                    "INSERT OR REPLACE INTO pages (id, type, db_id, title, title_key, url, properties,"
+                    " created_time, last_edited_time, synced_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                    (page["id"], intent_type, db_id, title, normalize_title(title), page.get("url"),
+                     json.dumps(page.get("properties", {})), page["created_time"], edited, synced_at),
+                )
+            conn.execute("UPDATE sync_state SET watermark = ? WHERE type = ?", (watermark, intent_type))
+        return watermark
+
+    # ---------- Reads ----------
+
+    def _row(self, row):
+        if row is None:
+            return None
+        keys = ("id", "type", "title", "url", "properties", "created_time", "last_edited_time")
+        record = dict(zip(keys, row))
+        record["properties"] = json.loads(record["properties"])
+        return record
+
+    def get(self, page_id: str) -> dict | None:
+        with self._lock:
+            row = self._connect().execute(
+                "SELECT id, type, title, url, properties, created_time, last_edited_time FROM pages WHERE id = ?",
+                (page_id,),
+            ).fetchone()
+        return self._row(row)
+
+    def find(self, item_type: str, title: str) -> list[dict]:
+        """Mirrored pages of *item_type* whose title matches *title* (normalized, as for dedup)."""
+        with self._lock:
+            rows = self._connect().execute(
+                "SELECT id, type, title, url, properties, created_time, last_edited_time FROM pages"
+                " WHERE type = ? AND title_key = ? ORDER BY created_time DESC",
+                (item_type, normalize_title(title)),
+            ).fetchall()
+        return [self._row(row) for row in rows]
+
+    def iter_pages(self, item_type: str | None = None, edited_since: str | None = None):
+        """Mirrored pages, optionally of one type and edited on or after an ISO timestamp, oldest edit first."""
+        clauses, params = [], []
+        if item_type:
+            clauses.append("type = ?")
+            params.append(item_type)
+        if edited_since:
+            clauses.append("last_edited_time >= ?")
+            params.append(edited_since)
+        where = f" WHERE {' AND '.join(clauses)}" if clauses else ""
+        with self._lock:
+            rows = self._connect().execute(
+                "SELECT id, type, title, url, properties, created_time, last_edited_time FROM pages"
+                f"{where} ORDER BY last_edited_time", params,
+            ).fetchall()
+        for row in rows:
+            yield self._row(row)
+
+    def stats(self) -> dict[str, dict]:
+        """Per type: pages mirrored, the watermark, and when it last synced."""
+        with self._lock:
+            conn = self._connect()
+            counts = dict(conn.execute("SELECT type, COUNT(*) FROM pages GROUP BY type").fetchall())
+            state = conn.execute("SELECT type, watermark, synced_at FROM sync_state").fetchall()
+        return {
+            intent_type: {"pages": counts.get(intent_type, 0), "watermark": watermark, "synced_at": synced_at}
+            for intent_type, watermark, synced_at in state
+        }
+
+    def close(self) -> None:
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+
+mirror = Mirror()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Mirror the Notion databases into a local SQLite store")
+    parser.add_argument("--path", type=Path, default=MIRROR_PATH)
+    parser.add_argument("--type", action="append", help="Only sync this intent type (repeatable)")
+    parser.add_argument("--full", action="store_true", help="Re-read every page and drop pages deleted in Notion")
+    parser.add_argument("--every", type=float, metavar="SECONDS", help="Keep syncing at this interval")
+    parser.add_argument("--stats", action="store_true", help="Show what is mirrored without syncing")
+    args = parser.parse_args()
+
+    from main import setup_logging
+
+    setup_logging()
+    m = Mirror(args.path)
+    if not args.stats:
+        import notion
+
+        db_map = {t: db for t, db in notion.DB_MAP.items() if not args.type or t in args.type}
+        if not any(db_map.values()):
+            print("No Notion databases configured to mirror.", file=sys.stderr)
+            sys.exit(1)
+        try:
+            while True:
+                try:
+                    for intent_type, count in m.sync(db_map, full=args.full).items():
+                        print(f"{intent_type:<10} {count} page(s) updated")
+                except Exception as e:
+                    if not args.every:
+                        raise
+                    logger.error("Sync failed, retrying in %gs: %s", args.every, e)
+                if not args.every:
+                    break
+                time.sleep(args.every)
+        except KeyboardInterrupt:
+            pass
+    for intent_type, info in sorted(m.stats().items()):
+        print(f"{intent_type:<10} {info['pages']:>7} pages  through {info['watermark'] or '-'}")
@@ -1,136 +1,301 @@
+import asyncio
+import hashlib
 import json
 import logging
 import os
 import random
+import threading
 import time
-from datetime import datetime, timezone
+import weakref
+from contextlib import asynccontextmanager
 from pathlib import Path
 
-from notion_client import Client
-from notion_client.errors import APIResponseError
-import requests
-
-from config import NOTION_TOKEN
-from schema import INTENT_SCHEMA
-
-DEAD_LETTER_PATH = Path(__file__).parent / "dead_letter.jsonl"
+from config import (
+    NOTION_RATE_BURST,
+    NOTION_RATE_LIMIT,
+    NOTION_RATE_SHARED,
+    NOTION_TOKEN,
+    SCHEMA_CACHE_TTL,
+)
+import capture_store
+import metrics
+import page_index
+from ratelimit import TokenBucket
+from schema import COMPILED_SCHEMA, INTENT_SCHEMA
+
+SCHEMA_CACHE_PATH = Path(__file__).parent / "schema_cache.json"
+RATE_LIMIT_STATE_PATH = Path(__file__).parent / "notion_ratelimit.json"
 
 logger = logging.getLogger(__name__)
-notion = Client(auth=NOTION_TOKEN)
+notion = None  # notion_client.Client, created on first use by _client()
+limiter = TokenBucket(
+    NOTION_RATE_LIMIT,
+    capacity=NOTION_RATE_BURST,
+    state_path=RATE_LIMIT_STATE_PATH if NOTION_RATE_SHARED else None,
+)
 
 DB_MAP = {
     intent_type: os.getenv(schema["db_env_key"])
     for intent_type, schema in INTENT_SCHEMA.items()
 }
 
-# ---------- Helpers to format properties ----------
+# ---------- Rate-limited API calls ----------
 
-def title_prop(text):
-    return {"title": [{"text": {"content": text}}]}
+def _call(method, **kwargs):
+    """Every Notion request goes through here so the shared limiter sees it."""
+    wait = limiter.acquire()
+    if wait:
+        metrics.add("ratelimit_wait_ms", round(wait * 1000, 3))
+    return method(**kwargs)
 
-def rich_text_prop(text):
-    return {"rich_text": [{"text": {"content": text}}]}
 
-def select_prop(name):
-    if not name:
-        return None
-    return {"select": {"name": name}}
+async def _call_async(method, **kwargs):
+    """_call() for AsyncClient methods; waits for the same limiter without blocking the loop."""
+    wait = await limiter.acquire_async()
+    if wait:
+        metrics.add("ratelimit_wait_ms", round(wait * 1000, 3))
+    return await method(**kwargs)
 
-def number_prop(val):
-    return {"number": val}
 
-def status_prop(value):
-    return {"status": {"name": value}} if value else None
+_client_lock = threading.Lock()
+_async_clients = weakref.WeakKeyDictionary()
+_async_sessions = weakref.WeakKeyDictionary()  # loop -> open async_session() scopes
 
-def multi_select_prop(values):
-    if not values:
-        return None
-    if isinstance(values, str):
-        values = [values]
-    return {
-        "multi_select": [{"name": v} for v in values]
-    }
 
+def _client():
+    """The shared Client. notion_client (and httpx) are only imported once a request is made."""
+    global notion
+    if notion is None:
+        with _client_lock:
+            if notion is None:
+                from notion_client import Client
 
-def date_prop(date_str):
-    if not date_str:
-        return None
-    return {"date": {"start": date_str}}
+                notion = Client(auth=NOTION_TOKEN)
+    return notion
+
+
+def _async_client():
+    """The AsyncClient for the running event loop (its connection pool is tied to one loop)."""
+    from notion_client import AsyncClient
+
+    loop = asyncio.get_running_loop()
+    client = _async_clients.get(loop)
+    if client is None:
+        client = _async_clients[loop] = AsyncClient(auth=NOTION_TOKEN)
+    return client
 
 
+@asynccontextmanager
+async def async_session():
+    """
+    Scope for write_to_notion_async() calls: they share the running loop's
+    AsyncClient, which is closed when the last open scope on that loop exits.
+    """
+    loop = asyncio.get_running_loop()
+    _async_sessions[loop] = _async_sessions.get(loop, 0) + 1
+    try:
+        yield
+    finally:
+        _async_sessions[loop] -= 1
+        if not _async_sessions[loop]:
+            del _async_sessions[loop]
+            client = _async_clients.pop(loop, None)
+            if client is not None:
+                await client.aclose()
+
 
 # ---------- Retry wrapper ----------
 
 _MAX_ATTEMPTS = 3
 _BACKOFF_BASE  = 2   # seconds
 
+def _retry_wait(exc, attempt):
+    """Seconds to wait before retrying after *exc*, or None if it should be raised."""
+    status = exc.status
+    if not (status == 429 or 500 <= status < 600):
+        return None
+    metrics.add("http_429" if status == 429 else "http_5xx")
+    if attempt == _MAX_ATTEMPTS:
+        logger.error(
+            "Notion API error %s after %d attempts — giving up",
+            status, _MAX_ATTEMPTS,
+        )
+        return None
+    retry_after = getattr(exc, "headers", {}).get("Retry-After")
+    wait = float(retry_after) if retry_after else (
+        _BACKOFF_BASE ** attempt + random.uniform(0, 1)
+    )
+    logger.warning(
+        "Notion API %s on attempt %d/%d — retrying in %.1fs",
+        status, attempt, _MAX_ATTEMPTS, wait,
+    )
+    metrics.add("retry_wait_ms", round(wait * 1000, 3))
+    return wait
+
+
 def _create_page_with_retry(parent, properties):
+    from notion_client.errors import APIResponseError
+
     for attempt in range(1, _MAX_ATTEMPTS + 1):
+        metrics.current().set(attempts=attempt)
         try:
-            return notion.pages.create(parent=parent, properties=properties)
+            return _call(_client().pages.create, parent=parent, properties=properties)
         except APIResponseError as exc:
-            status = exc.status
-            if status == 429 or (500 <= status < 600):
-                if attempt == _MAX_ATTEMPTS:
-                    logger.error(
-                        "Notion API error %s after %d attempts — giving up",
-                        status, _MAX_ATTEMPTS,
-                    )
-                    raise
-                retry_after = getattr(exc, "headers", {}).get("Retry-After")
-                wait = float(retry_after) if retry_after else (
-                    _BACKOFF_BASE ** attempt + random.uniform(0, 1)
-                )
-                logger.warning(
-                    "Notion API %s on attempt %d/%d — retrying in %.1fs",
-                    status, attempt, _MAX_ATTEMPTS, wait,
-                )
-                time.sleep(wait)
-            else:
+            wait = _retry_wait(exc, attempt)
+            if wait is None:
                 raise
+            time.sleep(wait)
+
+
+async def _create_page_with_retry_async(parent, properties):
+    from notion_client.errors import APIResponseError
+
+    client = _async_client()
+    for attempt in range(1, _MAX_ATTEMPTS + 1):
+        metrics.current().set(attempts=attempt)
+        try:
+            return await _call_async(client.pages.create, parent=parent, properties=properties)
+        except APIResponseError as exc:
+            wait = _retry_wait(exc, attempt)
+            if wait is None:
+                raise
+            await asyncio.sleep(wait)
+
+
+# ---------- Schema validation (cached on disk) ----------
+
+def _schema_fingerprint(intent_type):
+    """Stable hash of one INTENT_SCHEMA entry — any edit to it invalidates the cache."""
+    blob = json.dumps(INTENT_SCHEMA[intent_type], sort_keys=True, default=sorted)
+    return hashlib.sha256(blob.encode("utf-8")).hexdigest()[:16]
+
+
+def _load_schema_cache():
+    try:
+        return json.loads(SCHEMA_CACHE_PATH.read_text(encoding="utf-8"))
+    except FileNotFoundError:
+        return {}
+    except Exception as e:
+        logger.warning("Ignoring unreadable schema cache: %s", e)
+        return {}
+
+
+def _save_schema_cache(cache):
+    tmp = SCHEMA_CACHE_PATH.with_suffix(".tmp")
+    try:
+        tmp.write_text(json.dumps(cache, indent=2), encoding="utf-8")
+        os.replace(tmp, SCHEMA_CACHE_PATH)
+    except Exception as e:
+        logger.error("Error saving schema cache: %s", e)
+
+
+def _check_db_schema(intent_type, schema, db_id):
+    """Retrieve one DB and return True if it has every property we write to."""
+    db = _call(_client().databases.retrieve, database_id=db_id)
+    actual_props = set(db["properties"].keys()) if "properties" in db else set()
+    if not actual_props and db.get("data_sources"):
+        ds_id = db["data_sources"][0]["id"]
+        ds = _call(_client().data_sources.retrieve, data_source_id=ds_id)
+        actual_props = set(ds.get("properties", {}).keys())
+
+    expected_props = set(schema["properties"].keys()) | {schema["title_field"]}
+    missing = expected_props - actual_props
+    if missing:
+        logger.error(
+            "Notion %s DB is missing properties: %s — writes may fail",
+            intent_type, missing,
+        )
+        return False
+    logger.info("Notion %s DB schema OK", intent_type)
+    return True
 
 
-def _write_to_dead_letter(item, raw_input):
-    entry = {
-        "item": item,
-        "raw_input": raw_input,
-        "failed_at": datetime.now(timezone.utc).isoformat(),
-    }
-    with DEAD_LETTER_PATH.open("a", encoding="utf-8") as f:
-        f.write(json.dumps(entry) + "\n")
-    logger.warning('Dead-lettered %s "%s"', item["type"], item["title"])
+@metrics.timed("notion.validate_schemas")
+def validate_notion_schemas(revalidate=False):
+    """
+    Check each configured DB has the properties INTENT_SCHEMA writes to.
 
+    Successful checks are cached in schema_cache.json keyed by database ID,
+    together with a fingerprint of the intent's schema. A DB is only
+    re-checked when its ID or schema changes, the entry is older than
+    SCHEMA_CACHE_TTL, or *revalidate* is set. Failed checks are never cached.
+    """
+    cache = _load_schema_cache()
+    dirty = False
+    now = time.time()
 
-def validate_notion_schemas():
     for intent_type, schema in INTENT_SCHEMA.items():
         db_id = DB_MAP.get(intent_type)
         if not db_id:
             logger.warning("Schema check skipped — no DB configured for %s", intent_type)
             continue
+
+        fingerprint = _schema_fingerprint(intent_type)
+        entry = cache.get(db_id)
+        if (
+            not revalidate
+            and entry
+            and entry.get("fingerprint") == fingerprint
+            and now - entry.get("checked_at", 0) < SCHEMA_CACHE_TTL
+        ):
+            logger.debug("Notion %s DB schema OK (cached)", intent_type)
+            continue
+
         try:
-            db = notion.databases.retrieve(database_id=db_id)
-            actual_props = set(db["properties"].keys()) if "properties" in db else set()
-            if not actual_props and db.get("data_sources"):
-                ds_id = db["data_sources"][0]["id"]
-                ds = notion.data_sources.retrieve(data_source_id=ds_id)
-                actual_props = set(ds.get("properties", {}).keys())
-
-            expected_props = set(schema["properties"].keys()) | {schema["title_field"]}
-            missing = expected_props - actual_props
-            if missing:
-                logger.error(
-                    "Notion %s DB is missing properties: %s — writes may fail",
-                    intent_type, missing,
-                )
-            else:
-                logger.info("Notion %s DB schema OK", intent_type)
+            ok = _check_db_schema(intent_type, schema, db_id)
         except Exception as e:
             logger.error("Could not validate Notion %s DB: %s", intent_type, e)
+            ok = False
+
+        if ok:
+            cache[db_id] = {"intent_type": intent_type, "fingerprint": fingerprint, "checked_at": now}
+            dirty = True
+        elif cache.pop(db_id, None) is not None:
+            dirty = True
+
+    if dirty:
+        _save_schema_cache(cache)
+
+
+# ---------- Query ----------
+
+def _data_source_id(db_id):
+    """Databases are queried through their (first) data source."""
+    db = _call(_client().databases.retrieve, database_id=db_id)
+    return db["data_sources"][0]["id"]
+
+
+def iter_pages(db_id, filter=None, sorts=None, page_size=100):
+    """
+    Yield every page of a database matching *filter*, one result page of
+    *page_size* at a time, so callers can process pages while later ones
+    are still being fetched and never hold the whole database in memory.
+    """
+    data_source_id = _data_source_id(db_id)
+    kwargs = {"data_source_id": data_source_id, "page_size": page_size}
+    if filter:
+        kwargs["filter"] = filter
+    if sorts:
+        kwargs["sorts"] = sorts
+    cursor = None
+    while True:
+        result = _call(_client().data_sources.query, **kwargs, **({"start_cursor": cursor} if cursor else {}))
+        yield from result.get("results", [])
+        cursor = result.get("next_cursor")
+        if not result.get("has_more") or not cursor:
+            return
+
+
+def page_title(page, title_field):
+    """Plain text of a page's title property."""
+    prop = page.get("properties", {}).get(title_field, {})
+    return "".join(part.get("plain_text", "") for part in prop.get("title", []))
 
 
 # ---------- Write a routed item to Notion ----------
 
-def write_to_notion(item, raw_input):
+def _page_request(item, raw_input):
+    """The database ID and properties to create *item* with, or None if its DB isn't configured."""
     item_type = item["type"]
     if item_type not in DB_MAP:
         raise Exception(f"Unsupported type: {item_type}")
@@ -138,50 +303,84 @@ def write_to_notion(item, raw_input):
     db_id = DB_MAP[item_type]
     if not db_id:
         logger.warning('%s not written (DB not configured): "%s"', item_type, item["title"])
-        return
+        capture_store.store.item_skipped(item)
+        return None
+    return db_id, build_properties(item_type, item, raw_input)
 
-    props = build_properties(item_type, item, raw_input)
 
-    try:
-        _create_page_with_retry(
-            parent={"database_id": db_id},
-            properties=props,
-        )
-        logger.info('Notion write OK: %s "%s"', item_type, item["title"])
-    except Exception:
-        _write_to_dead_letter(item, raw_input)
+def _skip_duplicate(item, page_id, span):
+    """
+    Record *item* as written to the page an earlier capture of it created.
+    Returns that page's ID as a page_index.Duplicate.
+    """
+    span.set(duplicate=1)
+    logger.info('Duplicate of page %s within the dedup window, not written: %s "%s"',
+                page_id, item["type"], item["title"])
+    capture_store.store.item_written(item, page_id)
+    return page_index.Duplicate(page_id)
 
-def build_properties(item_type, item, raw_input):
-    schema = INTENT_SCHEMA[item_type]
-    fields = item.get("structured_fields", {})
-    props = {schema["title_field"]: title_prop(item["title"])}
-
-    for prop_name, spec in schema["properties"].items():
-        prop_type = spec["type"]
-
-        if "default" in spec:
-            value = spec["default"]
-        elif "field" in spec:
-            value = fields.get(spec["field"])
-        elif spec.get("source") == "raw_input":
-            value = raw_input
-        else:
-            continue
 
-        if value is None:
-            continue
+def write_to_notion(item, raw_input):
+    """Create a page for *item*. Returns the new page ID, or None if it was not written."""
+    request = _page_request(item, raw_input)
+    if request is None:
+        return None
+    db_id, props = request
 
-        if prop_type == "status":
-            props[prop_name] = {"status": {"name": value}}
-        elif prop_type == "select":
-            props[prop_name] = select_prop(value)
-        elif prop_type == "multi_select":
-            props[prop_name] = multi_select_prop(value)
-        elif prop_type == "date":
-            props[prop_name] = date_prop(value)
-        elif prop_type == "rich_text":
-            props[prop_name] = rich_text_prop(value)
-
-    return props
+    with metrics.span("notion.write", type=item["type"]) as span:
+        duplicate, reservation = page_index.index.claim(item["type"], item["title"])
+        if duplicate:
+            return _skip_duplicate(item, duplicate, span)
+        try:
+            page = _create_page_with_retry(
+                parent={"database_id": db_id},
+                properties=props,
+            )
+            logger.info('Notion write OK: %s "%s"', item["type"], item["title"])
+        except Exception as e:
+            page_index.index.release(reservation)
+            span.set(dead_lettered=1)
+            capture_store.store.dead_letter(item, raw_input, error=f"{type(e).__name__}: {e}")
+            return None
+        page_index.index.confirm(reservation, page["id"])
+        capture_store.store.item_written(item, page["id"])
+        return page["id"]
+
+
+async def write_to_notion_async(item, raw_input):
+    """
+    write_to_notion() on the async client: same properties, retries and
+    dead-lettering. The page index and capture store are SQLite, so their
+    calls run on worker threads rather than on the loop.
+    """
+    request = await asyncio.to_thread(_page_request, item, raw_input)
+    if request is None:
+        return None
+    db_id, props = request
+
+    with metrics.span("notion.write", type=item["type"]) as span:
+        duplicate, reservation = await asyncio.to_thread(page_index.index.claim, item["type"], item["title"])
+        if duplicate:
+            return await asyncio.to_thread(_skip_duplicate, item, duplicate, span)
+        try:
+            page = await _create_page_with_retry_async(
+                parent={"database_id": db_id},
+                properties=props,
+            )
+            logger.info('Notion write OK: %s "%s"', item["type"], item["title"])
+        except Exception as e:
+            await asyncio.to_thread(page_index.index.release, reservation)
+            span.set(dead_lettered=1)
+            await asyncio.to_thread(
+                capture_store.store.dead_letter, item, raw_input, error=f"{type(e).__name__}: {e}",
+            )
+            return None
+        await asyncio.to_thread(page_index.index.confirm, reservation, page["id"])
+        await asyncio.to_thread(capture_store.store.item_written, item, page["id"])
+        return page["id"]
+
+def build_properties(item_type, item, raw_input):
+    """Notion page properties for *item*, from its type's compiled builder (see schema.py)."""
+    return COMPILED_SCHEMA[item_type].build_properties(item, raw_input)
 
 
@@ -0,0 +1,241 @@
+#!/usr/bin/env python3
+"""
+Local index of the Notion pages Triage has created, for duplicate suppression.
+
+Every page written is recorded under its intent type and normalized title
+("Buy  milk!" and "buy milk" are the same key). Before a write, notion.py
+looks the item up here — no Notion query — and if a page with the same
+type and title was created within TRIAGE_DEDUP_WINDOW seconds, that page
+is reused instead of creating another.
+
+Lookup and write are tied together by a reservation: claim() checks for a
+duplicate and, finding none, inserts a pending row in the same
+transaction, so two captures of the same thing (in one process or
+several) can't both create it — the second waits for the first to
+confirm() its page ID or release() the row after a failed write. A
+reservation left by a writer that crashed lapses after RESERVATION_TTL
+seconds.
+
+Usage:
+    python page_index.py                   # pages indexed per type
+    python page_index.py --rebuild         # re-read the dedup window's pages from Notion
+    python page_index.py --rebuild --days 30
+"""
+import argparse
+import logging
+import re
+import sqlite3
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from pathlib import Path
+
+from config import DEDUP_WINDOW
+
+logger = logging.getLogger(__name__)
+
+INDEX_PATH = Path(__file__).parent / "pages.sqlite3"
+RESERVATION_TTL = 60  # seconds; well beyond a write with all its retries
+
+
+class Duplicate(str):
+    """
+    The page ID returned for an item that was not written because that
+    page already holds it, so callers can report it apart from a new page.
+    """
+
+
+def normalize_title(title: str) -> str:
+    """Case-, whitespace- and edge-punctuation-insensitive form of a title."""
+    return " ".join(re.sub(r"^\W+|\W+$", "", title.casefold()).split())
+
+
+class PageIndex:
+    """
+    SQLite (WAL) index of created pages: (type, normalized title) -> page ID.
+
+    *window* is the dedup window in seconds; 0 turns suppression off while
+    still recording pages. Index errors are logged and never block a write
+    — at worst a duplicate gets through.
+    """
+
+    def __init__(self, path: Path = INDEX_PATH, window: float = DEDUP_WINDOW,
+                 clock=time.time, sleep=time.sleep, poll: float = 0.2):
+        self.path = Path(path)
+        self.window = window
+        self._clock = clock
+        self._sleep = sleep
+        self._poll = poll
+        self._lock = threading.Lock()
+        self._conn = None
+
+    def _connect(self):
+        if self._conn is None:
+            conn = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS pages ("
+                " id INTEGER PRIMARY KEY,"
+                " type TEXT NOT NULL,"
+                " title_key TEXT NOT NULL,"
+                " title TEXT NOT NULL,"
+                " page_id TEXT UNIQUE,"          # NULL while reserved
+                " created_at REAL NOT NULL,"
+                " reserved_until REAL)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS pages_key ON pages(type, title_key, created_at)")
+            conn.execute("CREATE INDEX IF NOT EXISTS pages_created ON pages(created_at)")
+            self._conn = conn
+        return self._conn
+
+    @contextmanager
+    def _transaction(self):
+        with self._lock:
+            conn = self._connect()
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                yield conn
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+            conn.execute("COMMIT")
+
+    def claim(self, item_type: str, title: str) -> tuple[str | None, int | None]:
+        """
+        (page ID, None) if *title* was already created within the window,
+        else (None, reservation) — create the page, then confirm() or
+        release() the reservation. Waits while another writer holds a
+        reservation for the same title.
+        """
+        key = normalize_title(title)
+        try:
+            while True:
+                with self._transaction() as conn:
+                    now = self._clock()
+                    row = None
+                    if self.window > 0:
+                        row = conn.execute(
+                            "SELECT page_id FROM pages WHERE type = ? AND title_key = ? AND created_at >= ?"
+                            " AND (page_id IS NOT NULL OR reserved_until > ?)"
+                            " ORDER BY page_id IS NULL, created_at DESC LIMIT 1",
+                            (item_type, key, now - self.window, now),
+                        ).fetchone()
+                    if row is None:
+                        reservation = conn.execute(
+                            "INSERT INTO pages (type, title_key, title, created_at, reserved_until)"
+                            " VALUES (?, ?, ?, ?, ?)",
+                            (item_type, key, title, now, now + RESERVATION_TTL),
+                        ).lastrowid
+                        return None, reservation
+                    if row[0] is not None:
+                        return row[0], None
+                # Same title being written right now: wait for its outcome
+                self._sleep(self._poll)
+        except sqlite3.Error as e:
+            logger.warning("Page index lookup failed, writing without dedup: %s", e)
+            return None, None
+
+    def confirm(self, reservation: int | None, page_id: str) -> None:
+        """Record the page created for *reservation*."""
+        if reservation is None:
+            return
+        try:
+            with self._transaction() as conn:
+                now = self._clock()
+                conn.execute(
+                    "UPDATE pages SET page_id = ?, created_at = ?, reserved_until = NULL WHERE id = ?",
+                    (page_id, now, reservation),
+                )
+                # Keep the table to the window, and drop reservations left by crashed writers
+                conn.execute("DELETE FROM pages WHERE page_id IS NULL AND reserved_until < ?", (now,))
+                if self.window > 0:
+                    conn.execute(
+                        "DELETE FROM pages WHERE created_at < ? AND page_id IS NOT NULL", (now - self.window,)
+                    )
+        except sqlite3.Error as e:
+            logger.warning("Could not index page %s: %s", page_id, e)
+
+    def release(self, reservation: int | None) -> None:
+        """Drop a reservation whose write failed."""
+        if reservation is None:
+            return
+        try:
+            with self._transaction() as conn:
+                conn.execute("DELETE FROM pages WHERE id = ? AND page_id IS NULL", (reservation,))
+        except sqlite3.Error as e:
+            logger.warning("Could not release page reservation %s: %s", reservation, e)
+
+    def rebuild(self, pages) -> int:
+        """
+        Replace the indexed pages with *pages*, an iterable of
+        (type, title, page_id, created_at) — e.g. from pages_from_notion().
+        Reservations in flight are kept. Returns the number indexed.
+        """
+        pages = list(pages)  # fetch first: writers mustn't wait on Notion for the index lock
+        count = 0
+        with self._transaction() as conn:
+            conn.execute("DELETE FROM pages WHERE page_id IS NOT NULL")
+            for item_type, title, page_id, created_at in pages:
+                conn.execute(
+                    "INSERT OR IGNORE INTO pages (type, title_key, title, page_id, created_at)"
+                    " VALUES (?, ?, ?, ?, ?)",
+                    (item_type, normalize_title(title), title, page_id, created_at),
+                )
+                count += 1
+        return count
+
+    def counts(self) -> dict[str, int]:
+        with self._lock:
+            rows = self._connect().execute(
+                "SELECT type, COUNT(*) FROM pages WHERE page_id IS NOT NULL GROUP BY type"
+            ).fetchall()
+        return dict(rows)
+
+    def close(self) -> None:
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+
+def pages_from_notion(since: float):
+    """(type, title, page_id, created_at) for every page created since *since*, streamed from Notion."""
+    import notion
+    from schema import INTENT_SCHEMA
+
+    on_or_after = datetime.fromtimestamp(since, timezone.utc).isoformat()
+    for intent_type, db_id in notion.DB_MAP.items():
+        if not db_id:
+            continue
+        title_field = INTENT_SCHEMA[intent_type]["title_field"]
+        query = {"timestamp": "created_time", "created_time": {"on_or_after": on_or_after}}
+        for page in notion.iter_pages(db_id, filter=query):
+            if page.get("in_trash") or page.get("archived"):
+                continue
+            created_at = datetime.fromisoformat(page["created_time"].replace("Z", "+00:00")).timestamp()
+            yield intent_type, notion.page_title(page, title_field), page["id"], created_at
+
+
+index = PageIndex()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Inspect or rebuild the created-pages index")
+    parser.add_argument("--path", type=Path, default=INDEX_PATH)
+    parser.add_argument("--rebuild", action="store_true", help="Re-read recently created pages from Notion")
+    parser.add_argument("--days", type=float, help="How far back --rebuild reads (default: the dedup window)")
+    args = parser.parse_args()
+
+    idx = PageIndex(args.path)
+    if args.rebuild:
+        span = args.days * 86400 if args.days is not None else DEDUP_WINDOW
+        if span <= 0:
+            print("Dedup is off (TRIAGE_DEDUP_WINDOW=0); pass --days to rebuild anyway.", file=sys.stderr)
+            sys.exit(1)
+        n = idx.rebuild(pages_from_notion(time.time() - span))
+        print(f"Indexed {n} page(s) created in the last {span / 86400:g} day(s)")
+    for item_type, count in sorted(idx.counts().items()):
+        print(f"{item_type:<10} {count}")
@@ -0,0 +1,253 @@
+"""
+Local fast path in front of the LLM splitter.
+
+Stages run in order and the first confident prediction wins:
+
+  1. RuleClassifier        — empty/punctuation-only input and bare greetings
+  2. NaiveBayesClassifier  — bag-of-words model trained at startup from
+                             evaluation/cases.json and feedback.jsonl
+
+Only two outcomes short-circuit the LLM: a no-op ({"intents": []}) and a
+short, single, unqualified Task whose first word the training data has seen
+as a Task verb. Anything carrying dates, priorities or conjunctions always
+goes to the model. A small sample of confident predictions is still sent to
+the LLM so disagreement can be measured.
+"""
+import json
+import logging
+import math
+import os
+import random
+import re
+import threading
+from collections import Counter, defaultdict
+from dataclasses import dataclass
+from pathlib import Path
+
+import feedback
+from schema import intent_item_schema
+
+logger = logging.getLogger(__name__)
+
+CASES_PATH = Path(__file__).parent / "evaluation" / "cases.json"
+
+NOOP, TASK, OTHER = "noop", "task", "other"
+
+_TOKEN_RE = re.compile(r"[a-z0-9']+")
+
+_GREETINGS = {
+    "hi", "hii", "hey", "hello", "yo", "sup", "hola", "lol", "lmao", "haha",
+    "ok", "okay", "k", "thanks", "thank you", "thx", "cute", "nice", "cool",
+    "test", "testing", "good morning", "good night", "gm", "gn",
+}
+
+# Anything that can fill a structured field or signal multiple intents
+_QUALIFIERS = {
+    "and", "also", "then", "plus", "idea", "project", "maybe", "what", "if",
+    "today", "tonight", "tomorrow", "tomorow", "tomorror", "weekend", "week",
+    "month", "by", "before", "after", "until", "due", "deadline", "eod",
+    "asap", "urgent", "urgently", "critical", "priority", "important",
+    "monday", "tuesday", "wednesday", "thursday", "friday", "saturday", "sunday",
+    "remind", "weekly", "monthly",
+}
+# First words that open Task inputs without being the action themselves
+_NOT_VERBS = {"i", "im", "i'm", "we", "my", "the", "a", "an", "to", "try", "go", "please"}
+_MAX_TASK_WORDS = 6
+_MAX_NOOP_WORDS = 4  # longer inputs almost always carry something worth asking the LLM about
+
+
+def _tokens(text: str) -> list[str]:
+    return _TOKEN_RE.findall(text.casefold())
+
+
+def _features(text: str) -> list[str]:
+    toks = _tokens(text)
+    feats = list(toks)
+    feats += [f"{a}_{b}" for a, b in zip(toks, toks[1:])]
+    feats.append(f"__len{min(len(toks), 8)}")
+    if toks:
+        feats.append(f"__first_{toks[0]}")
+    return feats
+
+
+def _label_for(intents: list) -> str:
+    """Map an expected/corrected intents list onto the fast-path label space."""
+    if not intents:
+        return NOOP
+    if len(intents) == 1:
+        spec = intents[0]
+        types = spec.get("type_options") or [spec.get("type")]
+        if set(types) == {"Task"}:
+            return TASK
+    return OTHER
+
+
+def _task_intent(text: str) -> dict:
+    """
+    A Task shaped like the model's: the response schema requires every
+    structured field of every type, so each one is present and null.
+    """
+    title = text.strip().rstrip(".!?")
+    intent = dict.fromkeys(intent_item_schema()["required"])
+    return intent | {"type": "Task", "title": title[:1].upper() + title[1:]}
+
+
+@dataclass(frozen=True)
+class Prediction:
+    label: str
+    confidence: float
+    stage: str
+    intents: list
+    verify: bool = False  # also ask the LLM and record whether it agrees
+
+
+class RuleClassifier:
+    name = "rules"
+
+    def predict(self, text: str) -> Prediction | None:
+        toks = _tokens(text)
+        if not toks:
+            return Prediction(NOOP, 1.0, self.name, [])
+        if " ".join(toks) in _GREETINGS:
+            return Prediction(NOOP, 0.99, self.name, [])
+        return None
+
+
+class NaiveBayesClassifier:
+    """Multinomial naive Bayes over unigrams, bigrams and a few shape features."""
+
+    name = "naive_bayes"
+
+    def __init__(self, examples: list[tuple[str, str]]):
+        self.doc_counts = Counter(label for _, label in examples)
+        self.feature_counts = defaultdict(Counter)
+        self.task_verbs = set()
+        for text, label in examples:
+            self.feature_counts[label].update(_features(text))
+            toks = _tokens(text)
+            if label == TASK and toks and toks[0] not in _NOT_VERBS:
+                self.task_verbs.add(toks[0])
+        self.totals = {label: sum(c.values()) for label, c in self.feature_counts.items()}
+        self.vocab_size = len({f for c in self.feature_counts.values() for f in c}) or 1
+        self.n_docs = sum(self.doc_counts.values())
+
+    @classmethod
+    def from_files(cls, cases_path: Path = CASES_PATH) -> "NaiveBayesClassifier":
+        examples = []
+        try:
+            cases = json.loads(Path(cases_path).read_text(encoding="utf-8"))["cases"]
+            examples += [(c["input"], _label_for(c["expected"])) for c in cases]
+        except (OSError, ValueError, KeyError) as e:
+            logger.warning("Pre-classifier could not load %s: %s", cases_path, e)
+        for entry in feedback.get_feedback_entries():
+            if entry.get("corrected_intents") is not None and entry.get("raw_input"):
+                examples.append((entry["raw_input"], _label_for(entry["corrected_intents"])))
+        return cls(examples)
+
+    def probabilities(self, text: str) -> dict[str, float]:
+        if not self.n_docs:
+            return {}
+        feats = _features(text)
+        log_scores = {}
+        for label, docs in self.doc_counts.items():
+            counts, total = self.feature_counts[label], self.totals[label]
+            score = math.log(docs / self.n_docs)
+            for f in feats:
+                score += math.log((counts[f] + 1) / (total + self.vocab_size))
+            log_scores[label] = score
+        peak = max(log_scores.values())
+        exp = {label: math.exp(s - peak) for label, s in log_scores.items()}
+        norm = sum(exp.values())
+        return {label: v / norm for label, v in exp.items()}
+
+    def predict(self, text: str) -> Prediction | None:
+        probs = self.probabilities(text)
+        if not probs:
+            return None
+        label = max(probs, key=probs.get)
+        if label == NOOP and len(_tokens(text)) <= _MAX_NOOP_WORDS:
+            return Prediction(NOOP, probs[label], self.name, [])
+        if label == TASK and self._is_simple_task(text):
+            return Prediction(TASK, probs[label], self.name, [_task_intent(text)])
+        return None
+
+    def _is_simple_task(self, text: str) -> bool:
+        toks = _tokens(text)
+        return (
+            0 < len(toks) <= _MAX_TASK_WORDS
+            and toks[0] in self.task_verbs
+            and not _QUALIFIERS.intersection(toks)
+            and not any(t.isdigit() for t in toks)
+            and not any(c in text for c in ",;:&+")
+        )
+
+
+class PreClassifier:
+    """
+    Runs the stages and keeps counters: how often each stage fired, and —
+    for the sampled predictions that were also sent to the LLM — how often
+    the LLM disagreed.
+    """
+
+    def __init__(self, stages=None, threshold: float = 0.8, verify_rate: float = 0.05):
+        self._stages = stages
+        self.threshold = threshold
+        self.verify_rate = verify_rate
+        self._lock = threading.Lock()
+        self._trained = None
+        self._feedback_key = None
+        self._counts = Counter()
+
+    def _get_stages(self):
+        if self._stages is not None:
+            return self._stages
+        # Retrain when feedback.jsonl changes so new corrections are picked up
+        try:
+            st = os.stat(feedback.FEEDBACK_LOG_PATH)
+            key = (str(feedback.FEEDBACK_LOG_PATH), st.st_mtime_ns, st.st_size)
+        except FileNotFoundError:
+            key = (str(feedback.FEEDBACK_LOG_PATH), None)
+        if key != self._feedback_key or self._trained is None:
+            self._trained = [RuleClassifier(), NaiveBayesClassifier.from_files()]
+            self._feedback_key = key
+        return self._trained
+
+    def classify(self, text: str) -> Prediction | None:
+        """Return a confident Prediction, or None if the LLM should decide."""
+        with self._lock:
+            self._counts["calls"] += 1
+            for stage in self._get_stages():
+                pred = stage.predict(text)
+                if pred is None or pred.confidence < self.threshold:
+                    continue
+                verify = random.random() < self.verify_rate
+                self._counts[f"fired.{pred.stage}.{pred.label}"] += 1
+                if verify:
+                    self._counts["verified"] += 1
+                logger.info(
+                    "Pre-classifier %s: %s (%.2f)%s", pred.stage, pred.label,
+                    pred.confidence, " — verifying with LLM" if verify else "",
+                )
+                return Prediction(pred.label, pred.confidence, pred.stage, pred.intents, verify)
+            return None
+
+    def record_llm_result(self, pred: Prediction, llm_intents: list) -> bool:
+        """Compare a verified prediction against the LLM. Returns True if they agree."""
+        agrees = _label_for(llm_intents) == pred.label
+        with self._lock:
+            self._counts["agreed" if agrees else "disagreed"] += 1
+        if not agrees:
+            logger.warning(
+                "Pre-classifier %s said %s but LLM returned %d intent(s)",
+                pred.stage, pred.label, len(llm_intents),
+            )
+        return agrees
+
+    def stats(self) -> dict:
+        with self._lock:
+            counts = dict(self._counts)
+        fired = sum(v for k, v in counts.items() if k.startswith("fired."))
+        checked = counts.get("agreed", 0) + counts.get("disagreed", 0)
+        counts["fire_rate"] = round(fired / counts["calls"], 4) if counts.get("calls") else 0.0
+        counts["disagreement_rate"] = round(counts.get("disagreed", 0) / checked, 4) if checked else None
+        return counts
@@ -0,0 +1,95 @@
+import hashlib
+import logging
+import os
+import threading
+from dataclasses import dataclass
+from pathlib import Path
+
+import feedback
+
+logger = logging.getLogger(__name__)
+
+PROMPT_PATH = Path(__file__).parent / "splitter_prompt.txt"
+
+
+@dataclass(frozen=True)
+class AssembledPrompt:
+    """The splitter system prompt as sent to the model, plus a digest to key caches on."""
+    text: str
+    base: str
+    few_shot: str
+    digest: str
+    base_digest: str
+    few_shot_digest: str
+
+    @classmethod
+    def build(cls, base: str, few_shot: str) -> "AssembledPrompt":
+        text = base + "\n" + few_shot if few_shot else base
+        return cls(
+            text=text,
+            base=base,
+            few_shot=few_shot,
+            digest=_sha256(text),
+            base_digest=_sha256(base),
+            few_shot_digest=_sha256(few_shot),
+        )
+
+
+def _sha256(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+def _file_key(path: Path):
+    """Cheap change detector: one stat() instead of reading the file."""
+    try:
+        st = os.stat(path)
+    except FileNotFoundError:
+        return (str(path), None)
+    return (str(path), st.st_mtime_ns, st.st_size)
+
+
+class PromptAssembler:
+    """
+    Builds the splitter system prompt once and reuses it until an input changes.
+
+    The base prompt is re-read only when splitter_prompt.txt's mtime or size
+    changes. The few-shot block holds the feedback corrections most similar
+    to *query* (see feedback.FeedbackIndex), or the most recent ones without
+    a query; it is looked up again only when the query or feedback.jsonl
+    changes. A steady-state call costs two stat() calls and, per new query,
+    one index lookup instead of a full JSONL parse.
+    """
+
+    def __init__(self, prompt_path: Path = PROMPT_PATH, few_shot_limit: int = 5):
+        self.prompt_path = Path(prompt_path)
+        self.few_shot_limit = few_shot_limit
+        self._lock = threading.Lock()
+        self._base = (None, "")
+        self._few_shot = (None, "")
+        self._assembled = (None, None)
+
+    def _load_base(self):
+        key = _file_key(self.prompt_path)
+        if key != self._base[0]:
+            self._base = (key, self.prompt_path.read_text(encoding="utf-8"))
+            logger.debug("Loaded splitter prompt from %s", self.prompt_path)
+        return self._base
+
+    def _load_few_shot(self, query):
+        key = (_file_key(feedback.FEEDBACK_LOG_PATH), self.few_shot_limit, query)
+        if key != self._few_shot[0]:
+            self._few_shot = (key, feedback.get_few_shot_prompt(limit=self.few_shot_limit, query=query))
+        return self._few_shot
+
+    def get(self, include_few_shot: bool = True, query: str | None = None) -> AssembledPrompt:
+        with self._lock:
+            base_key, base = self._load_base()
+            few_shot = self._load_few_shot(query)[1] if include_few_shot else ""
+            # Keyed on the block itself: inputs that retrieve the same examples share one prompt
+            key = (base_key, few_shot)
+            if key != self._assembled[0]:
+                self._assembled = (key, AssembledPrompt.build(base, few_shot))
+            return self._assembled[1]
+
+
+assembler = PromptAssembler()
@@ -0,0 +1,138 @@
+import asyncio
+import json
+import logging
+import os
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+
+logger = logging.getLogger(__name__)
+
+
+@contextmanager
+def file_lock(path: Path):
+    """Exclusive OS-level lock on *path*, held for the duration of the block."""
+    with open(path, "a+b") as f:
+        if os.name == "nt":
+            import msvcrt
+            f.seek(0)
+            msvcrt.locking(f.fileno(), msvcrt.LK_LOCK, 1)
+            try:
+                yield
+            finally:
+                f.seek(0)
+                msvcrt.locking(f.fileno(), msvcrt.LK_UNLCK, 1)
+        else:
+            import fcntl
+            fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+
+
+class TokenBucket:
+    """
+    Proactive rate limiter: acquire() blocks until a token is available.
+
+    Tokens refill continuously at *rate* per second up to *capacity* (the
+    allowed burst). Callers reserve a token up front and sleep off any
+    deficit outside the lock, so waiters are served in arrival order.
+
+    With *state_path* set, the bucket state lives in that file and is
+    updated under an OS file lock, so every process using the same path
+    shares one budget.
+    """
+
+    def __init__(self, rate: float, capacity: float | None = None, state_path: Path | None = None,
+                 clock=None, sleep=time.sleep, async_sleep=asyncio.sleep):
+        if rate <= 0:
+            raise ValueError("rate must be positive")
+        self.rate = float(rate)
+        self.capacity = float(capacity if capacity is not None else max(1.0, rate))
+        self.state_path = Path(state_path) if state_path else None
+        # Wall clock when shared: monotonic clocks are not comparable across processes
+        self._clock = clock or (time.time if self.state_path else time.monotonic)
+        self._sleep = sleep
+        self._async_sleep = async_sleep
+        self._lock = threading.Lock()
+        self._tokens = self.capacity
+        self._updated = self._clock()
+
+        self._acquired = 0
+        self._waits = 0
+        self._wait_seconds = 0.0
+        self._max_wait = 0.0
+
+    def _reserve(self, tokens: float) -> float:
+        """Take *tokens* (possibly going negative) and return how long to wait for them."""
+        now = self._clock()
+        elapsed = max(0.0, now - self._updated)
+        self._tokens = min(self.capacity, self._tokens + elapsed * self.rate) - tokens
+        self._updated = now
+        return max(0.0, -self._tokens / self.rate)
+
+    def _reserve_shared(self, tokens: float) -> float:
+        lock_path = self.state_path.with_name(self.state_path.name + ".lock")
+        with file_lock(lock_path):
+            try:
+                state = json.loads(self.state_path.read_text(encoding="utf-8"))
+                self._tokens, self._updated = float(state["tokens"]), float(state["updated"])
+            except (FileNotFoundError, ValueError, KeyError, TypeError):
+                self._tokens, self._updated = self.capacity, self._clock()
+            wait = self._reserve(tokens)
+            self.state_path.write_text(
+                json.dumps({"tokens": self._tokens, "updated": self._updated}),
+                encoding="utf-8",
+            )
+        return wait
+
+    def _take(self, tokens: float) -> float:
+        """Reserve *tokens* and return how long the caller must wait before using them."""
+        with self._lock:
+            if self.state_path:
+                try:
+                    wait = self._reserve_shared(tokens)
+                except OSError as e:
+                    logger.warning("Shared rate-limit state unavailable, limiting per process: %s", e)
+                    wait = self._reserve(tokens)
+            else:
+                wait = self._reserve(tokens)
+
+            self._acquired += 1
+            if wait > 0:
+                self._waits += 1
+                self._wait_seconds += wait
+                self._max_wait = max(self._max_wait, wait)
+        if wait > 0:
+            logger.debug("Rate limiter waiting %.2fs", wait)
+        return wait
+
+    def acquire(self, tokens: float = 1.0) -> float:
+        """Block until *tokens* are available. Returns the seconds spent waiting."""
+        wait = self._take(tokens)
+        if wait > 0:
+            self._sleep(wait)
+        return wait
+
+    async def acquire_async(self, tokens: float = 1.0) -> float:
+        """
+        acquire() for coroutines: waits with asyncio.sleep instead of blocking
+        the loop. A shared bucket is reserved on a worker thread, since that
+        takes a file lock and reads and writes the state file.
+        """
+        wait = await asyncio.to_thread(self._take, tokens) if self.state_path else self._take(tokens)
+        if wait > 0:
+            await self._async_sleep(wait)
+        return wait
+
+    def stats(self) -> dict:
+        """Counters for this process: calls, how many had to wait, and for how long."""
+        with self._lock:
+            return {
+                "acquired": self._acquired,
+                "waited": self._waits,
+                "wait_seconds": round(self._wait_seconds, 4),
+                "max_wait_seconds": round(self._max_wait, 4),
+            }
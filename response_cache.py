@@ -0,0 +1,98 @@
+import hashlib
+import json
+import logging
+import sqlite3
+import threading
+import time
+from pathlib import Path
+
+logger = logging.getLogger(__name__)
+
+CACHE_PATH = Path(__file__).parent / "response_cache.sqlite3"
+
+
+def normalize_input(text: str) -> str:
+    """Case- and whitespace-insensitive form, so "Buy  milk" and "buy milk" share an entry."""
+    return " ".join(text.casefold().split())
+
+
+def make_key(user_input: str, today: str, model: str, prompt_digest: str) -> str:
+    blob = json.dumps([normalize_input(user_input), today, model, prompt_digest])
+    return hashlib.sha256(blob.encode("utf-8")).hexdigest()
+
+
+class ResponseCache:
+    """
+    On-disk LRU cache of split_intents() results.
+
+    Entries are keyed by make_key() — normalized input, TODAY, model name and
+    the assembled prompt's digest — so editing the prompt or logging new
+    feedback never serves a stale answer. Once more than *max_entries* are
+    stored, the least recently used ones are evicted. The database is opened
+    lazily and kept open, so a hit is one indexed SELECT and UPDATE.
+    """
+
+    def __init__(self, path: Path = CACHE_PATH, max_entries: int = 5000):
+        self.path = Path(path)
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._conn = None
+
+    def _connect(self):
+        if self._conn is None:
+            conn = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS responses ("
+                " key TEXT PRIMARY KEY, intents TEXT NOT NULL, last_used REAL NOT NULL)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS responses_last_used ON responses(last_used)")
+            self._conn = conn
+        return self._conn
+
+    def get(self, key: str) -> list | None:
+        with self._lock:
+            try:
+                conn = self._connect()
+                row = conn.execute("SELECT intents FROM responses WHERE key = ?", (key,)).fetchone()
+                if row is None:
+                    return None
+                conn.execute("UPDATE responses SET last_used = ? WHERE key = ?", (time.time(), key))
+                return json.loads(row[0])
+            except (sqlite3.Error, ValueError) as e:
+                logger.warning("Response cache read failed: %s", e)
+                return None
+
+    def put(self, key: str, intents: list) -> None:
+        with self._lock:
+            try:
+                conn = self._connect()
+                # Counted inside the write transaction: other processes share the file
+                conn.execute("BEGIN IMMEDIATE")
+                try:
+                    conn.execute(
+                        "INSERT OR REPLACE INTO responses (key, intents, last_used) VALUES (?, ?, ?)",
+                        (key, json.dumps(intents), time.time()),
+                    )
+                    (count,) = conn.execute("SELECT COUNT(*) FROM responses").fetchone()
+                    if count > self.max_entries:
+                        conn.execute(
+                            "DELETE FROM responses WHERE key IN"
+                            " (SELECT key FROM responses ORDER BY last_used LIMIT ?)",
+                            (count - self.max_entries,),
+                        )
+                except BaseException:
+                    conn.execute("ROLLBACK")
+                    raise
+                conn.execute("COMMIT")
+            except sqlite3.Error as e:
+                logger.warning("Response cache write failed: %s", e)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._connect().execute("DELETE FROM responses")
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._connect().execute("SELECT COUNT(*) FROM responses").fetchone()[0]
@@ -1,4 +1,9 @@
+import logging
 import re
+from dataclasses import dataclass
+from typing import Callable
+
+logger = logging.getLogger(__name__)
 
 INTENT_SCHEMA = {
     "Task": {
@@ -41,3 +46,224 @@ INTENT_SCHEMA = {
         },
     },
 }
+
+
+# ---------- Compiled validators and Notion property builders ----------
+#
+# INTENT_SCHEMA is turned into one validator and one property builder per
+# intent type when this module loads: patterns are compiled, allowed values
+# frozen, and the per-field decisions (which check, which Notion property
+# format, default or model field or raw input) made once instead of on
+# every intent.
+
+def _status(value):
+    return {"status": {"name": value}}
+
+
+def _select(value):
+    return {"select": {"name": value}} if value else None
+
+
+def _multi_select(values):
+    if not values:
+        return None
+    if isinstance(values, str):
+        values = [values]
+    return {"multi_select": [{"name": v} for v in values]}
+
+
+def _date(value):
+    return {"date": {"start": value}} if value else None
+
+
+def _rich_text(value):
+    return {"rich_text": [{"text": {"content": value}}]}
+
+
+_PROPERTY_FORMATS = {
+    "status": _status,
+    "select": _select,
+    "multi_select": _multi_select,
+    "date": _date,
+    "rich_text": _rich_text,
+}
+
+_RAW_INPUT = object()  # property filled from the capture's raw text
+
+
+@dataclass(frozen=True)
+class CompiledIntent:
+    """Precompiled callables for one intent type."""
+    type: str
+    validate: Callable[[dict], dict | None]
+    build_properties: Callable[[dict, str], dict]
+
+
+def _compile_validator(intent_type: str, valid_fields: dict):
+    checks = tuple(
+        (
+            name,
+            frozenset(rules["allowed"]) if "allowed" in rules else None,
+            re.compile(rules["pattern"]).match if "pattern" in rules else None,
+        )
+        for name, rules in valid_fields.items()
+    )
+
+    def validate(intent: dict) -> dict | None:
+        title = (intent.get("title") or "").strip()
+        if not title:
+            logger.warning("REJECTED %s has empty title", intent_type)
+            return None
+
+        structured_fields = {}
+        for name, allowed, match in checks:
+            value = intent.get(name)
+            if value is None:
+                structured_fields[name] = None
+                continue
+            if allowed is not None and value not in allowed:
+                logger.warning('REJECTED %s has invalid %s: "%s"', intent_type, name, value)
+                return None
+            if match is not None and not match(str(value)):
+                logger.warning('REJECTED %s has malformed %s: "%s"', intent_type, name, value)
+                return None
+            structured_fields[name] = value
+
+        return {"type": intent_type, "title": title, "structured_fields": structured_fields}
+
+    return validate
+
+
+def _compile_builder(title_field: str, properties: dict):
+    steps = []  # (property name, constant payload or None, field name or _RAW_INPUT, formatter)
+    for name, spec in properties.items():
+        fmt = _PROPERTY_FORMATS.get(spec["type"])
+        if fmt is None:
+            continue
+        if "default" in spec:
+            if spec["default"] is not None:
+                steps.append((name, fmt(spec["default"]), None, None))
+        elif "field" in spec:
+            steps.append((name, None, spec["field"], fmt))
+        elif spec.get("source") == "raw_input":
+            steps.append((name, None, _RAW_INPUT, fmt))
+    steps = tuple(steps)
+
+    def build_properties(item: dict, raw_input: str) -> dict:
+        """Notion page properties for a validated item. Constant payloads are shared: don't mutate them."""
+        fields = item.get("structured_fields", {})
+        props = {title_field: {"title": [{"text": {"content": item["title"]}}]}}
+        for name, constant, source, fmt in steps:
+            if constant is not None:
+                props[name] = constant
+                continue
+            value = raw_input if source is _RAW_INPUT else fields.get(source)
+            if value is not None:
+                props[name] = fmt(value)
+        return props
+
+    return build_properties
+
+
+def compile_schema(intent_schema: dict = INTENT_SCHEMA) -> dict[str, CompiledIntent]:
+    return {
+        intent_type: CompiledIntent(
+            type=intent_type,
+            validate=_compile_validator(intent_type, schema["valid_fields"]),
+            build_properties=_compile_builder(schema["title_field"], schema["properties"]),
+        )
+        for intent_type, schema in intent_schema.items()
+    }
+
+
+COMPILED_SCHEMA = compile_schema()
+
+
+def validate_intent(intent: dict) -> dict | None:
+    """The validated item for a model intent, or None (logged) if it is rejected."""
+    compiled = COMPILED_SCHEMA.get(intent.get("type"))
+    if compiled is None:
+        logger.warning('REJECTED Unknown intent type: "%s"', intent.get("type"))
+        return None
+    return compiled.validate(intent)
+
+
+def validate_intents(intents: list[dict]) -> list[dict]:
+    """Validate a batch of intents, dropping the rejected ones. Order is kept."""
+    compiled = COMPILED_SCHEMA
+    items = []
+    for intent in intents:
+        entry = compiled.get(intent.get("type"))
+        if entry is None:
+            logger.warning('REJECTED Unknown intent type: "%s"', intent.get("type"))
+            continue
+        item = entry.validate(intent)
+        if item is not None:
+            items.append(item)
+    return items
+
+
+# ---------- Model response schemas ----------
+
+def _field_schema(rules: dict) -> dict:
+    field = {"type": "string", "nullable": True}
+    if "allowed" in rules:
+        field["enum"] = sorted(rules["allowed"])
+    if "pattern" in rules:
+        # Not sent as "pattern": the API only supports a subset of OpenAPI;
+        # the compiled validator still enforces it.
+        field["description"] = f"Must match {rules['pattern']}"
+    return field
+
+
+def intent_item_schema() -> dict:
+    """
+    Schema for one intent: type and title, plus every structured field any
+    intent type accepts. Fields that do not apply to a type are null.
+    Type and title come first so a streamed intent is identifiable early.
+    """
+    fields = {}
+    for schema in INTENT_SCHEMA.values():
+        for name, rules in schema["valid_fields"].items():
+            fields.setdefault(name, _field_schema(rules))
+    return {
+        "type": "object",
+        "properties": {
+            "type": {"type": "string", "enum": list(INTENT_SCHEMA)},
+            "title": {"type": "string"},
+            **fields,
+        },
+        "required": ["type", "title", *fields],
+        "property_ordering": ["type", "title", *fields],
+    }
+
+
+def intents_response_schema() -> dict:
+    """response_schema for split_intents(): {"intents": [...]}."""
+    return {
+        "type": "object",
+        "properties": {"intents": {"type": "array", "items": intent_item_schema()}},
+        "required": ["intents"],
+    }
+
+
+def batch_response_schema() -> dict:
+    """response_schema for batched splitting: {"results": [{"index": n, "intents": [...]}]}."""
+    return {
+        "type": "object",
+        "properties": {
+            "results": {
+                "type": "array",
+                "items": {
+                    "type": "object",
+                    "properties": {
+                        "index": {"type": "integer"},
+                        "intents": {"type": "array", "items": intent_item_schema()},
+                    },
+                    "required": ["index", "intents"],
+                    "property_ordering": ["index", "intents"],
+                },
+            },
+        },
+        "required": ["results"],
+    }
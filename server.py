@@ -0,0 +1,267 @@
+#!/usr/bin/env python3
+"""
+Local HTTP capture service.
+
+Lets phones, browser extensions and scripts capture without waiting on
+Gemini or Notion: POST /capture commits the raw text to the capture store
+(capture_store.py) and answers 202 straight away, while a pool of worker
+threads triages stored captures in the background.
+
+    POST /capture          body: {"text": "..."} or plain text
+                           -> 202 {"id": ..., "state": "received", "status_url": "/status/<id>"}
+    GET  /status/<id>      -> the capture's state, attempts, items, page IDs and last error
+    GET  /metrics          -> captures per state, plus per-stage latency from
+                              metrics.jsonl (?since=1h by default)
+
+When TRIAGE_SERVER_TOKEN is set every request needs an
+"Authorization: Bearer <token>" header; it is required to listen on
+anything but localhost.
+
+Usage:
+    python server.py                         # serve on 127.0.0.1:47616
+    python server.py --host 0.0.0.0 --workers 4
+    curl -X POST localhost:47616/capture -d "email recruiter, book dentist"
+
+Like daemon.py, this module stays cheap to import — the pipeline is only
+imported when the server starts.
+"""
+import argparse
+import hmac
+import ipaddress
+import json
+import logging
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+import metrics
+import capture_store
+from config import SERVER_HOST, SERVER_PORT, SERVER_TOKEN, SERVER_WORKERS
+
+logger = logging.getLogger(__name__)
+
+MAX_BODY_BYTES = 64 * 1024
+_POLL_SECONDS = 5  # how often idle workers look for captures received by other processes
+
+
+class CaptureService:
+    """
+    HTTP front end plus worker pool around the capture store.
+
+    *handler* carries one claimed capture through triage; by default it is
+    main.triage_capture() without a review window, which also resumes
+    captures left unfinished by a crash. Any exception it raises is
+    recorded on the capture, which is then retried.
+    """
+
+    def __init__(self, address=(SERVER_HOST, SERVER_PORT), workers=SERVER_WORKERS,
+                 token=SERVER_TOKEN, store=None, handler=None):
+        self.address = address
+        self.workers = max(1, workers)
+        self._token = token
+        self.store = store or capture_store.store
+        self._handler = handler
+        self._httpd = None
+        self._threads = []
+        self._stopping = threading.Event()
+        self._started = time.time()
+        self.ready = threading.Event()
+
+    def _warm_up(self):
+        from main import triage_capture
+        from notion import validate_notion_schemas
+        from prompt import assembler
+
+        validate_notion_schemas()
+        assembler.get()
+        return triage_capture
+
+    def serve_forever(self):
+        if self._handler is None:
+            self._handler = self._warm_up()
+        self.store.recover()
+
+        self._httpd = ThreadingHTTPServer(self.address, _Handler)
+        self._httpd.daemon_threads = True
+        self._httpd.service = self
+        self.address = self._httpd.server_address[:2]  # resolves port 0
+        for i in range(self.workers):
+            thread = threading.Thread(target=self._work, name=f"capture-worker-{i}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+        logger.info("Capture service listening on http://%s:%s with %d worker(s)", *self.address, self.workers)
+        self.ready.set()
+
+        try:
+            self._httpd.serve_forever()
+        finally:
+            self._stopping.set()
+            self.store.wake_all()
+            for thread in self._threads:
+                thread.join()
+            self._httpd.server_close()
+            logger.info("Capture service stopped")
+
+    def stop(self):
+        """Stop accepting requests; captures already being triaged finish first."""
+        if self._httpd is not None:
+            self._httpd.shutdown()
+
+    # ---------- Workers ----------
+
+    def _work(self):
+        while not self._stopping.is_set():
+            capture = self.store.claim()
+            if capture is None:
+                self.store.wait(_POLL_SECONDS)
+                continue
+            self._process(capture)
+
+    def _process(self, capture):
+        with metrics.span("capture", entry="server", attempt=capture["attempts"], state=capture["state"]):
+            metrics.record("server.queue_wait", (time.time() - capture["received_at"]) * 1000)
+            try:
+                self._handler(capture)
+            except Exception as e:
+                logger.exception('Capture %s failed to triage: "%s"', capture["id"], capture["text"][:80])
+                if self.store.fail(capture["id"], f"{type(e).__name__}: {e}"):
+                    logger.info("Capture %s will be retried", capture["id"])
+
+    # ---------- Endpoints ----------
+
+    def authorized(self, header: str | None) -> bool:
+        if not self._token:
+            return True
+        return hmac.compare_digest((header or "").encode(), f"Bearer {self._token}".encode())
+
+    def capture(self, text: str, source: str | None) -> tuple[int, dict]:
+        text = text.strip()
+        if not text:
+            return 400, {"error": "empty input"}
+        capture_id = self.store.receive(text, source=source)
+        return 202, {"id": capture_id, "state": capture_store.RECEIVED, "status_url": f"/status/{capture_id}"}
+
+    def status(self, capture_id: str) -> tuple[int, dict]:
+        record = self.store.get(capture_id)
+        if record is None:
+            return 404, {"error": "unknown capture"}
+        return 200, record
+
+    def report(self, since: str) -> tuple[int, dict]:
+        try:
+            cutoff = metrics.parse_since(since)
+        except argparse.ArgumentTypeError as e:
+            return 400, {"error": f"since: {e}"}
+        path = metrics.log_path()
+        stages = metrics.summarize(path, since=cutoff) if path and path.exists() else {}
+        return 200, {
+            "uptime_seconds": round(time.time() - self._started, 1),
+            "workers": self.workers,
+            "captures": self.store.counts(),
+            "since": since,
+            "stages": stages,
+        }
+
+
+class _Handler(BaseHTTPRequestHandler):
+    server_version = "triage"
+    protocol_version = "HTTP/1.1"
+
+    def do_POST(self):
+        if not self._check_auth():
+            return
+        if urlsplit(self.path).path != "/capture":
+            return self._reply(404, {"error": "not found"})
+        if self.headers.get("Content-Length") is None:
+            self.close_connection = True
+            return self._reply(411, {"error": "Content-Length required"})
+        try:
+            length = int(self.headers["Content-Length"])
+        except ValueError:
+            length = -1
+        if length < 0:
+            self.close_connection = True  # where the body ends is unknown
+            return self._reply(400, {"error": "bad Content-Length"})
+        if length > MAX_BODY_BYTES:
+            self.close_connection = True  # the unread body can't be left on a kept-alive connection
+            return self._reply(413, {"error": f"body over {MAX_BODY_BYTES} bytes"})
+        body = self.rfile.read(length).decode("utf-8", errors="replace")
+
+        text = body
+        if self.headers.get_content_type() == "application/json":
+            try:
+                text = json.loads(body).get("text") or ""
+            except (ValueError, AttributeError):
+                return self._reply(400, {"error": 'expected {"text": "..."}'})
+            if not isinstance(text, str):
+                return self._reply(400, {"error": "text must be a string"})
+        try:
+            status, payload = self.server.service.capture(text, source=self.headers.get("User-Agent"))
+        except Exception as e:
+            logger.error("Could not record capture: %s", e)
+            return self._reply(503, {"error": "capture store unavailable"})
+        self._reply(status, payload, location=payload.get("status_url"))
+
+    def do_GET(self):
+        if not self._check_auth():
+            return
+        url = urlsplit(self.path)
+        service = self.server.service
+        if url.path.startswith("/status/"):
+            return self._reply(*service.status(url.path[len("/status/"):]))
+        if url.path == "/metrics":
+            since = parse_qs(url.query).get("since", ["1h"])[0]
+            return self._reply(*service.report(since))
+        self._reply(404, {"error": "not found"})
+
+    def _check_auth(self) -> bool:
+        if self.server.service.authorized(self.headers.get("Authorization")):
+            return True
+        self._reply(401, {"error": "missing or wrong bearer token"})
+        return False
+
+    def _reply(self, status: int, payload: dict, location: str | None = None):
+        body = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        if location:
+            self.send_header("Location", location)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        logger.debug("%s - %s", self.address_string(), format % args)
+
+
+def _is_loopback(host: str) -> bool:
+    if host == "localhost":
+        return True
+    try:
+        return ipaddress.ip_address(host).is_loopback
+    except ValueError:
+        return False
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Local HTTP capture service")
+    parser.add_argument("--host", default=SERVER_HOST)
+    parser.add_argument("--port", type=int, default=SERVER_PORT)
+    parser.add_argument("--workers", type=int, default=SERVER_WORKERS, help="Captures triaged in parallel")
+    args = parser.parse_args()
+
+    if not _is_loopback(args.host) and not SERVER_TOKEN:
+        print("Set TRIAGE_SERVER_TOKEN before listening on a non-local address.", file=sys.stderr)
+        sys.exit(1)
+
+    from main import setup_logging
+
+    setup_logging()
+    metrics.enable()
+    service = CaptureService(address=(args.host, args.port), workers=args.workers)
+    try:
+        service.serve_forever()
+    except KeyboardInterrupt:
+        pass
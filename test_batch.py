@@ -0,0 +1,149 @@
+import io
+import json
+import shutil
+import tempfile
+import unittest
+from pathlib import Path
+
+from batch import Progress, parse_line, run_batch
+from page_index import Duplicate
+
+
+class TestParseLine(unittest.TestCase):
+
+    def test_plain_and_jsonl_lines(self):
+        self.assertEqual(parse_line("  buy milk \n"), "buy milk")
+        self.assertEqual(parse_line('{"ts": "2026-01-01", "input": "call mom"}\n'), "call mom")
+        self.assertEqual(parse_line('{"text": "idea: app"}'), "idea: app")
+
+    def test_blank_and_empty_entries_skipped(self):
+        self.assertIsNone(parse_line("   \n"))
+        self.assertIsNone(parse_line('{"ts": "2026-01-01"}'))
+        self.assertIsNone(parse_line('{"input": "  "}'))
+
+    def test_brace_prefixed_note_kept(self):
+        self.assertEqual(parse_line("{draft} email to bob"), "{draft} email to bob")
+
+
+def _each(fn):
+    """Adapt a one-input function to run_batch's list-of-inputs interface."""
+    def process(texts):
+        outcomes = []
+        for text in texts:
+            try:
+                outcomes.append(fn(text))
+            except Exception as e:
+                outcomes.append(e)
+        return outcomes
+    return process
+
+
+class TestRunBatch(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.progress_path = Path(self.tmp_dir) / "progress.json"
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir, ignore_errors=True)
+
+    def _run(self, lines, fn, workers=4, chunk_size=1):
+        out = io.StringIO()
+        counts = run_batch(
+            io.StringIO("".join(lines)), _each(fn), out, Progress(self.progress_path), workers, chunk_size,
+        )
+        return counts, [json.loads(line) for line in out.getvalue().splitlines()]
+
+    def test_one_result_per_input(self):
+        def process(text):
+            return {"a": ["p1"], "b": ["p2", None], "c": [], "d": [None]}[text]
+
+        counts, results = self._run(["a\n", "\n", "b\n", "c\n", "d\n"], process)
+        by_line = {r["line"]: r for r in results}
+        self.assertEqual(sorted(by_line), [1, 3, 4, 5])
+        self.assertEqual(by_line[1]["status"], "ok")
+        self.assertEqual(by_line[3]["status"], "partial")
+        self.assertEqual(by_line[4]["status"], "empty")
+        self.assertEqual(by_line[5]["status"], "failed")
+        self.assertEqual(counts["ok"], 1)
+
+    def test_duplicates_listed(self):
+        counts, (result,) = self._run(["a\n"], lambda text: ["p1", Duplicate("p0")])
+        self.assertEqual(result["status"], "ok")
+        self.assertEqual(result["duplicate_of"], ["p0"])
+
+    def test_error_recorded_and_batch_continues(self):
+        def process(text):
+            if text == "bad":
+                raise RuntimeError("boom")
+            return ["p"]
+
+        counts, results = self._run(["ok\n", "bad\n", "ok\n"], process)
+        self.assertEqual(counts["error"], 1)
+        self.assertEqual(counts["ok"], 2)
+        self.assertIn("boom", next(r for r in results if r["status"] == "error")["error"])
+
+    def test_resume_after_interrupted_run(self):
+        lines = [f"note {i}\n" for i in range(10)]
+        self._run(lines[:6], lambda text: ["p"])  # process killed after six lines
+
+        seen = []
+        counts, _ = self._run(lines, lambda text: seen.append(text) or ["p"], workers=1)
+        self.assertEqual(seen, ["note 6", "note 7", "note 8", "note 9"])
+        self.assertEqual(counts["skipped"], 6)
+
+    def test_unfinished_line_rerun_even_if_later_lines_finished(self):
+        class Crash(BaseException):
+            pass
+
+        lines = [f"note {i}\n" for i in range(10)]
+
+        def crash_on_three(text):
+            if text == "note 3":
+                raise Crash()  # not an ordinary error: the line never gets a result
+            return ["p"]
+
+        self._run(lines, crash_on_three)
+        seen = []
+        counts, _ = self._run(lines, lambda text: seen.append(text) or ["p"])
+        self.assertEqual(seen, ["note 3"])
+        self.assertEqual(counts["skipped"], 9)
+
+    def test_inputs_handed_over_in_chunks(self):
+        chunks = []
+
+        def process(texts):
+            chunks.append(texts)
+            return [["p"]] * len(texts)
+
+        lines = [f"note {i}\n" for i in range(7)]
+        out = io.StringIO()
+        counts = run_batch(io.StringIO("".join(lines)), process, out, Progress(self.progress_path), 2, 3)
+        self.assertEqual(sorted(len(c) for c in chunks), [1, 3, 3])
+        self.assertEqual(counts["ok"], 7)
+        self.assertEqual(json.loads(self.progress_path.read_text(encoding="utf-8"))["done_through"], 7)
+
+    def test_failed_chunk_marks_every_input_as_error(self):
+        def process(texts):
+            raise RuntimeError("model down")
+
+        out = io.StringIO()
+        counts = run_batch(io.StringIO("a\nb\n"), process, out, Progress(self.progress_path), 1, 2)
+        self.assertEqual(counts["error"], 2)
+
+    def test_progress_stays_bounded(self):
+        lines = [f"note {i}\n" for i in range(2000)]
+        progress_sizes = []
+
+        def process(text):
+            progress_sizes.append(self.progress_path.stat().st_size if self.progress_path.exists() else 0)
+            return []
+
+        self._run(lines, process, workers=8)
+        self.assertLess(max(progress_sizes), 200)
+        state = json.loads(self.progress_path.read_text(encoding="utf-8"))
+        self.assertEqual(state, {"done_through": 2000, "done": []})
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,82 @@
+import shutil
+import socket
+import tempfile
+import threading
+import unittest
+from pathlib import Path
+
+import daemon
+from capture_store import CaptureStore
+
+
+class TestTriageDaemon(unittest.TestCase):
+
+    def setUp(self):
+        self.handled = []
+        self.done = threading.Event()
+        self.tmp_dir = tempfile.mkdtemp()
+        self.store = CaptureStore(Path(self.tmp_dir) / "captures.sqlite3", retry_delay=0)
+
+        def handler(capture, interactive_feedback):
+            self.handled.append((capture["text"], interactive_feedback))
+            self.done.set()
+
+        self.daemon = daemon.TriageDaemon(address=("127.0.0.1", 0), handler=handler, store=self.store)
+        self.thread = threading.Thread(target=self.daemon.serve_forever, daemon=True)
+        self.thread.start()
+        self.assertTrue(self.daemon.ready.wait(5))
+
+    def tearDown(self):
+        self.daemon.stop()
+        self.thread.join(5)
+        self.store.close()
+        shutil.rmtree(self.tmp_dir, ignore_errors=True)
+
+    def test_capture_is_acked_and_triaged(self):
+        self.assertTrue(daemon.send_capture("buy milk", interactive=False, address=self.daemon.address))
+        self.assertTrue(self.done.wait(5))
+        self.assertEqual(self.handled, [("buy milk", False)])
+        self.assertEqual(self.store.counts()["received"], 1)
+
+    def test_failed_capture_released_for_retry(self):
+        self.daemon._handler = lambda capture, interactive_feedback: 1 / 0
+        self.assertTrue(daemon.send_capture("buy milk", address=self.daemon.address))
+        self.daemon.stop()
+        self.thread.join(5)
+        (capture_id, *_), = self.store.iter_captures()
+        self.assertEqual(self.store.get(capture_id)["error"], "ZeroDivisionError: division by zero")
+        self.assertIsNotNone(self.store.claim(capture_id))
+
+    def test_empty_capture_rejected(self):
+        self.assertFalse(daemon.send_capture("   ", address=self.daemon.address))
+
+    def test_wrong_key_rejected(self):
+        self.assertFalse(daemon.send_capture("buy milk", address=self.daemon.address, authkey=b"nope"))
+        self.assertEqual(self.handled, [])
+
+    def test_non_object_message_rejected(self):
+        with socket.create_connection(self.daemon.address, timeout=5) as conn:
+            conn.sendall(b"[1]\n")
+            self.assertEqual(daemon._recv_message(conn), {"ok": False, "error": "expected a JSON object"})
+        self.assertTrue(daemon.is_running(address=self.daemon.address))
+
+    def test_slow_client_does_not_block_others(self):
+        with socket.create_connection(self.daemon.address, timeout=5):  # connects, never sends
+            self.assertTrue(daemon.send_capture("buy milk", interactive=False, address=self.daemon.address))
+
+    def test_stop_with_wrong_key_rejected(self):
+        reply = daemon._request({"op": "stop"}, address=self.daemon.address, authkey=b"nope")
+        self.assertEqual(reply, {"ok": False, "error": "bad key"})
+        self.assertTrue(daemon.is_running(address=self.daemon.address))
+
+    def test_ping(self):
+        self.assertTrue(daemon.is_running(address=self.daemon.address))
+
+    def test_no_daemon_returns_false(self):
+        self.daemon.stop()
+        self.thread.join(5)
+        self.assertFalse(daemon.send_capture("buy milk", address=self.daemon.address))
+
+
+if __name__ == "__main__":
+    unittest.main()
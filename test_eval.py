@@ -0,0 +1,103 @@
+import io
+import json
+import random
+import shutil
+import sys
+import tempfile
+import time
+import unittest
+from contextlib import redirect_stdout
+from pathlib import Path
+from unittest.mock import patch
+
+import httpx
+
+sys.path.insert(0, str(Path(__file__).parent / "evaluation"))
+
+import eval as evaluation
+import llm
+
+CASE = {"id": "c1", "input": "buy milk", "expected": [{"type": "Task"}]}
+INTENTS = [{"type": "Task", "title": "Buy milk"}]
+
+
+class _APIError(Exception):
+    def __init__(self, code):
+        super().__init__(f"HTTP {code}")
+        self.code = code
+
+
+class TestRunCase(unittest.TestCase):
+
+    def setUp(self):
+        patches = [patch("eval.time.sleep"), patch("eval.last_usage", return_value=None)]
+        for p in patches:
+            p.start()
+            self.addCleanup(p.stop)
+
+    def test_transient_error_retried_then_passes(self):
+        with patch("eval.split_intents", side_effect=[_APIError(503), INTENTS]) as split:
+            result = evaluation.run_case(CASE, retries=2)
+        self.assertTrue(result["passed"])
+        self.assertEqual((result["attempts"], result["error"]), (2, None))
+        self.assertEqual(split.call_count, 2)
+
+    def test_timeouts_fail_after_retries(self):
+        timeout = httpx.ReadTimeout("timed out")
+        with patch("eval.split_intents", side_effect=timeout) as split:
+            result = evaluation.run_case(CASE, retries=2)
+        self.assertFalse(result["passed"])
+        self.assertEqual(split.call_count, 3)  # each attempt ends before the next starts
+        self.assertIn("ReadTimeout", result["error"])
+
+    def test_client_error_not_retried(self):
+        with patch("eval.split_intents", side_effect=_APIError(400)) as split:
+            result = evaluation.run_case(CASE, retries=2)
+        self.assertEqual(split.call_count, 1)
+        self.assertEqual(result["failures"], ["error: _APIError: HTTP 400"])
+
+
+class TestRun(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.cases = [dict(CASE, id=f"c{i}", input=f"note {i}") for i in range(12)]
+        cases_path = Path(self.tmp_dir) / "cases.json"
+        cases_path.write_text(json.dumps({"cases": self.cases}), encoding="utf-8")
+        patches = [
+            patch("eval.CASES_PATH", cases_path),
+            patch("eval.is_feedback_enabled", return_value=False),
+            patch("llm.REQUEST_TIMEOUT", llm.REQUEST_TIMEOUT),
+        ]
+        for p in patches:
+            p.start()
+            self.addCleanup(p.stop)
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir, ignore_errors=True)
+
+    def test_results_in_case_order_under_concurrency(self):
+        delays = random.Random(0)
+
+        def run_case(case, *args):
+            time.sleep(delays.random() / 100)  # finish out of order
+            return {"id": case["id"], "input": case["input"], "source": "synthetic", "tags": [],
+                    "passed": True, "failures": [], "actual": [], "latency_ms": 1.0, "error": None}
+
+        with patch("eval.run_case", side_effect=run_case), redirect_stdout(io.StringIO()):
+            summary = evaluation.run(workers=6, timeout=5)
+        self.assertEqual([r["id"] for r in summary["cases"]], [c["id"] for c in self.cases])
+        self.assertEqual(llm.REQUEST_TIMEOUT, 5)
+
+
+class TestRequestTimeout(unittest.TestCase):
+
+    def test_timeout_sent_as_http_option(self):
+        with patch("llm.REQUEST_TIMEOUT", 2.5):
+            self.assertEqual(llm._request_config({})["http_options"], {"timeout": 2500})
+        with patch("llm.REQUEST_TIMEOUT", 0):
+            self.assertNotIn("http_options", llm._request_config({}))
+
+
+if __name__ == "__main__":
+    unittest.main()
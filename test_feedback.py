@@ -2,6 +2,7 @@ import json
 import os
 import shutil
 import tempfile
+import threading
 import unittest
 from pathlib import Path
 from unittest.mock import patch
@@ -16,12 +17,19 @@ class TestFeedbackSystem(unittest.TestCase):
         self.tmp_dir = tempfile.mkdtemp()
         self.patch_config = patch("feedback.CONFIG_PATH", Path(self.tmp_dir) / "feedback_config.json")
         self.patch_log = patch("feedback.FEEDBACK_LOG_PATH", Path(self.tmp_dir) / "feedback.jsonl")
+        self.patch_cache = patch("llm.RESPONSE_CACHE_ENABLED", False)
+        self.patch_pre = patch("llm.PRECLASSIFIER_ENABLED", False)
         self.mock_config = self.patch_config.start()
         self.mock_log = self.patch_log.start()
+        self.patch_cache.start()
+        self.patch_pre.start()
 
     def tearDown(self):
+        feedback.feedback_index().close()
         self.patch_config.stop()
         self.patch_log.stop()
+        self.patch_cache.stop()
+        self.patch_pre.stop()
         shutil.rmtree(self.tmp_dir, ignore_errors=True)
 
     def test_default_config_creation(self):
@@ -37,6 +45,33 @@ class TestFeedbackSystem(unittest.TestCase):
         feedback.set_feedback_enabled(True)
         self.assertTrue(feedback.is_feedback_enabled())
 
+    def test_config_cached_until_file_changes(self):
+        self.assertTrue(feedback.is_feedback_enabled())
+        with patch.object(Path, "read_text") as mock_read:
+            self.assertTrue(feedback.is_feedback_enabled())
+            mock_read.assert_not_called()
+        # Another process (a separate instance here) toggles the flag
+        feedback.FeedbackConfig(self.mock_config).update({"feedback_enabled": False})
+        self.assertFalse(feedback.is_feedback_enabled())
+
+    def test_concurrent_updates_all_kept(self):
+        feedback.load_config()
+
+        def toggle(n):
+            # One instance per thread, so only the file lock keeps them apart
+            config = feedback.FeedbackConfig(self.mock_config)
+            for i in range(10):
+                config.update({f"writer_{n}": i})
+
+        threads = [threading.Thread(target=toggle, args=(n,)) for n in range(4)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        cfg = json.loads(self.mock_config.read_text(encoding="utf-8"))
+        self.assertEqual([cfg[f"writer_{n}"] for n in range(4)], [9] * 4)
+        self.assertEqual(list(Path(self.tmp_dir).glob("*.tmp")), [])
+
     def test_log_and_retrieve_feedback(self):
         raw = "read chapter 5 and prepare slides"
         pred = [{"type": "Task", "title": "Read chapter 5 and prepare slides"}]
@@ -73,7 +108,8 @@ class TestFeedbackSystem(unittest.TestCase):
         feedback.log_feedback(raw, [], corr, "Multi-step effort")
 
         with patch("llm.is_feedback_enabled", return_value=True):
-            with patch.object(llm.client.models, "generate_content") as mock_gen:
+            with patch("llm.client") as mock_client:
+                mock_gen = mock_client.models.generate_content
                 mock_response = unittest.mock.MagicMock()
                 mock_response.text = '{"intents": []}'
                 mock_gen.return_value = mock_response
@@ -94,7 +130,8 @@ class TestFeedbackSystem(unittest.TestCase):
         feedback.log_feedback(raw, [], corr, "Multi-step effort")
 
         with patch("llm.is_feedback_enabled", return_value=False):
-            with patch.object(llm.client.models, "generate_content") as mock_gen:
+            with patch("llm.client") as mock_client:
+                mock_gen = mock_client.models.generate_content
                 mock_response = unittest.mock.MagicMock()
                 mock_response.text = '{"intents": []}'
                 mock_gen.return_value = mock_response
@@ -109,5 +146,55 @@ class TestFeedbackSystem(unittest.TestCase):
                 self.assertNotIn("USER FEEDBACK CORRECTIONS", system_prompt_text)
 
 
+class TestFeedbackIndex(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.log_path = Path(self.tmp_dir) / "feedback.jsonl"
+        self.patch_log = patch("feedback.FEEDBACK_LOG_PATH", self.log_path)
+        self.patch_log.start()
+
+    def tearDown(self):
+        feedback.feedback_index().close()
+        self.patch_log.stop()
+        shutil.rmtree(self.tmp_dir, ignore_errors=True)
+
+    def _log(self, raw, title, type_="Task"):
+        feedback.log_feedback(raw, [], [{"type": type_, "title": title}])
+
+    def test_few_shot_prefers_similar_corrections(self):
+        self._log("renew passport before trip", "Renew passport", "Project")
+        for i in range(20):
+            self._log(f"buy groceries {i}", f"Buy groceries {i}")
+        prompt_part = feedback.get_few_shot_prompt(limit=2, query="passport photos for the renewal")
+        self.assertIn("renew passport before trip", prompt_part)
+        self.assertEqual(prompt_part.count("Example "), 1)
+
+    def test_falls_back_to_recent_without_a_match(self):
+        for i in range(3):
+            self._log(f"note {i}", f"Note {i}")
+        prompt_part = feedback.get_few_shot_prompt(limit=2, query="zzz")
+        self.assertNotIn('"note 0"', prompt_part)
+        self.assertLess(prompt_part.index('"note 1"'), prompt_part.index('"note 2"'))
+
+    def test_entries_only_predicted_are_not_examples(self):
+        feedback.log_feedback("hello there", [{"type": "Task", "title": "Hello"}], None)
+        self.assertEqual(feedback.get_few_shot_prompt(query="hello"), "")
+
+    def test_picks_up_entries_appended_by_another_process(self):
+        self._log("book dentist", "Book dentist")
+        entry = {"raw_input": "pay rent", "corrected_intents": [{"type": "Task", "title": "Pay rent"}]}
+        with self.log_path.open("a", encoding="utf-8") as f:
+            f.write(json.dumps(entry) + "\n" + '{"raw_input": "half')
+        self.assertEqual([e["raw_input"] for e in feedback.feedback_index().similar("rent", 5)], ["pay rent"])
+
+    def test_rebuilt_when_log_replaced(self):
+        self._log("book dentist", "Book dentist")
+        self._log("pay rent", "Pay rent")
+        entry = {"raw_input": "water plants", "corrected_intents": []}
+        self.log_path.write_text(json.dumps(entry) + "\n", encoding="utf-8")
+        self.assertEqual([e["raw_input"] for e in feedback.feedback_index().recent(5)], ["water plants"])
+
+
 if __name__ == "__main__":
     unittest.main()
@@ -0,0 +1,57 @@
+import json
+import random
+import unittest
+
+from json_stream import ArrayItemStream
+
+DOC = {
+    "note": 'decoy "intents": [ {',
+    "intents": [
+        {"type": "Task", "title": 'quote \\" and brace } ] {'},
+        {"type": "Idea", "title": "nested", "tags": [1, {"x": "}"}]},
+    ],
+    "after": [{"ignored": True}],
+}
+
+
+class TestArrayItemStream(unittest.TestCase):
+
+    def test_any_chunking_yields_same_items(self):
+        text = json.dumps(DOC, indent=2)
+        rng = random.Random(7)
+        for _ in range(50):
+            stream, items, i = ArrayItemStream("intents"), [], 0
+            while i < len(text):
+                n = rng.randint(1, 9)
+                items += stream.feed(text[i:i + n])
+                i += n
+            self.assertEqual(items, DOC["intents"])
+            self.assertTrue(stream.done)
+
+    def test_item_surfaces_before_response_ends(self):
+        stream = ArrayItemStream("intents")
+        self.assertEqual(stream.feed('{"intents": [{"type": "Task", "title": "a"}, {"type": "Ta'), [
+            {"type": "Task", "title": "a"},
+        ])
+        self.assertFalse(stream.done)
+        self.assertEqual(stream.feed('sk", "title": "b"}]}'), [{"type": "Task", "title": "b"}])
+        self.assertTrue(stream.done)
+        self.assertEqual(stream.count, 2)
+
+    def test_buffer_only_holds_current_item(self):
+        stream = ArrayItemStream("intents")
+        stream.feed('{"intents": [' + ", ".join(json.dumps({"title": "x" * 100}) for _ in range(50)))
+        self.assertLess(len(stream._buf), 120)
+
+    def test_truncated_response_keeps_complete_items(self):
+        text = json.dumps(DOC)
+        cut = text.index('{"type": "Idea"') + 10
+        self.assertEqual(ArrayItemStream("intents").feed(text[:cut]), DOC["intents"][:1])
+
+    def test_other_key(self):
+        text = '{"results": [{"index": 0, "intents": []}, {"index": 1, "intents": [{"t": 1}]}]}'
+        self.assertEqual([r["index"] for r in ArrayItemStream("results").feed(text)], [0, 1])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,396 @@
+import asyncio
+import json
+import shutil
+import tempfile
+import time
+import unittest
+from pathlib import Path
+from types import SimpleNamespace
+from unittest.mock import AsyncMock, MagicMock, patch
+
+from google.genai import errors as genai_errors
+
+import feedback
+import llm
+import response_cache as rc
+from prompt import AssembledPrompt
+
+
+def _stub_client(text='{"intents": []}'):
+    """A genai.Client stand-in: caches.create hands out numbered names."""
+    stub = MagicMock()
+    counter = iter(range(1, 100))
+    stub.caches.create.side_effect = lambda **kwargs: SimpleNamespace(name=f"cachedContents/{next(counter)}")
+    stub.models.generate_content.return_value = MagicMock(text=text)
+    return stub
+
+
+class TestContextCache(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.client = _stub_client()
+        patches = [
+            patch("feedback.FEEDBACK_LOG_PATH", Path(self.tmp_dir) / "feedback.jsonl"),
+            patch("llm.client", self.client),
+            patch("llm.context_cache", llm.ContextCache(ttl=3600)),
+            patch("llm.CONTEXT_CACHE_ENABLED", True),
+            patch("llm.is_feedback_enabled", return_value=False),
+            patch("llm.RESPONSE_CACHE_ENABLED", False),
+            patch("llm.PRECLASSIFIER_ENABLED", False),
+        ]
+        for p in patches:
+            p.start()
+            self.addCleanup(p.stop)
+
+    def tearDown(self):
+        feedback.feedback_index().close()
+        shutil.rmtree(self.tmp_dir, ignore_errors=True)
+
+    def _sent(self, call_index=-1):
+        kwargs = self.client.models.generate_content.call_args_list[call_index][1]
+        return kwargs["contents"][0]["parts"], kwargs["config"]
+
+    def test_only_today_and_input_sent_when_cached(self):
+        llm.split_intents("buy milk")
+        parts, config = self._sent()
+        self.assertEqual(len(parts), 1)
+        self.assertTrue(parts[0]["text"].startswith("TODAY: "))
+        self.assertIn("buy milk", parts[0]["text"])
+        self.assertEqual(config["cached_content"], "cachedContents/1")
+        system_instruction = self.client.caches.create.call_args[1]["config"]["system_instruction"]
+        self.assertIn("intent splitter", system_instruction)
+
+    def test_few_shot_sent_alongside_cached_base_prompt(self):
+        feedback.log_feedback("plan offsite", [], [{"type": "Project", "title": "Plan offsite"}])
+        with patch("llm.is_feedback_enabled", return_value=True):
+            llm.split_intents("offsite budget")
+            llm.split_intents("buy milk")
+        self.client.caches.create.assert_called_once()
+        system_instruction = self.client.caches.create.call_args[1]["config"]["system_instruction"]
+        self.assertNotIn("USER FEEDBACK CORRECTIONS", system_instruction)
+        parts, config = self._sent()
+        self.assertIn("plan offsite", parts[0]["text"])
+        self.assertIn("buy milk", parts[1]["text"])
+        self.assertEqual(config["cached_content"], "cachedContents/1")
+
+    def test_cache_reused_across_calls(self):
+        llm.split_intents("buy milk")
+        llm.split_intents("call mom")
+        self.client.caches.create.assert_called_once()
+        self.assertEqual(self._sent()[1]["cached_content"], "cachedContents/1")
+
+    def test_prompt_change_rolls_cache(self):
+        llm.split_intents("buy milk")
+        with patch("llm.assembler") as mock_assembler:
+            mock_assembler.get.return_value = AssembledPrompt.build("NEW PROMPT", "")
+            llm.split_intents("buy milk")
+        self.assertEqual(self.client.caches.create.call_count, 2)
+        self.client.caches.delete.assert_called_once_with(name="cachedContents/1")
+        self.assertEqual(self._sent()[1]["cached_content"], "cachedContents/2")
+
+    def test_expiring_cache_refreshed(self):
+        llm.split_intents("buy milk")
+        with patch("llm.time.time", return_value=llm.time.time() + 3600):
+            llm.split_intents("buy milk")
+        self.assertEqual(self.client.caches.create.call_count, 2)
+
+    def test_falls_back_inline_when_cache_creation_fails(self):
+        self.client.caches.create.side_effect = RuntimeError("caching unsupported")
+        llm.split_intents("buy milk")
+        parts, config = self._sent()
+        self.assertEqual(len(parts), 2)
+        self.assertIn("intent splitter", parts[0]["text"])
+        self.assertNotIn("cached_content", config)
+        # Disabled for a TTL — no retry storm
+        llm.split_intents("buy milk")
+        self.client.caches.create.assert_called_once()
+
+    def test_rejected_cache_falls_back_inline_and_rebuilds(self):
+        self.client.models.generate_content.side_effect = [
+            genai_errors.ClientError(404, {"error": {"message": "cache expired", "status": "NOT_FOUND"}}),
+            MagicMock(text='{"intents": []}'),
+            MagicMock(text='{"intents": []}'),
+        ]
+        self.assertEqual(llm.split_intents("buy milk"), [])
+        self.assertEqual(len(self._sent()[0]), 2)
+        llm.split_intents("buy milk")
+        self.assertEqual(self.client.caches.create.call_count, 2)
+
+    def test_disabled_sends_prompt_inline(self):
+        with patch("llm.CONTEXT_CACHE_ENABLED", False):
+            llm.split_intents("buy milk")
+        self.client.caches.create.assert_not_called()
+        self.assertEqual(len(self._sent()[0]), 2)
+
+
+class TestResponseCache(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.client = _stub_client('{"intents": [{"type": "Task", "title": "Buy milk"}]}')
+        self.cache = rc.ResponseCache(Path(self.tmp_dir) / "cache.sqlite3", max_entries=3)
+        patches = [
+            patch("feedback.FEEDBACK_LOG_PATH", Path(self.tmp_dir) / "feedback.jsonl"),
+            patch("llm.client", self.client),
+            patch("llm.CONTEXT_CACHE_ENABLED", False),
+            patch("llm.RESPONSE_CACHE_ENABLED", True),
+            patch("llm.response_cache", self.cache),
+            patch("llm.PRECLASSIFIER_ENABLED", False),
+            patch("llm.is_feedback_enabled", return_value=False),
+        ]
+        for p in patches:
+            p.start()
+            self.addCleanup(p.stop)
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir, ignore_errors=True)
+
+    def test_repeat_input_served_from_cache(self):
+        first = llm.split_intents("buy milk")
+        second = llm.split_intents("  Buy   Milk ")
+        self.assertEqual(first, second)
+        self.client.models.generate_content.assert_called_once()
+
+    def test_bypass_flag_calls_model(self):
+        llm.split_intents("buy milk")
+        llm.split_intents("buy milk", use_cache=False)
+        self.assertEqual(self.client.models.generate_content.call_count, 2)
+
+    def test_new_day_misses(self):
+        llm.split_intents("buy milk")
+        with patch("llm.date") as mock_date:
+            mock_date.today.return_value.isoformat.return_value = "2099-01-01"
+            llm.split_intents("buy milk")
+        self.assertEqual(self.client.models.generate_content.call_count, 2)
+
+    def test_prompt_change_misses(self):
+        llm.split_intents("buy milk")
+        with patch("llm.assembler") as mock_assembler:
+            mock_assembler.get.return_value = AssembledPrompt.build("NEW PROMPT", "")
+            llm.split_intents("buy milk")
+        self.assertEqual(self.client.models.generate_content.call_count, 2)
+
+    def test_unparseable_response_not_cached(self):
+        self.client.models.generate_content.return_value = MagicMock(text="not json")
+        self.assertEqual(llm.split_intents("buy milk"), [])
+        self.assertEqual(len(self.cache), 0)
+
+    def test_lru_eviction(self):
+        for key in ("a", "b", "c"):
+            self.cache.put(key, [])
+        self.cache.get("a")  # refresh a, so b is now least recently used
+        self.cache.put("d", [])
+        self.assertEqual(len(self.cache), 3)
+        self.assertIsNone(self.cache.get("b"))
+        self.assertEqual(self.cache.get("a"), [])
+
+    def test_limit_holds_across_processes(self):
+        # A second instance on the same file stands in for another process
+        other = rc.ResponseCache(self.cache.path, max_entries=3)
+        self.addCleanup(lambda: other._conn and other._conn.close())
+        for i in range(4):
+            (self.cache if i % 2 else other).put(f"key-{i}", [])
+        self.assertEqual(len(self.cache), 3)
+        self.assertIsNone(self.cache.get("key-0"))
+
+    def test_hit_is_sub_millisecond(self):
+        llm.split_intents("buy milk")
+        start = time.perf_counter()
+        for _ in range(100):
+            llm.split_intents("buy milk")
+        self.assertLess((time.perf_counter() - start) / 100, 0.001)
+
+
+class TestSplitIntentsBatch(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.client = _stub_client()
+        self.client.models.generate_content.side_effect = self._generate
+        self.cache = rc.ResponseCache(Path(self.tmp_dir) / "cache.sqlite3")
+        self.drop = set()  # inputs the packed response "forgets"
+        patches = [
+            patch("feedback.FEEDBACK_LOG_PATH", Path(self.tmp_dir) / "feedback.jsonl"),
+            patch("llm.client", self.client),
+            patch("llm.CONTEXT_CACHE_ENABLED", False),
+            patch("llm.RESPONSE_CACHE_ENABLED", True),
+            patch("llm.response_cache", self.cache),
+            patch("llm.PRECLASSIFIER_ENABLED", False),
+            patch("llm.is_feedback_enabled", return_value=False),
+        ]
+        for p in patches:
+            p.start()
+            self.addCleanup(p.stop)
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir, ignore_errors=True)
+
+    @staticmethod
+    def _intents(text):
+        return [{"type": "Task", "title": text.capitalize()}]
+
+    def _generate(self, model, contents, config):
+        message = contents[0]["parts"][-1]["text"]
+        if "USER INPUTS:" in message:
+            inputs = json.loads(message.split("USER INPUTS:\n", 1)[1])
+            results = [
+                {"index": i, "intents": self._intents(text)}
+                for i, text in enumerate(inputs) if text not in self.drop
+            ]
+            return MagicMock(text=json.dumps({"results": results}))
+        text = message.split("USER INPUT:\n", 1)[1]
+        return MagicMock(text=json.dumps({"intents": self._intents(text)}))
+
+    def test_one_request_per_batch_in_input_order(self):
+        inputs = ["buy milk", "call mom", "email bob"]
+        self.assertEqual(llm.split_intents_batch(inputs), [self._intents(t) for t in inputs])
+        self.client.models.generate_content.assert_called_once()
+        config = self.client.models.generate_content.call_args[1]["config"]
+        self.assertEqual(config["response_mime_type"], "application/json")
+
+    def test_results_match_single_splits(self):
+        inputs = ["buy milk", "call mom"]
+        batched = llm.split_intents_batch(inputs, use_cache=False)
+        single = [llm.split_intents(t, use_cache=False) for t in inputs]
+        self.assertEqual(batched, single)
+
+    def test_chunks_by_batch_size(self):
+        llm.split_intents_batch([f"note {i}" for i in range(5)], batch_size=2)
+        self.assertEqual(self.client.models.generate_content.call_count, 3)
+
+    def test_unaccounted_input_falls_back_to_own_call(self):
+        self.drop = {"call mom"}
+        inputs = ["buy milk", "call mom", "email bob"]
+        self.assertEqual(llm.split_intents_batch(inputs), [self._intents(t) for t in inputs])
+        self.assertEqual(self.client.models.generate_content.call_count, 2)
+
+    def test_failed_packed_request_falls_back_per_input(self):
+        from google.genai import errors as genai_errors
+
+        generate = self._generate
+
+        def flaky(model, contents, config):
+            if "USER INPUTS:" in contents[0]["parts"][-1]["text"]:
+                raise genai_errors.ServerError(503, {"error": {"message": "overloaded", "status": "UNAVAILABLE"}})
+            return generate(model, contents, config)
+
+        self.client.models.generate_content.side_effect = flaky
+        inputs = ["buy milk", "call mom", "email bob"]
+        self.assertEqual(llm.split_intents_batch(inputs), [self._intents(t) for t in inputs])
+        self.assertEqual(self.client.models.generate_content.call_count, 4)
+
+    def test_cached_inputs_not_sent(self):
+        llm.split_intents("buy milk")
+        llm.split_intents_batch(["buy milk", "call mom", "email bob"])
+        message = self.client.models.generate_content.call_args[1]["contents"][0]["parts"][-1]["text"]
+        self.assertNotIn("buy milk", message)
+        self.assertEqual(len(self.cache), 1)
+
+    def test_packed_results_not_cached(self):
+        # Generated from a prompt built for the whole batch, not each input's own
+        llm.split_intents_batch(["buy milk", "call mom"])
+        self.assertEqual(len(self.cache), 0)
+        llm.split_intents("buy milk")
+        self.assertEqual(self.client.models.generate_content.call_count, 2)
+
+
+class TestStructuredOutput(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.client = _stub_client('{"intents": [{"type": "Task", "title": "Buy milk"}]}')
+        self.cache = rc.ResponseCache(Path(self.tmp_dir) / "cache.sqlite3")
+        patches = [
+            patch("feedback.FEEDBACK_LOG_PATH", Path(self.tmp_dir) / "feedback.jsonl"),
+            patch("llm.client", self.client),
+            patch("llm.CONTEXT_CACHE_ENABLED", False),
+            patch("llm.RESPONSE_CACHE_ENABLED", True),
+            patch("llm.response_cache", self.cache),
+            patch("llm.PRECLASSIFIER_ENABLED", False),
+            patch("llm.is_feedback_enabled", return_value=False),
+        ]
+        for p in patches:
+            p.start()
+            self.addCleanup(p.stop)
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir, ignore_errors=True)
+
+    def _stream(self, *chunks):
+        self.client.models.generate_content_stream.return_value = iter(MagicMock(text=c) for c in chunks)
+
+    def test_response_schema_generated_from_intent_schema(self):
+        llm.split_intents("buy milk")
+        config = self.client.models.generate_content.call_args[1]["config"]
+        self.assertEqual(config["response_mime_type"], "application/json")
+        item = config["response_schema"]["properties"]["intents"]["items"]
+        self.assertEqual(item["properties"]["type"]["enum"], ["Task", "Project", "Idea"])
+        self.assertEqual(item["properties"]["review_frequency"]["enum"], ["Monthly", "Weekly"])
+        self.assertTrue(item["properties"]["due_date"]["nullable"])
+
+    def test_truncated_response_salvaged_but_not_cached(self):
+        self.client.models.generate_content.return_value = MagicMock(
+            text='{"intents": [{"type": "Task", "title": "Buy milk"}, {"type": "Idea", "tit'
+        )
+        self.assertEqual(llm.split_intents("buy milk"), [{"type": "Task", "title": "Buy milk"}])
+        self.assertEqual(len(self.cache), 0)
+
+    def test_stream_yields_each_intent_as_it_completes(self):
+        self._stream('{"intents": [{"type": "Task", "tit', 'le": "A"}, {"type": "Task", ', '"title": "B"}]}')
+        stream = llm.stream_intents("a and b")
+        self.assertEqual(next(stream), {"type": "Task", "title": "A"})
+        self.assertEqual(next(stream), {"type": "Task", "title": "B"})
+        self.assertEqual(list(stream), [])
+        self.assertEqual(len(self.cache), 1)
+
+    def test_stream_matches_split_intents(self):
+        self._stream(self.client.models.generate_content.return_value.text)
+        self.assertEqual(list(llm.stream_intents("buy milk", use_cache=False)),
+                         llm.split_intents("buy milk", use_cache=False))
+
+    def test_unfinished_stream_not_cached(self):
+        self._stream('{"intents": [{"type": "Task", "title": "A"}, {"ty')
+        self.assertEqual(list(llm.stream_intents("a")), [{"type": "Task", "title": "A"}])
+        self.assertEqual(len(self.cache), 0)
+
+    def test_async_split_uses_async_client_and_shared_cache(self):
+        self.client.aio.models.generate_content = AsyncMock(
+            return_value=self.client.models.generate_content.return_value
+        )
+        self.assertEqual(asyncio.run(llm.split_intents_async("buy milk")), [{"type": "Task", "title": "Buy milk"}])
+        config = self.client.aio.models.generate_content.call_args[1]["config"]
+        self.assertEqual(config["response_schema"], llm.INTENTS_FORMAT["response_schema"])
+        self.assertEqual(llm.split_intents("buy milk"), [{"type": "Task", "title": "Buy milk"}])
+        self.client.models.generate_content.assert_not_called()
+
+    def test_stream_served_from_cache(self):
+        llm.split_intents("buy milk")
+        self.assertEqual(list(llm.stream_intents("buy milk")), [{"type": "Task", "title": "Buy milk"}])
+        self.client.models.generate_content_stream.assert_not_called()
+
+
+class TestParsePacked(unittest.TestCase):
+
+    def test_drops_bad_duplicate_and_out_of_range_entries(self):
+        raw = json.dumps({"results": [
+            {"index": 0, "intents": []},
+            {"index": 1, "intents": [{"type": "Task", "title": "a"}]},
+            {"index": 1, "intents": []},
+            {"index": 2, "intents": "nope"},
+            {"index": 7, "intents": []},
+            {"index": True, "intents": []},
+        ]})
+        self.assertEqual(llm._parse_packed(raw, 3), {0: []})
+
+    def test_unparseable_response(self):
+        self.assertEqual(llm._parse_packed("not json", 2), {})
+        self.assertEqual(llm._parse_packed('{"intents": []}', 2), {})
+
+    def test_truncated_response_keeps_complete_entries(self):
+        raw = '{"results": [{"index": 0, "intents": []}, {"index": 1, "intents": [{"type": "Ta'
+        self.assertEqual(llm._parse_packed(raw, 2), {0: []})
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,547 @@
+import asyncio
+import json
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import unittest
+from pathlib import Path
+from unittest.mock import patch
+
+import capture_store
+import metrics
+from main import (
+    _validate_intent,
+    flush_dead_letter,
+    resume_captures,
+    triage,
+    triage_async,
+    triage_capture,
+    triage_many,
+)
+from page_index import Duplicate
+
+
+class TestValidateTask(unittest.TestCase):
+
+    def test_valid_full(self):
+        result = _validate_intent({"type": "Task", "title": "Write report", "priority": "High", "due_date": "2026-02-15"})
+        self.assertIsNotNone(result)
+        self.assertEqual(result["type"], "Task")
+        self.assertEqual(result["title"], "Write report")
+        self.assertEqual(result["structured_fields"]["priority"], "High")
+        self.assertEqual(result["structured_fields"]["due_date"], "2026-02-15")
+
+    def test_valid_null_optional_fields(self):
+        result = _validate_intent({"type": "Task", "title": "Buy groceries", "priority": None, "due_date": None})
+        self.assertIsNotNone(result)
+        self.assertIsNone(result["structured_fields"]["priority"])
+        self.assertIsNone(result["structured_fields"]["due_date"])
+
+    def test_title_whitespace_only_rejected(self):
+        self.assertIsNone(_validate_intent({"type": "Task", "title": "   ", "priority": None, "due_date": None}))
+
+    def test_invalid_priority_rejected(self):
+        self.assertIsNone(_validate_intent({"type": "Task", "title": "Do something", "priority": "Urgent", "due_date": None}))
+
+    def test_malformed_date_rejected(self):
+        self.assertIsNone(_validate_intent({"type": "Task", "title": "Do something", "priority": None, "due_date": "next Friday"}))
+
+    def test_all_valid_priorities_accepted(self):
+        for p in ("High", "Medium", "Low"):
+            with self.subTest(priority=p):
+                self.assertIsNotNone(_validate_intent({"type": "Task", "title": "Do something", "priority": p, "due_date": None}))
+
+
+class TestValidateProject(unittest.TestCase):
+
+    def test_valid_full(self):
+        result = _validate_intent({"type": "Project", "title": "Launch website", "success_criteria": "1000 signups", "review_frequency": "Weekly"})
+        self.assertIsNotNone(result)
+        self.assertEqual(result["type"], "Project")
+        self.assertEqual(result["structured_fields"]["review_frequency"], "Weekly")
+        self.assertEqual(result["structured_fields"]["success_criteria"], "1000 signups")
+
+    def test_valid_null_optional_fields(self):
+        result = _validate_intent({"type": "Project", "title": "Redesign dashboard", "success_criteria": None, "review_frequency": None})
+        self.assertIsNotNone(result)
+
+    def test_empty_title_rejected(self):
+        self.assertIsNone(_validate_intent({"type": "Project", "title": "", "success_criteria": None, "review_frequency": None}))
+
+    def test_invalid_review_frequency_rejected(self):
+        self.assertIsNone(_validate_intent({"type": "Project", "title": "Some project", "review_frequency": "Daily"}))
+
+    def test_valid_review_frequencies_accepted(self):
+        for freq in ("Weekly", "Monthly"):
+            with self.subTest(freq=freq):
+                self.assertIsNotNone(_validate_intent({"type": "Project", "title": "Some project", "review_frequency": freq}))
+
+
+class TestValidateIdea(unittest.TestCase):
+
+    def test_valid_full(self):
+        result = _validate_intent({"type": "Idea", "title": "AI writing assistant", "category": "Product", "potential_impact": "High"})
+        self.assertIsNotNone(result)
+        self.assertEqual(result["type"], "Idea")
+        self.assertEqual(result["structured_fields"]["category"], "Product")
+        self.assertEqual(result["structured_fields"]["potential_impact"], "High")
+
+    def test_valid_null_optional_fields(self):
+        result = _validate_intent({"type": "Idea", "title": "Use dark mode", "category": None, "potential_impact": None})
+        self.assertIsNotNone(result)
+
+    def test_empty_title_rejected(self):
+        self.assertIsNone(_validate_intent({"type": "Idea", "title": "", "category": None, "potential_impact": None}))
+
+    def test_invalid_potential_impact_rejected(self):
+        self.assertIsNone(_validate_intent({"type": "Idea", "title": "Cool idea", "potential_impact": "Huge"}))
+
+
+class TestTriage(unittest.TestCase):
+
+    def setUp(self):
+        self.fb_patch = patch("main.is_feedback_enabled", return_value=False)
+        self.fb_patch.start()
+
+    def tearDown(self):
+        self.fb_patch.stop()
+
+    def test_no_intents_nothing_written(self):
+        with patch("main.split_intents", return_value=[]):
+            with patch("main.write_to_notion") as mock_write:
+                triage("hmm")
+                mock_write.assert_not_called()
+
+    def test_single_valid_task_written(self):
+        intents = [{"type": "Task", "title": "Submit report", "priority": "High", "due_date": "2026-02-14"}]
+        with patch("main.split_intents", return_value=intents):
+            with patch("main.write_to_notion") as mock_write:
+                triage("Submit report by tomorrow, high priority")
+                mock_write.assert_called_once()
+                item = mock_write.call_args[0][0]
+                self.assertEqual(item["type"], "Task")
+                self.assertEqual(item["title"], "Submit report")
+                self.assertEqual(item["structured_fields"]["priority"], "High")
+
+    def test_mixed_intents_all_written(self):
+        intents = [
+            {"type": "Task",    "title": "Send email",       "priority": None, "due_date": None},
+            {"type": "Project", "title": "Build portfolio",  "success_criteria": None, "review_frequency": None},
+            {"type": "Idea",    "title": "Try serverless",   "category": None, "potential_impact": None},
+        ]
+        with patch("main.split_intents", return_value=intents):
+            with patch("main.write_to_notion") as mock_write:
+                triage("Send email, build portfolio, try serverless")
+                self.assertEqual(mock_write.call_count, 3)
+                types_written = [c[0][0]["type"] for c in mock_write.call_args_list]
+                self.assertCountEqual(types_written, ["Task", "Project", "Idea"])
+
+    def test_concurrent_writes_return_in_input_order(self):
+        intents = [
+            {"type": "Task", "title": f"Task {i}", "priority": None, "due_date": None}
+            for i in range(5)
+        ]
+
+        def slow_first(item, raw_input):
+            # Earlier items finish last, so completion order is reversed
+            time.sleep(0.05 * (5 - int(item["title"].split()[1])))
+            return f"page-{item['title']}"
+
+        with patch("main.split_intents", return_value=intents):
+            with patch("main.write_to_notion", side_effect=slow_first):
+                page_ids = triage("five tasks")
+        self.assertEqual(page_ids, [f"page-Task {i}" for i in range(5)])
+
+    def test_failed_write_does_not_block_others(self):
+        intents = [
+            {"type": "Task", "title": "Fails",   "priority": None, "due_date": None},
+            {"type": "Task", "title": "Succeeds", "priority": None, "due_date": None},
+        ]
+        # write_to_notion dead-letters internally and returns None on failure
+        with patch("main.split_intents", return_value=intents):
+            with patch("main.write_to_notion", side_effect=lambda item, raw: None if item["title"] == "Fails" else "page-1"):
+                self.assertEqual(triage("two tasks"), [None, "page-1"])
+
+    def test_triage_many_splits_once_and_isolates_errors(self):
+        batches = [[{"type": "Task", "title": "Buy milk"}], [{"type": "Task", "title": "Boom"}], []]
+
+        def write(item, raw):
+            if item["title"] == "Boom":
+                raise RuntimeError("unexpected")
+            return "page-1"
+
+        with patch("main.split_intents_batch", return_value=batches) as mock_batch, \
+                patch("main.split_intents") as mock_split, \
+                patch("main.write_to_notion", side_effect=write):
+            outcomes = triage_many(["buy milk", "boom", "hello"])
+        mock_batch.assert_called_once()
+        mock_split.assert_not_called()
+        self.assertEqual(outcomes[0], ["page-1"])
+        self.assertIsInstance(outcomes[1], RuntimeError)
+        self.assertEqual(outcomes[2], [])
+
+    def test_unknown_intent_type_skipped(self):
+        intents = [{"type": "Reminder", "title": "Call dentist"}]
+        with patch("main.split_intents", return_value=intents):
+            with patch("main.write_to_notion") as mock_write:
+                triage("Call dentist next week")
+                mock_write.assert_not_called()
+
+    def test_invalid_task_not_written(self):
+        intents = [{"type": "Task", "title": "", "priority": None, "due_date": None}]
+        with patch("main.split_intents", return_value=intents):
+            with patch("main.write_to_notion") as mock_write:
+                triage("something vague")
+                mock_write.assert_not_called()
+
+    def test_invalid_intent_does_not_block_valid_intent(self):
+        intents = [
+            {"type": "Task", "title": "",            "priority": None, "due_date": None},  # invalid
+            {"type": "Task", "title": "Fix login bug", "priority": None, "due_date": None},  # valid
+        ]
+        with patch("main.split_intents", return_value=intents):
+            with patch("main.write_to_notion") as mock_write:
+                triage("some input")
+                mock_write.assert_called_once()
+                self.assertEqual(mock_write.call_args[0][0]["title"], "Fix login bug")
+
+    def test_duplicate_reported_as_such(self):
+        intents = [{"type": "Task", "title": "Buy milk"}]
+        with patch("main.split_intents", return_value=intents), \
+                patch("main.write_to_notion", return_value=Duplicate("page-1")), \
+                self.assertLogs("main", level="INFO") as logs:
+            self.assertEqual(triage("buy milk"), ["page-1"])
+        self.assertTrue(any("duplicate of page-1" in line for line in logs.output))
+        self.assertFalse(any("created" in line and "OK" in line for line in logs.output))
+
+    def test_raw_input_forwarded_to_writer(self):
+        raw = "Finish the report by Friday, high priority"
+        intents = [{"type": "Task", "title": "Finish report", "priority": "High", "due_date": "2026-02-13"}]
+        with patch("main.split_intents", return_value=intents):
+            with patch("main.write_to_notion") as mock_write:
+                triage(raw)
+                self.assertEqual(mock_write.call_args[0][1], raw)
+
+
+class TestTriageStream(unittest.TestCase):
+
+    def setUp(self):
+        self.fb_patch = patch("main.is_feedback_enabled", return_value=False)
+        self.fb_patch.start()
+
+    def tearDown(self):
+        self.fb_patch.stop()
+
+    def test_first_write_starts_before_stream_ends(self):
+        first_written = threading.Event()
+
+        def stream(user_input, use_cache=True):
+            yield {"type": "Task", "title": "First"}
+            # The first write must land while the model is still "responding"
+            self.assertTrue(first_written.wait(timeout=5))
+            yield {"type": "Task", "title": ""}  # invalid, never written
+            yield {"type": "Idea", "title": "Second"}
+
+        def write(item, raw):
+            if item["title"] == "First":
+                first_written.set()
+            return f"page-{item['title']}"
+
+        with patch("main.stream_intents", side_effect=stream), \
+                patch("main.write_to_notion", side_effect=write):
+            self.assertEqual(triage("first, second", stream=True), ["page-First", "page-Second"])
+
+    def test_review_window_disables_streaming(self):
+        with patch("main.is_feedback_enabled", return_value=True), \
+                patch("feedback_ui.review_intents_interactive", side_effect=lambda raw, intents: intents, create=True), \
+                patch("main.stream_intents") as mock_stream, \
+                patch("main.split_intents", return_value=[]):
+            triage("hmm", stream=True)
+            mock_stream.assert_not_called()
+
+    def test_first_write_timing_recorded(self):
+        tmp_dir = tempfile.mkdtemp()
+        metrics.enable(Path(tmp_dir) / "metrics.jsonl")
+        try:
+            with patch("main.stream_intents", return_value=iter([{"type": "Task", "title": "A"}])), \
+                    patch("main.write_to_notion", return_value="page-1"):
+                triage("a", stream=True)
+            names = [json.loads(line)["name"] for line in (Path(tmp_dir) / "metrics.jsonl").open()]
+        finally:
+            metrics.disable()
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+        self.assertEqual(names.count("triage.stream.first_write"), 1)
+        self.assertIn("triage.stream", names)
+
+
+class TestTriageAsync(unittest.TestCase):
+
+    def test_pages_in_input_order_with_bounded_concurrency(self):
+        in_flight, peak = 0, 0
+
+        async def write(item, raw):
+            nonlocal in_flight, peak
+            in_flight += 1
+            peak = max(peak, in_flight)
+            await asyncio.sleep(0.01 if item["title"] == "A" else 0)
+            in_flight -= 1
+            return f"page-{item['title']}"
+
+        intents = [{"type": "Task", "title": t} for t in "ABCDE"] + [{"type": "Task", "title": ""}]
+        with patch("main.split_intents_async", return_value=intents), \
+                patch("main.write_to_notion_async", side_effect=write), \
+                patch("main.NOTION_MAX_CONCURRENCY", 2):
+            page_ids = asyncio.run(triage_async("a, b, c, d, e"))
+        self.assertEqual(page_ids, [f"page-{t}" for t in "ABCDE"])
+        self.assertEqual(peak, 2)
+
+    def test_captures_run_concurrently(self):
+        both_started = asyncio.Event()
+        started = []
+
+        async def split(user_input, use_cache=True):
+            started.append(user_input)
+            if len(started) == 2:
+                both_started.set()
+            # Each capture only finishes once the other has started
+            await asyncio.wait_for(both_started.wait(), timeout=5)
+            return [{"type": "Idea", "title": user_input}]
+
+        async def write(item, raw):
+            return raw
+
+        async def main():
+            return await asyncio.gather(triage_async("one"), triage_async("two"))
+
+        with patch("main.split_intents_async", side_effect=split), \
+                patch("main.write_to_notion_async", side_effect=write):
+            self.assertEqual(asyncio.run(main()), [["one"], ["two"]])
+
+    def test_no_intents_nothing_written(self):
+        with patch("main.split_intents_async", return_value=[]), \
+                patch("main.write_to_notion_async") as mock_write:
+            self.assertEqual(asyncio.run(triage_async("hmm")), [])
+            mock_write.assert_not_called()
+
+
+class CaptureStoreTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.store = capture_store.CaptureStore(Path(self.tmp_dir) / "captures.sqlite3", retry_delay=0)
+        patches = [
+            patch("capture_store.store", self.store),
+            patch("main.is_feedback_enabled", return_value=False),
+            patch("main.write_to_notion", side_effect=self._fake_write),
+        ]
+        for p in patches:
+            p.start()
+            self.addCleanup(p.stop)
+        self.written = []
+
+    def tearDown(self):
+        self.store.close()
+        shutil.rmtree(self.tmp_dir, ignore_errors=True)
+
+    def _fake_write(self, item, raw_input):
+        # Stands in for notion.write_to_notion, including its store bookkeeping
+        if item["title"].startswith("fail"):
+            self.store.dead_letter(item, raw_input, error="boom")
+            return None
+        self.written.append(item["title"])
+        self.store.item_written(item, f"page-{item['title']}")
+        return f"page-{item['title']}"
+
+    @staticmethod
+    def _tasks(*titles):
+        return [{"type": "Task", "title": t} for t in titles]
+
+
+class TestCaptureLifecycle(CaptureStoreTestCase):
+
+    def _crashed(self):
+        """Treat every owning process as dead, as after a crash."""
+        return patch("capture_store._process_alive", return_value=False)
+
+    def test_capture_recorded_through_each_state(self):
+        capture_id = self.store.receive("a and b", claim=True)
+        with patch("main.split_intents", return_value=self._tasks("a", "fail-b")):
+            self.assertEqual(triage_capture(self.store.get(capture_id)), ["page-a", None])
+        capture = self.store.get(capture_id)
+        self.assertEqual(capture["state"], "dead_lettered")
+        self.assertEqual(capture["intents"], self._tasks("a", "fail-b"))
+        self.assertEqual([item["state"] for item in capture["items"]], ["written", "dead_lettered"])
+
+    def test_no_intents_settles_capture(self):
+        capture_id = self.store.receive("hmm", claim=True)
+        with patch("main.split_intents", return_value=[]):
+            triage_capture(self.store.get(capture_id))
+        self.assertEqual(self.store.get(capture_id)["state"], "written")
+
+    def test_resume_after_split_skips_the_model(self):
+        capture_id = self.store.receive("a", claim=True)
+        self.store.split(capture_id, self._tasks("a"))  # process dies here
+        with self._crashed(), patch("main.split_intents") as mock_split:
+            self.assertEqual(resume_captures(), 1)
+            mock_split.assert_not_called()
+        self.assertEqual(self.written, ["a"])
+        self.assertEqual(self.store.get(capture_id)["state"], "written")
+
+    def test_resume_writes_only_pending_items(self):
+        capture_id = self.store.receive("a and b", claim=True)
+        self.store.split(capture_id, self._tasks("a", "b"))
+        first, _ = self.store.validated(capture_id, [_validate_intent(i) for i in self._tasks("a", "b")])
+        self.store.item_written(first, "page-a")  # process dies before b is written
+        with self._crashed():
+            resume_captures()
+        self.assertEqual(self.written, ["b"])
+        self.assertEqual(self.store.get(capture_id)["page_ids"], ["page-a", "page-b"])
+
+    def test_interrupted_stream_keeps_recorded_items(self):
+        capture_id = self.store.receive("a and b", claim=True)
+        self.store.add_items(capture_id, [_validate_intent(self._tasks("a")[0])])
+        with self._crashed(), patch("main.split_intents", return_value=self._tasks("a", "b")):
+            resume_captures()
+        self.assertEqual(sorted(self.written), ["a", "b"])
+        capture = self.store.get(capture_id)
+        self.assertEqual(capture["state"], "written")
+        self.assertEqual(capture["page_ids"], ["page-a", "page-b"])
+
+    def test_stream_broken_after_some_intents_resplit_on_retry(self):
+        capture_id = self.store.receive("a, b, c and d", claim=True)
+
+        def broken_stream(user_input, use_cache=True):
+            yield from self._tasks("a", "b")
+            raise ConnectionError("stream reset")
+
+        with patch("main.stream_intents", side_effect=broken_stream):
+            with self.assertRaises(ConnectionError):
+                triage_capture(self.store.get(capture_id), stream=True)
+        self.assertTrue(self.store.fail(capture_id, "ConnectionError: stream reset"))
+        self.assertEqual(sorted(self.written), ["a", "b"])
+
+        with patch("main.split_intents", return_value=self._tasks("a", "b", "c", "d")) as mock_split:
+            self.assertEqual(resume_captures(), 1)
+            mock_split.assert_called_once()
+        self.assertEqual(sorted(self.written), ["a", "b", "c", "d"])  # a and b not written twice
+        capture = self.store.get(capture_id)
+        self.assertEqual(capture["state"], "written")
+        self.assertEqual(capture["page_ids"], ["page-a", "page-b", "page-c", "page-d"])
+
+    def test_streamed_capture_settles(self):
+        capture_id = self.store.receive("a and b", claim=True)
+        with patch("main.stream_intents", return_value=iter(self._tasks("a", "b"))):
+            triage_capture(self.store.get(capture_id), stream=True)
+        capture = self.store.get(capture_id)
+        self.assertEqual(capture["state"], "written")
+        self.assertEqual(capture["page_ids"], ["page-a", "page-b"])
+
+    def test_split_errors_retried_until_failed(self):
+        capture_id = self.store.receive("a", claim=True)
+        self.store.fail(capture_id, "RuntimeError: quota")  # the CLI's first attempt
+        with patch("main.split_intents", side_effect=RuntimeError("quota")):
+            self.assertEqual(resume_captures(), self.store.max_attempts - 1)
+        capture = self.store.get(capture_id)
+        self.assertEqual(capture["state"], "failed")
+        self.assertEqual(capture["error"], "RuntimeError: quota")
+
+    def test_orphans_only_leaves_queued_captures(self):
+        orphan_id = self.store.receive("a", claim=True)  # its process dies
+        queued_id = self.store.receive("b")  # queued for another process's workers
+        with self._crashed(), patch("main.split_intents", return_value=self._tasks("a")):
+            self.assertEqual(resume_captures(orphans_only=True), 1)
+        self.assertEqual(self.store.get(orphan_id)["state"], "written")
+        self.assertEqual(self.store.get(queued_id)["attempts"], 0)
+        self.assertEqual(self.written, ["a"])
+
+    def test_capture_owned_by_live_process_left_alone(self):
+        self.store.receive("a", claim=True)
+        with patch("main.split_intents") as mock_split:
+            self.assertEqual(resume_captures(), 0)
+            mock_split.assert_not_called()
+
+
+class TestFlushDeadLetter(CaptureStoreTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.legacy = Path(self.tmp_dir) / "dead_letter.jsonl"
+        p = patch("main.LEGACY_DEAD_LETTER_PATH", self.legacy)
+        p.start()
+        self.addCleanup(p.stop)
+
+    def _item(self, title):
+        return {"type": "Task", "title": title, "structured_fields": {}}
+
+    def test_empty_queue_is_noop(self):
+        flush_dead_letter()
+        self.assertEqual(self.written, [])
+
+    def test_flush_replays_all_and_requeues_failures(self):
+        for title in ("a", "fail-b", "c"):
+            self.store.dead_letter(self._item(title), title)
+        mixed = self.store.receive("d and e", claim=True)
+        d, e = self.store.validated(mixed, [self._item("d"), self._item("e")])
+        self.store.item_written(d, "page-d")
+        self.store.dead_letter(e, "d and e")
+
+        flush_dead_letter(workers=3)
+        self.assertCountEqual(self.written, ["a", "c", "e"])
+        self.assertEqual(self.store.counts()["dead_lettered"], 1)
+        self.assertEqual(self.store.get(mixed)["page_ids"], ["page-d", "page-e"])
+
+    def test_legacy_files_imported_once(self):
+        def entries(*titles):
+            return "".join(json.dumps({"item": self._item(t), "raw_input": t}) + "\n" for t in titles)
+
+        segment = self.legacy.with_name("dead_letter.flushing.jsonl")
+        segment.write_text(entries("done", "todo"), encoding="utf-8")
+        self.legacy.with_name("dead_letter.acks").write_text("0\n", encoding="utf-8")  # "done" was acked
+        self.legacy.write_text(entries("newer") + "not json\n", encoding="utf-8")
+
+        flush_dead_letter()
+        self.assertCountEqual(self.written, ["todo", "newer"])
+        self.assertEqual(list(Path(self.tmp_dir).glob("dead_letter*")), [])
+        flush_dead_letter()
+        self.assertCountEqual(self.written, ["todo", "newer"])
+
+
+class TestStartup(unittest.TestCase):
+    """Cold-start guard: importing main must not pull in the Gemini or Notion SDKs."""
+
+    DEFERRED = ("google.genai", "notion_client", "httpx", "unittest")
+    # About 3x a typical `import main` (~150 ms); importing google.genai and
+    # notion_client eagerly again costs ~700 ms more, which this still catches
+    IMPORT_BUDGET_MS = 450
+
+    def _import_ms(self) -> float:
+        """Cumulative time for `import main` in a fresh interpreter, from -X importtime."""
+        proc = subprocess.run(
+            [sys.executable, "-X", "importtime", "-c", "import main"],
+            cwd=Path(__file__).parent, capture_output=True, text=True, check=True,
+        )
+        for line in proc.stderr.splitlines():
+            if line.startswith("import time:") and line.endswith("| main"):
+                return int(line.split("|")[1]) / 1000
+        self.fail("no -X importtime line for main")
+
+    def test_import_time_budget(self):
+        # Best of five, so a one-off stall on a busy machine doesn't fail the suite
+        best = min(self._import_ms() for _ in range(5))
+        self.assertLess(best, self.IMPORT_BUDGET_MS, f"import main took {best:.0f} ms")
+
+    def test_heavy_modules_deferred(self):
+        # A fresh interpreter, since this one has imported them already
+        check = f"import sys, main; print([m for m in {self.DEFERRED!r} if m in sys.modules])"
+        proc = subprocess.run(
+            [sys.executable, "-c", check],
+            cwd=Path(__file__).parent, capture_output=True, text=True, check=True,
+        )
+        self.assertEqual(proc.stdout.strip(), "[]")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,127 @@
+import json
+import shutil
+import tempfile
+import threading
+import unittest
+from pathlib import Path
+from unittest.mock import MagicMock, patch
+
+import metrics
+import notion
+from notion_client.errors import APIResponseError
+from capture_store import CaptureStore
+from page_index import PageIndex
+from ratelimit import TokenBucket
+
+
+class MetricsTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.path = Path(self.tmp_dir) / "metrics.jsonl"
+        metrics.enable(self.path)
+
+    def tearDown(self):
+        metrics.disable()
+        shutil.rmtree(self.tmp_dir, ignore_errors=True)
+
+    def records(self):
+        return [json.loads(line) for line in self.path.read_text(encoding="utf-8").splitlines()]
+
+
+class TestSpans(MetricsTestCase):
+
+    def test_nested_spans_share_trace(self):
+        with metrics.span("outer"):
+            with metrics.span("inner", kind="x") as inner:
+                inner.add("tokens", 10)
+                metrics.add("tokens", 5)
+        inner_rec, outer_rec = self.records()
+        self.assertEqual(inner_rec["name"], "inner")
+        self.assertEqual(inner_rec["trace"], outer_rec["trace"])
+        self.assertEqual(inner_rec["parent"], outer_rec["span"])
+        self.assertIsNone(outer_rec["parent"])
+        self.assertEqual(inner_rec["tokens"], 15)
+        self.assertEqual(inner_rec["kind"], "x")
+
+    def test_error_recorded_and_reraised(self):
+        with self.assertRaises(ValueError):
+            with metrics.span("boom"):
+                raise ValueError("x")
+        self.assertEqual(self.records()[0]["error"], "ValueError")
+
+    def test_bind_carries_span_into_worker_thread(self):
+        with metrics.span("outer"):
+            def work():
+                with metrics.span("worker"):
+                    pass
+            t = threading.Thread(target=metrics.bind(work))
+            t.start()
+            t.join()
+        worker, outer = self.records()
+        self.assertEqual(worker["parent"], outer["span"])
+
+    def test_counters_outside_spans_are_ignored(self):
+        metrics.add("tokens", 1)
+        metrics.current().set(x=1)
+        self.assertFalse(self.path.exists())
+
+    def test_nothing_written_when_disabled(self):
+        metrics.disable()
+        with metrics.span("quiet"):
+            pass
+        self.assertFalse(self.path.exists())
+
+
+class TestNotionInstrumentation(MetricsTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.store = CaptureStore(Path(self.tmp_dir) / "captures.sqlite3")
+        self.addCleanup(self.store.close)
+        self.pages = PageIndex(Path(self.tmp_dir) / "pages.sqlite3")
+        self.addCleanup(self.pages.close)
+        patches = [
+            patch("notion.DB_MAP", {"Task": "db-task", "Project": None, "Idea": None}),
+            patch("notion.limiter", TokenBucket(1000, capacity=1000)),
+            patch("notion.time.sleep"),
+            patch("capture_store.store", self.store),
+            patch("page_index.index", self.pages),
+        ]
+        for p in patches:
+            p.start()
+            self.addCleanup(p.stop)
+
+    def test_write_span_records_retries(self):
+        throttled = APIResponseError(
+            code="rate_limited", status=429, message="slow down",
+            headers={"Retry-After": "0.5"}, raw_body_text="",
+        )
+        create = MagicMock(side_effect=[throttled, {"id": "page-1"}])
+        item = {"type": "Task", "title": "Buy milk", "structured_fields": {"priority": None, "due_date": None}}
+        with patch.object(notion._client().pages, "create", create):
+            self.assertEqual(notion.write_to_notion(item, "buy milk"), "page-1")
+        rec = self.records()[0]
+        self.assertEqual(rec["name"], "notion.write")
+        self.assertEqual(rec["type"], "Task")
+        self.assertEqual(rec["attempts"], 2)
+        self.assertEqual(rec["http_429"], 1)
+        self.assertEqual(rec["retry_wait_ms"], 500)
+
+
+class TestSummarize(MetricsTestCase):
+
+    def test_percentiles_per_stage(self):
+        for ms in range(1, 101):
+            metrics.record("stage.a", ms, tokens=2)
+        metrics.record("stage.b", 7)
+        stats = metrics.summarize(self.path)
+        a = stats["stage.a"]
+        self.assertEqual((a["count"], a["p50"], a["p95"], a["p99"], a["max"]), (100, 50, 95, 99, 100))
+        self.assertEqual(a["totals"]["tokens"], 200)
+        self.assertEqual(stats["stage.b"]["p99"], 7)
+        self.assertEqual(list(metrics.summarize(self.path, prefix="stage.b")), ["stage.b"])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,230 @@
+import asyncio
+import shutil
+import tempfile
+import unittest
+from pathlib import Path
+from unittest.mock import AsyncMock, MagicMock, patch
+
+import notion
+from notion_client.errors import APIResponseError
+from capture_store import CaptureStore
+from page_index import Duplicate, PageIndex
+from ratelimit import TokenBucket
+
+DB_MAP = {"Task": "db-task", "Project": "db-project", "Idea": None}
+
+
+def _db_response(intent_type):
+    schema = notion.INTENT_SCHEMA[intent_type]
+    props = {name: {} for name in schema["properties"]} | {schema["title_field"]: {}}
+    return {"properties": props}
+
+
+class TestSchemaCache(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.cache_path = Path(self.tmp_dir) / "schema_cache.json"
+        patches = [
+            patch("notion.SCHEMA_CACHE_PATH", self.cache_path),
+            patch("notion.DB_MAP", DB_MAP),
+            patch("notion.limiter", TokenBucket(1000, capacity=1000)),
+            patch.object(notion._client().databases, "retrieve", side_effect=self._retrieve),
+        ]
+        for p in patches:
+            p.start()
+            self.addCleanup(p.stop)
+        self.retrieved = []
+        self.broken = set()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir, ignore_errors=True)
+
+    def _retrieve(self, database_id):
+        self.retrieved.append(database_id)
+        intent_type = {v: k for k, v in DB_MAP.items() if v}[database_id]
+        if database_id in self.broken:
+            return {"properties": {}}
+        return _db_response(intent_type)
+
+    def test_second_run_served_from_cache(self):
+        notion.validate_notion_schemas()
+        self.assertEqual(self.retrieved, ["db-task", "db-project"])
+        notion.validate_notion_schemas()
+        self.assertEqual(len(self.retrieved), 2)
+
+    def test_revalidate_bypasses_cache(self):
+        notion.validate_notion_schemas()
+        notion.validate_notion_schemas(revalidate=True)
+        self.assertEqual(len(self.retrieved), 4)
+
+    def test_expired_entry_rechecked(self):
+        notion.validate_notion_schemas()
+        with patch("notion.SCHEMA_CACHE_TTL", 0):
+            notion.validate_notion_schemas()
+        self.assertEqual(len(self.retrieved), 4)
+
+    def test_schema_change_invalidates(self):
+        notion.validate_notion_schemas()
+        with patch("notion._schema_fingerprint", return_value="changed"):
+            notion.validate_notion_schemas()
+        self.assertEqual(len(self.retrieved), 4)
+
+    def test_failed_check_not_cached(self):
+        self.broken.add("db-task")
+        notion.validate_notion_schemas()
+        notion.validate_notion_schemas()
+        self.assertEqual(self.retrieved.count("db-task"), 2)
+        self.assertEqual(self.retrieved.count("db-project"), 1)
+
+
+class TestWriteAsync(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.client = MagicMock()
+        self.sleeps = []
+
+        async def sleep(seconds):
+            self.sleeps.append(seconds)
+
+        self.store = CaptureStore(Path(self.tmp_dir) / "captures.sqlite3")
+        self.addCleanup(self.store.close)
+        self.pages = PageIndex(Path(self.tmp_dir) / "pages.sqlite3")
+        self.addCleanup(self.pages.close)
+        patches = [
+            patch("notion.DB_MAP", DB_MAP),
+            patch("notion.limiter", TokenBucket(1000, capacity=1000)),
+            patch("capture_store.store", self.store),
+            patch("page_index.index", self.pages),
+            patch("notion._async_client", return_value=self.client),
+            patch("notion.asyncio.sleep", side_effect=sleep),
+        ]
+        for p in patches:
+            p.start()
+            self.addCleanup(p.stop)
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir, ignore_errors=True)
+
+    def _write(self, item):
+        return asyncio.run(notion.write_to_notion_async(item, "raw"))
+
+    @staticmethod
+    def _error(status):
+        return APIResponseError(code="error", status=status, message="", headers={}, raw_body_text="")
+
+    def test_same_request_as_sync_path(self):
+        self.client.pages.create = AsyncMock(return_value={"id": "page-1"})
+        item = {"type": "Task", "title": "Buy milk", "structured_fields": {"priority": "High", "due_date": None}}
+        self.assertEqual(self._write(item), "page-1")
+        self.client.pages.create.assert_awaited_once_with(
+            parent={"database_id": "db-task"},
+            properties=notion.build_properties("Task", item, "raw"),
+        )
+
+    def test_retries_with_async_backoff(self):
+        self.client.pages.create = AsyncMock(side_effect=[self._error(503), {"id": "page-1"}])
+        with patch("notion.time.sleep") as blocking_sleep:
+            self.assertEqual(self._write({"type": "Task", "title": "A"}), "page-1")
+            blocking_sleep.assert_not_called()
+        self.assertEqual(len(self.sleeps), 1)
+
+    def test_gives_up_and_dead_letters(self):
+        self.client.pages.create = AsyncMock(side_effect=self._error(429))
+        self.assertIsNone(self._write({"type": "Task", "title": "A"}))
+        self.assertEqual(self.client.pages.create.await_count, notion._MAX_ATTEMPTS)
+        (_, _, text, state, _), = self.store.iter_captures()
+        self.assertEqual((text, state), ("raw", "dead_lettered"))
+
+    def test_duplicate_reuses_earlier_page(self):
+        self.client.pages.create = AsyncMock(return_value={"id": "page-1"})
+        self.assertEqual(self._write({"type": "Task", "title": "Buy milk"}), "page-1")
+        duplicate = self._write({"type": "Task", "title": "buy  milk!"})
+        self.assertEqual(duplicate, "page-1")
+        self.assertIsInstance(duplicate, Duplicate)
+        self.assertEqual(self.client.pages.create.await_count, 1)
+
+    def test_failed_write_releases_title(self):
+        self.client.pages.create = AsyncMock(side_effect=[self._error(400), {"id": "page-1"}])
+        self.assertIsNone(self._write({"type": "Task", "title": "A"}))
+        self.assertEqual(self._write({"type": "Task", "title": "A"}), "page-1")
+
+    def test_client_error_not_retried(self):
+        self.client.pages.create = AsyncMock(side_effect=self._error(400))
+        self.assertIsNone(self._write({"type": "Task", "title": "A"}))
+        self.assertEqual(self.client.pages.create.await_count, 1)
+        self.assertEqual(self.sleeps, [])
+
+    def test_unconfigured_db_skipped(self):
+        self.client.pages.create = AsyncMock()
+        self.assertIsNone(self._write({"type": "Idea", "title": "A"}))
+        self.client.pages.create.assert_not_called()
+
+    def test_session_closes_client_after_last_scope(self):
+        self.client.aclose = AsyncMock()
+
+        async def run():
+            notion._async_clients[asyncio.get_running_loop()] = self.client
+            async with notion.async_session():
+                async with notion.async_session():
+                    pass
+                self.client.aclose.assert_not_awaited()  # an outer scope still uses it
+            return asyncio.get_running_loop() in notion._async_clients
+
+        self.assertFalse(asyncio.run(run()))
+        self.client.aclose.assert_awaited_once()
+
+
+
+class TestWriteDedup(unittest.TestCase):
+    """The sync writer's use of the page index."""
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.client = MagicMock()
+        self.store = CaptureStore(Path(self.tmp_dir) / "captures.sqlite3")
+        self.addCleanup(self.store.close)
+        self.pages = PageIndex(Path(self.tmp_dir) / "pages.sqlite3")
+        self.addCleanup(self.pages.close)
+        patches = [
+            patch("notion.DB_MAP", DB_MAP),
+            patch("notion.limiter", TokenBucket(1000, capacity=1000)),
+            patch("notion.time.sleep"),
+            patch("capture_store.store", self.store),
+            patch("page_index.index", self.pages),
+            patch("notion._client", return_value=self.client),
+        ]
+        for p in patches:
+            p.start()
+            self.addCleanup(p.stop)
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir, ignore_errors=True)
+
+    def test_duplicate_not_created(self):
+        self.client.pages.create.return_value = {"id": "page-1"}
+        first = notion.write_to_notion({"type": "Task", "title": "Buy milk"}, "raw")
+        second = notion.write_to_notion({"type": "Task", "title": "Buy milk."}, "raw")
+        self.assertNotIsInstance(first, Duplicate)
+        self.assertIsInstance(second, Duplicate)
+        self.assertEqual(second, "page-1")
+        self.client.pages.create.assert_called_once()
+
+    def test_other_type_not_a_duplicate(self):
+        self.client.pages.create.side_effect = [{"id": "page-1"}, {"id": "page-2"}]
+        notion.write_to_notion({"type": "Task", "title": "Launch"}, "raw")
+        self.assertEqual(notion.write_to_notion({"type": "Project", "title": "Launch"}, "raw"), "page-2")
+
+    def test_failed_write_releases_title(self):
+        error = APIResponseError(code="error", status=400, message="", headers={}, raw_body_text="")
+        self.client.pages.create.side_effect = [error, {"id": "page-1"}]
+        self.assertIsNone(notion.write_to_notion({"type": "Task", "title": "A"}, "raw"))
+        page_id = notion.write_to_notion({"type": "Task", "title": "A"}, "raw")
+        self.assertEqual(page_id, "page-1")
+        self.assertNotIsInstance(page_id, Duplicate)
+        self.assertEqual(self.pages.counts(), {"Task": 1})
+
+
+if __name__ == "__main__":
+    unittest.main()
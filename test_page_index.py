@@ -0,0 +1,86 @@
+import shutil
+import tempfile
+import unittest
+from pathlib import Path
+
+from page_index import RESERVATION_TTL, PageIndex, normalize_title
+
+
+class TestPageIndex(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.now = 1_000_000.0
+        self.index = self._index()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir, ignore_errors=True)
+
+    def _index(self, window=3600, sleep=None):
+        index = PageIndex(Path(self.tmp_dir) / "pages.sqlite3", window=window,
+                          clock=lambda: self.now, sleep=sleep or (lambda s: None))
+        self.addCleanup(index.close)
+        return index
+
+    def _create(self, index, item_type, title, page_id):
+        duplicate, reservation = index.claim(item_type, title)
+        self.assertIsNone(duplicate)
+        index.confirm(reservation, page_id)
+
+    def test_normalize_title(self):
+        self.assertEqual(normalize_title("  Buy  Milk!"), "buy milk")
+        self.assertEqual(normalize_title("C++ notes"), "c++ notes")
+
+    def test_duplicate_within_window(self):
+        self._create(self.index, "Task", "Buy milk", "page-1")
+        self.now += 60
+        self.assertEqual(self.index.claim("Task", "buy milk."), ("page-1", None))
+        # Same title under another type is a different page
+        self.assertIsNone(self.index.claim("Idea", "Buy milk")[0])
+
+    def test_window_expires(self):
+        self._create(self.index, "Task", "Buy milk", "page-1")
+        self.now += 3601
+        self._create(self.index, "Task", "Buy milk", "page-2")
+        self.assertEqual(self.index.claim("Task", "Buy milk"), ("page-2", None))
+
+    def test_release_allows_retry(self):
+        duplicate, reservation = self.index.claim("Task", "Buy milk")
+        self.index.release(reservation)
+        self._create(self.index, "Task", "Buy milk", "page-1")
+        self.assertEqual(self.index.counts(), {"Task": 1})
+
+    def test_waits_for_pending_write(self):
+        other = self._index()
+        _, reservation = other.claim("Task", "Buy milk")
+        waits = []
+
+        def sleep(seconds):
+            waits.append(seconds)
+            other.confirm(reservation, "page-1")
+
+        self.assertEqual(self._index(sleep=sleep).claim("Task", "Buy milk"), ("page-1", None))
+        self.assertEqual(len(waits), 1)
+
+    def test_abandoned_reservation_lapses(self):
+        self.index.claim("Task", "Buy milk")  # writer crashes before confirming
+        self.now += RESERVATION_TTL + 1
+        self._create(self.index, "Task", "Buy milk", "page-1")
+
+    def test_zero_window_records_without_dedup(self):
+        index = self._index(window=0)
+        self._create(index, "Task", "Buy milk", "page-1")
+        self._create(index, "Task", "Buy milk", "page-2")
+        self.assertEqual(index.counts(), {"Task": 2})
+
+    def test_rebuild_replaces_pages(self):
+        self._create(self.index, "Task", "Stale", "page-1")
+        n = self.index.rebuild([("Task", "Buy milk", "page-2", self.now), ("Idea", "Inbox", "page-3", self.now)])
+        self.assertEqual(n, 2)
+        self.assertEqual(self.index.counts(), {"Task": 1, "Idea": 1})
+        self.assertEqual(self.index.claim("Task", "buy milk"), ("page-2", None))
+        self.assertIsNone(self.index.claim("Task", "Stale")[0])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,117 @@
+import unittest
+from unittest.mock import MagicMock, patch
+
+import llm
+from preclassifier import (
+    NOOP,
+    OTHER,
+    TASK,
+    NaiveBayesClassifier,
+    PreClassifier,
+    RuleClassifier,
+    _label_for,
+)
+
+EXAMPLES = [
+    ("hello there", NOOP), ("lol ok", NOOP), ("asdf qwer", NOOP), ("the thing", NOOP),
+    ("buy milk", TASK), ("buy bread", TASK), ("call mom", TASK), ("call the bank", TASK),
+    ("water the plants", TASK), ("fix the login bug", TASK), ("email the recruiter", TASK),
+    ("build a portfolio site", OTHER), ("learn react by building projects", OTHER),
+    ("what if triage had a digest email", OTHER), ("email bob and build an app", OTHER),
+]
+
+
+class TestRuleClassifier(unittest.TestCase):
+
+    def test_greetings_and_punctuation_are_noops(self):
+        rules = RuleClassifier()
+        for text in ("hello", "Hi!", "  lol ", "!@#$%", "thank you"):
+            with self.subTest(text=text):
+                self.assertEqual(rules.predict(text).label, NOOP)
+
+    def test_real_input_not_matched(self):
+        self.assertIsNone(RuleClassifier().predict("hello, call mom"))
+
+
+class TestNaiveBayesClassifier(unittest.TestCase):
+
+    def setUp(self):
+        self.model = NaiveBayesClassifier(EXAMPLES)
+
+    def test_simple_task_gets_ready_made_intent(self):
+        pred = self.model.predict("buy eggs")
+        self.assertEqual(pred.label, TASK)
+        self.assertEqual(pred.intents[0], {
+            "type": "Task", "title": "Buy eggs", "priority": None, "due_date": None, "success_criteria": None,
+            "review_frequency": None, "category": None, "potential_impact": None,
+        })
+
+    def test_qualified_task_goes_to_llm(self):
+        for text in ("buy milk tomorrow", "call mom, urgent", "buy milk and call mom", "buy 2 eggs"):
+            with self.subTest(text=text):
+                self.assertIsNone(self.model.predict(text))
+
+    def test_unseen_verb_goes_to_llm(self):
+        self.assertIsNone(self.model.predict("organize team offsite"))
+
+    def test_label_mapping(self):
+        self.assertEqual(_label_for([]), NOOP)
+        self.assertEqual(_label_for([{"type": "Task"}]), TASK)
+        self.assertEqual(_label_for([{"type_options": ["Task", "Project"]}]), OTHER)
+        self.assertEqual(_label_for([{"type": "Task"}, {"type": "Task"}]), OTHER)
+
+
+class TestPreClassifier(unittest.TestCase):
+
+    def setUp(self):
+        self.pre = PreClassifier(stages=[RuleClassifier(), NaiveBayesClassifier(EXAMPLES)], verify_rate=0)
+
+    def test_below_threshold_returns_none(self):
+        strict = PreClassifier(stages=[NaiveBayesClassifier(EXAMPLES)], threshold=1.01, verify_rate=0)
+        self.assertIsNone(strict.classify("buy eggs"))
+
+    def test_stats_count_fires_and_disagreements(self):
+        self.pre.classify("hello")
+        self.pre.classify("build a portfolio site")
+        pred = self.pre.classify("buy eggs")
+        self.assertFalse(self.pre.record_llm_result(pred, [{"type": "Project", "title": "Eggs"}]))
+        stats = self.pre.stats()
+        self.assertEqual(stats["calls"], 3)
+        self.assertEqual(stats["fired.rules.noop"], 1)
+        self.assertEqual(stats["fired.naive_bayes.task"], 1)
+        self.assertAlmostEqual(stats["fire_rate"], 0.6667)
+        self.assertEqual(stats["disagreement_rate"], 1.0)
+
+
+class TestSplitIntentsFastPath(unittest.TestCase):
+
+    def setUp(self):
+        patches = [
+            patch("llm.PRECLASSIFIER_ENABLED", True),
+            patch("llm.RESPONSE_CACHE_ENABLED", False),
+            patch("llm.pre_classifier", PreClassifier(stages=[RuleClassifier()], verify_rate=0)),
+            patch("llm.client"),
+            patch("llm.is_feedback_enabled", return_value=False),
+        ]
+        for p in patches:
+            p.start()
+            self.addCleanup(p.stop)
+        llm.client.models.generate_content.return_value = MagicMock(text='{"intents": []}')
+
+    def test_noop_skips_llm(self):
+        self.assertEqual(llm.split_intents("hello"), [])
+        llm.client.models.generate_content.assert_not_called()
+
+    def test_bypass_flag_calls_llm(self):
+        llm.split_intents("hello", use_preclassifier=False)
+        llm.client.models.generate_content.assert_called_once()
+
+    def test_verified_prediction_uses_llm_and_records_agreement(self):
+        llm.pre_classifier.verify_rate = 1.0
+        self.assertEqual(llm.split_intents("hello"), [])
+        llm.client.models.generate_content.assert_called_once()
+        self.assertEqual(llm.pre_classifier.stats()["agreed"], 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,72 @@
+import os
+import shutil
+import tempfile
+import unittest
+from pathlib import Path
+from unittest.mock import patch
+
+import feedback
+from prompt import PromptAssembler
+
+
+class TestPromptAssembler(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.prompt_path = Path(self.tmp_dir) / "splitter_prompt.txt"
+        self.prompt_path.write_text("BASE PROMPT", encoding="utf-8")
+        self.patch_log = patch("feedback.FEEDBACK_LOG_PATH", Path(self.tmp_dir) / "feedback.jsonl")
+        self.patch_log.start()
+        self.assembler = PromptAssembler(self.prompt_path)
+
+    def tearDown(self):
+        feedback.feedback_index().close()
+        self.patch_log.stop()
+        shutil.rmtree(self.tmp_dir, ignore_errors=True)
+
+    def _touch(self, path, text):
+        st = os.stat(path)
+        path.write_text(text, encoding="utf-8")
+        os.utime(path, ns=(st.st_atime_ns, st.st_mtime_ns + 1_000_000))
+
+    def test_unchanged_files_are_not_reread(self):
+        first = self.assembler.get()
+        with patch("feedback.get_few_shot_prompt") as mock_few_shot, \
+                patch.object(Path, "read_text") as mock_read:
+            second = self.assembler.get()
+            mock_few_shot.assert_not_called()
+            mock_read.assert_not_called()
+        self.assertIs(first, second)
+        self.assertEqual(second.text, "BASE PROMPT")
+
+    def test_prompt_edit_invalidates(self):
+        before = self.assembler.get()
+        self._touch(self.prompt_path, "NEW PROMPT")
+        after = self.assembler.get()
+        self.assertEqual(after.text, "NEW PROMPT")
+        self.assertNotEqual(before.digest, after.digest)
+
+    def test_new_feedback_invalidates_few_shot(self):
+        self.assertEqual(self.assembler.get().few_shot, "")
+        feedback.log_feedback("plan offsite", [], [{"type": "Project", "title": "Plan offsite"}])
+        prompt = self.assembler.get()
+        self.assertIn("plan offsite", prompt.text)
+        self.assertTrue(prompt.text.startswith("BASE PROMPT\n"))
+
+    def test_few_shot_excluded_when_disabled(self):
+        feedback.log_feedback("plan offsite", [], [{"type": "Project", "title": "Plan offsite"}])
+        self.assertEqual(self.assembler.get(include_few_shot=False).text, "BASE PROMPT")
+
+
+    def test_few_shot_follows_query(self):
+        feedback.log_feedback("plan offsite", [], [{"type": "Project", "title": "Plan offsite"}])
+        feedback.log_feedback("email landlord", [], [{"type": "Task", "title": "Email landlord"}])
+        self.assembler.few_shot_limit = 1
+        self.assertIn("plan offsite", self.assembler.get(query="offsite agenda").few_shot)
+        self.assertIn("email landlord", self.assembler.get(query="landlord repairs").few_shot)
+        first = self.assembler.get(query="offsite agenda")
+        self.assertIs(first, self.assembler.get(query="offsite venue"))
+
+
+if __name__ == "__main__":
+    unittest.main()
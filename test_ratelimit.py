@@ -0,0 +1,125 @@
+import asyncio
+import shutil
+import tempfile
+import threading
+import unittest
+from pathlib import Path
+
+from ratelimit import TokenBucket
+
+
+class FakeClock:
+    """Clock whose sleep() just advances time, so tests never actually wait."""
+
+    def __init__(self):
+        self.now = 1000.0
+        self.slept = []
+
+    def __call__(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.slept.append(seconds)
+        self.now += seconds
+
+    async def async_sleep(self, seconds):
+        self.sleep(seconds)
+
+
+class TestTokenBucket(unittest.TestCase):
+
+    def setUp(self):
+        self.clock = FakeClock()
+
+    def _bucket(self, **kwargs):
+        return TokenBucket(clock=self.clock, sleep=self.clock.sleep, async_sleep=self.clock.async_sleep, **kwargs)
+
+    def test_burst_is_free(self):
+        bucket = self._bucket(rate=3, capacity=3)
+        for _ in range(3):
+            self.assertEqual(bucket.acquire(), 0)
+        self.assertEqual(self.clock.slept, [])
+
+    def test_waits_for_refill_after_burst(self):
+        bucket = self._bucket(rate=2, capacity=1)
+        bucket.acquire()
+        self.assertAlmostEqual(bucket.acquire(), 0.5)
+        self.assertAlmostEqual(bucket.acquire(), 0.5)
+
+    def test_async_acquire_shares_budget_with_sync(self):
+        bucket = self._bucket(rate=2, capacity=1)
+        bucket.acquire()
+        self.assertAlmostEqual(asyncio.run(bucket.acquire_async()), 0.5)
+        self.assertAlmostEqual(bucket.acquire(), 0.5)
+        self.assertEqual(self.clock.slept, [0.5, 0.5])
+
+    def test_idle_time_refills_up_to_capacity(self):
+        bucket = self._bucket(rate=1, capacity=2)
+        bucket.acquire()
+        bucket.acquire()
+        self.clock.now += 60
+        self.assertEqual(bucket.acquire(), 0)
+        self.assertEqual(bucket.acquire(), 0)
+        self.assertGreater(bucket.acquire(), 0)
+
+    def test_stats_track_wait_time(self):
+        bucket = self._bucket(rate=4, capacity=1)
+        for _ in range(3):
+            bucket.acquire()
+        stats = bucket.stats()
+        self.assertEqual(stats["acquired"], 3)
+        self.assertEqual(stats["waited"], 2)
+        self.assertAlmostEqual(stats["wait_seconds"], 0.5)
+
+    def test_threads_share_one_budget(self):
+        bucket = TokenBucket(rate=1000, capacity=5)
+        threads = [threading.Thread(target=bucket.acquire) for _ in range(20)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        stats = bucket.stats()
+        self.assertEqual(stats["acquired"], 20)
+        self.assertEqual(stats["waited"], 15)
+
+    def test_invalid_rate_rejected(self):
+        with self.assertRaises(ValueError):
+            TokenBucket(rate=0)
+
+
+class TestSharedTokenBucket(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.state_path = Path(self.tmp_dir) / "bucket.json"
+        self.clock = FakeClock()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir, ignore_errors=True)
+
+    def test_buckets_on_same_file_share_budget(self):
+        # Two instances stand in for two processes
+        a = TokenBucket(rate=1, capacity=2, state_path=self.state_path, clock=self.clock, sleep=self.clock.sleep)
+        b = TokenBucket(rate=1, capacity=2, state_path=self.state_path, clock=self.clock, sleep=self.clock.sleep)
+        self.assertEqual(a.acquire(), 0)
+        self.assertEqual(a.acquire(), 0)
+        self.assertAlmostEqual(b.acquire(), 1.0)
+        self.assertTrue(self.state_path.exists())
+
+    def test_async_acquire_reserves_off_the_loop(self):
+        bucket = TokenBucket(rate=1, capacity=2, state_path=self.state_path, clock=self.clock)
+        reserved_on = []
+        reserve = bucket._reserve_shared
+
+        def record(tokens):
+            reserved_on.append(threading.get_ident())
+            return reserve(tokens)
+
+        bucket._reserve_shared = record
+        self.assertEqual(asyncio.run(bucket.acquire_async()), 0)
+        self.assertNotEqual(reserved_on, [threading.get_ident()])  # the loop runs on this thread
+        self.assertTrue(self.state_path.exists())
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,78 @@
+import shutil
+import sys
+import tempfile
+import unittest
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent / "evaluation"))
+
+from run_store import RunStore, case_hash, diff_runs
+
+
+def _result(case_id, passed, latency_ms=100.0, tokens=None):
+    return {
+        "id": case_id, "input": case_id, "passed": passed, "failures": [] if passed else ["wrong"],
+        "latency_ms": latency_ms, "usage": {"total_tokens": tokens} if tokens is not None else None,
+    }
+
+
+def _run(run_id, started_at, results, tag_stats=None):
+    return {
+        "run_id": run_id, "started_at": started_at, "cases": results,
+        "passed": sum(r["passed"] for r in results), "total": len(results),
+        "tag_stats": tag_stats or {},
+    }
+
+
+class TestRunStore(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.store = RunStore(Path(self.tmp_dir) / "store.sqlite3")
+
+    def tearDown(self):
+        self.store._conn.close()
+        shutil.rmtree(self.tmp_dir, ignore_errors=True)
+
+    def test_case_results_keyed_on_prompt_and_model(self):
+        key = ("c1", "h", "prompt-a", "fs-a", "model", "llm")
+        self.store.put_case(key, _result("c1", True))
+        self.assertTrue(self.store.get_case(key)["passed"])
+        self.assertIsNone(self.store.get_case(("c1", "h", "prompt-b", "fs-a", "model", "llm")))
+        self.assertIsNone(self.store.get_case(("c1", "h", "prompt-a", "fs-b", "model", "llm")))
+
+    def test_case_hash_changes_with_expectation(self):
+        case = {"id": "c1", "input": "buy milk", "expected": [{"type": "Task"}]}
+        edited = {**case, "expected": [{"type": "Idea"}]}
+        self.assertNotEqual(case_hash(case), case_hash(edited))
+        self.assertEqual(case_hash(case), case_hash({**case, "tags": ["task"]}))
+
+    def test_load_latest_and_previous(self):
+        self.store.save_run(_run("r1", "2026-01-01T00:00:00", []))
+        self.store.save_run(_run("r2", "2026-01-02T00:00:00", []))
+        self.assertEqual(self.store.load_run("latest")["run_id"], "r2")
+        self.assertEqual(self.store.load_run("previous")["run_id"], "r1")
+        self.assertEqual(self.store.load_run("r1")["run_id"], "r1")
+        with self.assertRaises(KeyError):
+            self.store.load_run("missing")
+
+
+class TestDiffRuns(unittest.TestCase):
+
+    def test_newly_failing_passing_and_deltas(self):
+        a = _run("a", "t0", [_result("x", True, 100, 50), _result("y", False, 100, 50), _result("old", True)],
+                 {"task": {"passed": 1, "total": 2}})
+        b = _run("b", "t1", [_result("x", False, 300, 80), _result("y", True, 100, 50), _result("new", True)],
+                 {"task": {"passed": 2, "total": 2}})
+        d = diff_runs(a, b)
+        self.assertEqual(d["newly_failing"], ["x"])
+        self.assertEqual(d["newly_passing"], ["y"])
+        self.assertEqual(d["only_in_a"], ["old"])
+        self.assertEqual(d["only_in_b"], ["new"])
+        self.assertAlmostEqual(d["tag_deltas"]["task"]["delta"], 0.5)
+        self.assertEqual(d["case_deltas"]["x"], {"latency_ms": 200, "tokens": 30})
+        self.assertEqual(d["b_totals"]["total_tokens"] - d["a_totals"]["total_tokens"], 30)
+
+
+if __name__ == "__main__":
+    unittest.main()
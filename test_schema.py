@@ -0,0 +1,57 @@
+import unittest
+
+from schema import COMPILED_SCHEMA, compile_schema, validate_intents
+
+
+class TestCompiledBuilders(unittest.TestCase):
+
+    def test_task_properties(self):
+        item = {
+            "type": "Task", "title": "Write report",
+            "structured_fields": {"priority": "High", "due_date": "2026-02-15"},
+        }
+        props = COMPILED_SCHEMA["Task"].build_properties(item, "write report by feb 15")
+        self.assertEqual(props, {
+            "Name": {"title": [{"text": {"content": "Write report"}}]},
+            "Status": {"status": {"name": "Todo"}},
+            "Source": {"select": {"name": "AI"}},
+            "Priority": {"multi_select": [{"name": "High"}]},
+            "Due date": {"date": {"start": "2026-02-15"}},
+            "Raw Input": {"rich_text": [{"text": {"content": "write report by feb 15"}}]},
+        })
+
+    def test_missing_fields_left_out(self):
+        item = {"type": "Idea", "title": "Shared inbox", "structured_fields": {"category": None}}
+        props = COMPILED_SCHEMA["Idea"].build_properties(item, "idea: shared inbox")
+        self.assertEqual(list(props), ["Idea"])
+
+    def test_compiles_custom_schema(self):
+        compiled = compile_schema({
+            "Note": {
+                "db_env_key": "NOTES_DB_ID",
+                "title_field": "Title",
+                "properties": {"Tags": {"type": "multi_select", "field": "tags"}},
+                "valid_fields": {"tags": {"pattern": r"^#\w+$", "nullable": True}},
+            },
+        })["Note"]
+        self.assertIsNone(compiled.validate({"type": "Note", "title": "x", "tags": "untagged"}))
+        item = compiled.validate({"type": "Note", "title": " x ", "tags": "#home"})
+        self.assertEqual(item, {"type": "Note", "title": "x", "structured_fields": {"tags": "#home"}})
+        self.assertEqual(compiled.build_properties(item, "")["Tags"], {"multi_select": [{"name": "#home"}]})
+
+
+class TestValidateIntents(unittest.TestCase):
+
+    def test_drops_rejected_and_keeps_order(self):
+        intents = [
+            {"type": "Task", "title": "A", "priority": "Low"},
+            {"type": "Reminder", "title": "B"},
+            {"type": "Task", "title": "C", "priority": "Urgent"},
+            {"type": "Project", "title": "D", "review_frequency": "Weekly"},
+            {"type": "Idea", "title": "  "},
+        ]
+        self.assertEqual([item["title"] for item in validate_intents(intents)], ["A", "D"])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,206 @@
+import http.client
+import json
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import unittest
+import urllib.error
+import urllib.request
+from pathlib import Path
+
+import metrics
+import server
+from capture_store import CaptureStore
+
+
+class TestCaptureService(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.store = CaptureStore(Path(self.tmp_dir) / "captures.sqlite3", max_attempts=2, retry_delay=0)
+        self.handled = []
+        self.release = threading.Event()
+        self.release.set()
+
+        def handler(capture):
+            # Stands in for main.triage_capture(), including its store bookkeeping
+            self.assertTrue(self.release.wait(5))
+            text = capture["text"]
+            if text == "boom":
+                raise RuntimeError("model unavailable")
+            self.handled.append(text)
+            item, = self.store.validated(capture["id"], [{"type": "Task", "title": text, "structured_fields": {}}])
+            self.store.item_written(item, f"page-{text}")
+
+        self.service = server.CaptureService(
+            address=("127.0.0.1", 0), workers=2, token="secret", store=self.store, handler=handler,
+        )
+        self.thread = threading.Thread(target=self.service.serve_forever, daemon=True)
+        self.thread.start()
+        self.assertTrue(self.service.ready.wait(5))
+
+    def tearDown(self):
+        self.release.set()
+        self.service.stop()
+        self.thread.join(5)
+        self.store.close()
+        shutil.rmtree(self.tmp_dir, ignore_errors=True)
+
+    def _request(self, method, path, body=None, content_type="text/plain", token="secret"):
+        host, port = self.service.address
+        req = urllib.request.Request(f"http://{host}:{port}{path}", data=body, method=method)
+        req.add_header("Content-Type", content_type)
+        if token:
+            req.add_header("Authorization", f"Bearer {token}")
+        try:
+            with urllib.request.urlopen(req, timeout=5) as resp:
+                return resp.status, json.loads(resp.read())
+        except urllib.error.HTTPError as e:
+            return e.code, json.loads(e.read())
+
+    def _post_with_length(self, length):
+        conn = http.client.HTTPConnection(*self.service.address, timeout=5)
+        self.addCleanup(conn.close)
+        conn.putrequest("POST", "/capture")
+        conn.putheader("Authorization", "Bearer secret")
+        if length is not None:
+            conn.putheader("Content-Length", length)
+        conn.endheaders()  # no body: the server replies without reading one
+        return conn.getresponse().status
+
+    def _wait_for(self, capture_id, state):
+        deadline = time.monotonic() + 5
+        while time.monotonic() < deadline:
+            _, record = self._request("GET", f"/status/{capture_id}")
+            if record["state"] == state:
+                return record
+            time.sleep(0.01)
+        self.fail(f"capture never reached {state}: {record}")
+
+    def test_capture_is_accepted_before_it_is_triaged(self):
+        self.release.clear()
+        status, reply = self._request("POST", "/capture", b"buy milk")
+        self.assertEqual(status, 202)
+        self.assertEqual(self._request("GET", reply["status_url"])[1]["state"], "received")
+        self.release.set()
+        record = self._wait_for(reply["id"], "written")
+        self.assertEqual(record["page_ids"], ["page-buy milk"])
+
+    def test_json_body(self):
+        status, reply = self._request("POST", "/capture", json.dumps({"text": "email recruiter"}).encode(),
+                                      content_type="application/json")
+        self.assertEqual(status, 202)
+        self._wait_for(reply["id"], "written")
+        self.assertEqual(self.handled, ["email recruiter"])
+
+    def test_failing_capture_retried_then_failed(self):
+        _, reply = self._request("POST", "/capture", b"boom")
+        record = self._wait_for(reply["id"], "failed")
+        self.assertEqual(record["attempts"], 2)
+        self.assertEqual(record["error"], "RuntimeError: model unavailable")
+
+    def test_rejects_bad_requests(self):
+        self.assertEqual(self._request("POST", "/capture", b"   ")[0], 400)
+        self.assertEqual(self._request("POST", "/capture", b"{", content_type="application/json")[0], 400)
+        self.assertEqual(self._request("POST", "/capture", b"x" * (server.MAX_BODY_BYTES + 1))[0], 413)
+        self.assertEqual(self._post_with_length(None), 411)
+        for length in ("abc", "-1"):
+            self.assertEqual(self._post_with_length(length), 400)
+        self.assertEqual(self._request("GET", "/status/nope")[0], 404)
+        self.assertEqual(self._request("POST", "/capture", b"buy milk", token="wrong")[0], 401)
+        self.assertEqual(self._request("GET", "/metrics", token=None)[0], 401)
+        self.assertEqual(self.store.counts()["received"], 0)
+
+    def test_metrics_endpoint(self):
+        metrics.enable(Path(self.tmp_dir) / "metrics.jsonl")
+        try:
+            _, reply = self._request("POST", "/capture", b"buy milk")
+            self._wait_for(reply["id"], "written")
+            status, report = self._request("GET", "/metrics?since=1h")
+        finally:
+            metrics.disable()
+        self.assertEqual(status, 200)
+        self.assertEqual(report["captures"]["written"], 1)
+        self.assertEqual(report["workers"], 2)
+        self.assertEqual(report["stages"]["capture"]["count"], 1)
+        self.assertIn("server.queue_wait", report["stages"])
+        self.assertEqual(self._request("GET", "/metrics?since=soon")[0], 400)
+
+
+class TestCaptureStore(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.path = Path(self.tmp_dir) / "captures.sqlite3"
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir, ignore_errors=True)
+
+    def test_capture_of_dead_process_recovered(self):
+        # A CLI process records a capture, then dies before triaging it
+        subprocess.run(
+            [sys.executable, "-c", f"import capture_store; capture_store.CaptureStore({str(self.path)!r}).receive('a', claim=True)"],
+            cwd=Path(__file__).parent, check=True,
+        )
+        store = CaptureStore(self.path)
+        self.assertIsNone(store.claim())
+        (capture_id, *_), = store.iter_captures()
+        self.assertEqual(store.recover(), [capture_id])
+        self.assertEqual(store.claim()["text"], "a")
+        self.assertEqual(store.recover(), [])  # now owned by this live process
+        store.close()
+
+    def test_retry_waits_for_backoff(self):
+        store = CaptureStore(self.path, retry_delay=60)
+        capture_id = store.receive("a")
+        store.claim()
+        self.assertTrue(store.fail(capture_id, "boom"))
+        self.assertIsNone(store.claim())
+        self.assertEqual(store.get(capture_id)["state"], "received")
+        store.close()
+
+    def test_each_capture_claimed_once(self):
+        store = CaptureStore(self.path)
+        ids = {store.receive(str(i)) for i in range(50)}
+        claimed, lock = [], threading.Lock()
+
+        def drain():
+            while (capture := store.claim()) is not None:
+                with lock:
+                    claimed.append(capture["id"])
+
+        threads = [threading.Thread(target=drain) for _ in range(4)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        self.assertEqual(sorted(claimed), sorted(ids))
+        store.close()
+
+    def test_capture_settles_when_no_item_is_pending(self):
+        store = CaptureStore(self.path)
+        capture_id = store.receive("a and b", claim=True)
+        a, b = store.validated(capture_id, [{"type": "Task", "title": t} for t in "ab"])
+        store.item_written(a, "page-a")
+        self.assertEqual(store.get(capture_id)["state"], "validated")
+        store.dead_letter(b, "a and b", error="HTTP 503")
+        capture = store.get(capture_id)
+        self.assertEqual(capture["state"], "dead_lettered")
+        self.assertEqual(capture["items"][1]["error"], "HTTP 503")
+        self.assertEqual(store.requeue_dead_letters(), [capture_id])
+        self.assertEqual([item["title"] for item in store.pending_items(capture_id)], ["b"])
+        store.close()
+
+    def test_unrecorded_item_dead_lettered_under_own_capture(self):
+        store = CaptureStore(self.path)
+        store.dead_letter({"type": "Idea", "title": "x", "structured_fields": {}}, "raw x")
+        (capture_id, _, text, state, _), = store.iter_captures()
+        self.assertEqual((text, state), ("raw x", "dead_lettered"))
+        store.close()
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -2,6 +2,7 @@ import os
 import subprocess
 import tkinter as tk
 
+from daemon import send_capture
 from feedback import is_feedback_enabled, set_feedback_enabled
 
 SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
@@ -24,7 +25,8 @@ WIN_W, WIN_H = 640, 108
 # ── Logic ────────────────────────────────────────────────────────────────────
 def submit():
     raw = entry.get("1.0", tk.END).strip()
-    if raw and raw != PLACEHOLDER:
+    if raw and raw != PLACEHOLDER and not send_capture(raw):
+        # No daemon running — fall back to a one-shot main.py process
         subprocess.Popen(
             [VENV_PY, MAIN_PY, raw],
             cwd=SCRIPT_DIR,